@@ -1,108 +1,68 @@
 # =========================================================
 # Imports
 # ---------------------------------------------------------
-# - os: utilitaires système (existence de dossiers/fichiers)
-# - re: nettoyage de texte via expressions régulières
 # - gradio: interface web pour l'app RAG
-# - langchain / ollama / chroma: stack RAG (LLM, embeddings, vecteur store, prompt, chain)
-# - text splitter: découpage des documents en chunks
+# - langchain / ollama: stack RAG (LLM, prompt, chain)
+# - rag_service: retriever partagé (service local, ou index Chroma local en repli)
+# - rag_answer_cache: cache sémantique des réponses (questions répétées)
+# - rag_rerank: reranking CPU des candidats avant le prompt
+# - rag_menu: réponses pré-calculées du menu de questions
+# - rag_router: choix du modèle de génération par requête (complexité, latence)
 # =========================================================
+import asyncio
 import os
-import re
+import time
+
 import gradio as gr
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_ollama import OllamaLLM
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain.prompts import ChatPromptTemplate
+
+from rag_answer_cache import SemanticAnswerCache, answer_namespace
+from rag_context import format_context
+from rag_config import (
+    ANSWER_CACHE, RETRIEVE_CONCURRENCY, RETRIEVE_QUEUE, GENERATE_CONCURRENCY, GENERATE_QUEUE, QUEUE_TIMEOUT,
+    LLM_KEEP_ALIVE, LLM_WARMUP, MENU, ROUTER, ROUTER_MODELS,
+)
+from rag_limits import OverloadedError, StageLimiter
+from rag_menu import PrecomputedMenu
+from rag_prompts import rag_prompt, warm_up
+from rag_rerank import candidate_pool, get_reranker
+from rag_router import ModelRouter, build_llms
+from rag_service import connect_retriever, index_version
 
 # =========================================================
 # CONFIGURATION GLOBALE
 # ---------------------------------------------------------
-# - DATA_DIR: répertoire contenant les fichiers déjà parsés (Markdown/TXT)
-# - CHROMA_DIR: répertoire de persistance de l'index Chroma
-# - embed_model: modèle d'embedding (Ollama)
-# - llm: modèle de génération (Ollama)
+# - llm: modèle de génération (Ollama), maintenu chargé RAG_LLM_KEEP_ALIVE
+#   après chaque requête (pas de rechargement entre deux questions espacées)
+# NOTE: DATA_DIR / CHROMA_DIR / modèle d'embedding sont partagés via rag_config
+# (variables RAG_DATA_DIR, RAG_CHROMA_DIR, RAG_EMBED_MODEL)
 # =========================================================
-DATA_DIR = "/var/www/RAG/Data_parse"
-CHROMA_DIR = "./chroma_index"
-
-embed_model = OllamaEmbeddings(model="nomic-embed-text", base_url="http://localhost:11434")
 llm = OllamaLLM(
     model="gpt-oss:latest",
     base_url="http://localhost:11434",
     temperature=0.1,
     num_ctx=8192,
+    keep_alive=LLM_KEEP_ALIVE,
     request_timeout=3000
 )
 
-# =========================================================
-# UTILITAIRES TEXTE
-# ---------------------------------------------------------
-# clean_text:
-# - compresse les espaces multiples
-# - remplace l'espace insécable par un espace normal
-# - retire espaces en début/fin
-# =========================================================
-def clean_text(text: str) -> str:
-    text = re.sub(r'\s+', ' ', text)
-    text = text.replace('\u00A0', ' ')
-    return text.strip()
-
-# =========================================================
-# CHARGEMENT & NETTOYAGE DES DOCUMENTS
-# ---------------------------------------------------------
-# load_and_clean_docs:
-# - charge tous les fichiers texte sous DATA_DIR (récursif)
-# - auto-détecte l'encodage
-# - nettoie le contenu via clean_text
-# - retourne la liste de documents LangChain
-# =========================================================
-def load_and_clean_docs():
-    loader = DirectoryLoader(
-        DATA_DIR,
-        glob="**/*",
-        loader_cls=TextLoader,
-        show_progress=True,
-        use_multithreading=True,
-        loader_kwargs={"autodetect_encoding": True}
-    )
-    docs = loader.load()
-    for doc in docs:
-        doc.page_content = clean_text(doc.page_content)
-    return docs
-
-# =========================================================
-# INDEX VECTORIEL CHROMA
-# ---------------------------------------------------------
-# - Si CHROMA_DIR existe : on recharge l'index existant
-# - Sinon : on crée l'index à partir des documents (split puis persist)
-#   * chunk_size=500, overlap=50: compromis précision/rappel
-# =========================================================
-if os.path.exists(CHROMA_DIR):
-    db = Chroma(persist_directory=CHROMA_DIR, embedding_function=embed_model)
-else:
-    print("📚 Création de l’index vectoriel...")
-    docs = load_and_clean_docs()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_documents(docs)
-    db = Chroma.from_documents(chunks, embed_model, persist_directory=CHROMA_DIR)
-    db.persist()
-
 # =========================================================
 # RETRIEVER
 # ---------------------------------------------------------
+# - connect_retriever : service de retrieval partagé (rag_service.py) s'il
+#   tourne, sinon index Chroma local validé par manifeste
 # - MMR (Maximal Marginal Relevance): équilibre pertinence/diversité
 # - k=5: nombre final de passages retournés
 # - fetch_k=20: candidats initiaux avant MMR
-# - lambda=0.5: équilibre MMR (0 = diversité, 1 = similarité)
+# - lambda_mult=0.5: équilibre MMR (0 = diversité, 1 = similarité)
+# - reranker (RAG_RERANK) : le retriever renvoie RAG_RERANK_CANDIDATES
+#   candidats, rescorés par lots ; seuls les RAG_RERANK_TOP_N meilleurs
+#   au-dessus de RAG_RERANK_THRESHOLD vont au LLM (prompt plus court)
 # =========================================================
-retriever = db.as_retriever(
-    search_type="mmr",
-    search_kwargs={"k": 5, "fetch_k": 20 , "lambda": 0.5}
-)
+reranker = get_reranker()
+candidates_k, candidates_fetch_k = candidate_pool(5, 20, reranker)
+retriever = connect_retriever(search_type="mmr", k=candidates_k, fetch_k=candidates_fetch_k, lambda_mult=0.5)
 
 # =========================================================
 # PROMPT RAG
@@ -111,8 +71,10 @@ retriever = db.as_retriever(
 # - Ton: direct, concis, factuel
 # - Exigence: citer la source (ex: nom de fichier) quand info mentionnée
 # - Si info absente: le dire clairement
+# - rag_prompt : consignes en préfixe fixe (réutilisé par le cache de prompt
+#   d'Ollama), contexte et question en fin de prompt
 # =========================================================
-question_prompt = ChatPromptTemplate.from_template("""
+INSTRUCTIONS = """
 Vous êtes un assistant technique de la marque CWD. Répondez de manière **directe, concise et strictement factuelle** à la question posée, en vous appuyant uniquement sur les documents fournis.
 
 📌 Contraintes :
@@ -121,62 +83,226 @@ Vous êtes un assistant technique de la marque CWD. Répondez de manière **dire
 - Ne répétez pas d’information inutile ou hors sujet
 - Si une information est mentionnée, citez **clairement sa source** (ex. : nom du fichier)
 - Si l’information est absente, dites-le clairement, sans supposition
+"""
+question_prompt = rag_prompt(INSTRUCTIONS, context_header="=== CONTEXTE DOCUMENTAIRE ===",
+                             answer_header="=== RÉPONSE COURTE ===")
 
-=== CONTEXTE DOCUMENTAIRE ===
-{context}
+# =========================================================
+# FORMATTEUR DE CONTEXTE
+# ---------------------------------------------------------
+# format_context (rag_context) :
+# - chunks étiquetés "[n] fichier" (citations), dans l'ordre du retriever
+# - phrases redondantes retirées, budget RAG_CONTEXT_TOKENS respecté
+#   (phrases les moins pertinentes pour la question retirées en premier)
+# =========================================================
 
-=== QUESTION ===
-{question}
+def source_names(docs):
+    return list(dict.fromkeys(os.path.basename(d.metadata["source"]) for d in docs if d.metadata.get("source")))
 
-=== RÉPONSE COURTE ===
-""")
+def format_sources(sources):
+    if not sources:
+        return "📂 **Fichiers consultés :**\n(aucun)"
+    return "📂 **Fichiers consultés :**\n" + "\n".join(f"- {s}" for s in sources)
 
 # =========================================================
-# FORMATTEUR DE CONTEXTE
+# CHAÎNE RAG (prompt -> LLM -> parseur)
 # ---------------------------------------------------------
-# format_docs:
-# - concatène les contenus des documents sélectionnés
-# - séparés par deux sauts de ligne (lisibilité)
+# - "context": documents récupérés une seule fois par rag_interface, puis
+#   mis en forme par format_context (réutilisés pour les sources et le cache)
+# - "question": question telle quelle
+# - StrOutputParser: standardise la sortie sous forme de texte
 # =========================================================
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+answer_chain = question_prompt | llm | StrOutputParser()
 
 # =========================================================
-# CHAÎNE RAG (retrieval -> prompt -> LLM -> parseur)
+# ROUTAGE DU MODÈLE (rag_router)
 # ---------------------------------------------------------
-# - "context": passe par le retriever puis formatage
-# - "question": transite telle quelle (RunnablePassthrough)
-# - StrOutputParser: standardise la sortie sous forme de texte
+# - roster RAG_ROUTER_MODELS (du plus rapide au plus lourd), mêmes options
+#   que llm ; une chaîne par modèle
+# - question simple (courte, peu d'entités, passage pertinent net) ->
+#   petit modèle ; question complexe -> modèle plus lourd, sauf s'il est
+#   saturé (questions en cours ou en file) ou plus lent que RAG_ROUTER_SLO_MS
+#   (repli sur le palier inférieur)
+# - erreur avant le premier token : nouvel essai sur le modèle inférieur
+# - décisions et latences journalisées dans RAG_ROUTER_LOG
+# - RAG_ROUTER=1 pour l'activer (défaut : llm seul)
 # =========================================================
-qa_chain = (
-    {
-        "context": retriever | format_docs,
-        "question": RunnablePassthrough(),
-    }
-    | question_prompt
-    | llm
-    | StrOutputParser()
-)
+router = ModelRouter(ROUTER_MODELS) if ROUTER else None
+llms = build_llms(lambda name: llm.model_copy(update={"model": name})) if router is not None else {llm.model: llm}
+answer_chains = {name: question_prompt | model | StrOutputParser() for name, model in llms.items()}
+# identifiant du (des) modèle(s) dans les espaces de noms des caches de réponses
+generation_model = router.name if router is not None else llm.model
+
+async def stream_routed(inputs, decision):
+    """Tokens du modèle choisi ; decision mise à jour en place en cas de repli."""
+    while True:
+        t_gen, ttft_ms, streamed, error = time.time(), None, False, "interrompu"
+        try:
+            async for token in answer_chains[decision["model"]].astream(inputs):
+                if ttft_ms is None:
+                    ttft_ms = (time.time() - t_gen) * 1000
+                streamed = True
+                yield token
+            error = None
+            return
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            fallback = None if streamed else router.fallback(decision)
+            if fallback is None:
+                raise
+        finally:
+            router.record(decision, (time.time() - t_gen) * 1000, ttft_ms, error)
+        decision.update(fallback)
+
+# =========================================================
+# CACHE SÉMANTIQUE DES RÉPONSES
+# ---------------------------------------------------------
+# - question proche (cosinus >= RAG_ANSWER_CACHE_THRESHOLD) d'une question
+#   déjà répondue -> réponse et sources immédiates
+# - invalidé quand l'index (snapshot), le modèle ou le prompt change
+# - RAG_ANSWER_CACHE=0 pour le désactiver
+# =========================================================
+answer_cache = SemanticAnswerCache() if ANSWER_CACHE else None
+
+# =========================================================
+# CONCURRENCE (rag_limits)
+# ---------------------------------------------------------
+# - retrieval : RAG_RETRIEVE_CONCURRENCY requêtes simultanées (léger), file
+#   de RAG_RETRIEVE_QUEUE requêtes
+# - génération : RAG_GENERATE_CONCURRENCY flux Ollama simultanés ; au-delà,
+#   file FIFO de RAG_GENERATE_QUEUE requêtes (position affichée), abandon
+#   après RAG_QUEUE_TIMEOUT s ou si la file est pleine (message explicite)
+# =========================================================
+retrieve_limiter = StageLimiter("Retrieval", RETRIEVE_CONCURRENCY, RETRIEVE_QUEUE, QUEUE_TIMEOUT)
+generate_limiter = StageLimiter("Génération", GENERATE_CONCURRENCY, GENERATE_QUEUE, QUEUE_TIMEOUT)
+
+# =========================================================
+# MENU DE QUESTIONS PRÉ-CALCULÉES (rag_menu)
+# ---------------------------------------------------------
+# - questions du fichier RAG_MENU_FILE, proposées dans le sélecteur
+# - réponses + sources calculées en tâche de fond (même chaîne que le
+#   direct : retrieval, rerank, prompt), persistées dans RAG_MENU_STORE
+# - recalcul quand l'index (snapshot), le modèle ou le prompt change, ou
+#   après RAG_MENU_MAX_AGE ; uniquement quand aucune génération n'est en
+#   cours (et dans RAG_MENU_REFRESH_HOURS pour les entrées périmées)
+# - retrieval et génération du pré-calcul occupent une place de
+#   retrieve_limiter / generate_limiter (hold) : une question qui arrive
+#   pendant le calcul attend son tour au lieu de dépasser la concurrence
+# - RAG_MENU=0 pour le désactiver
+# =========================================================
+def current_namespace():
+    return answer_namespace(index_version(retriever), generation_model, question_prompt.template)
+
+def answer_menu_question(question):
+    with retrieve_limiter.hold():
+        docs = retriever.invoke(question)
+        if reranker is not None:
+            docs, _ = reranker.rerank(question, docs)
+    # hors ligne : pas de contrainte de latence, modèle le plus lourd du roster
+    chain = answer_chains[router.largest] if router is not None else answer_chain
+    with generate_limiter.hold():
+        answer = chain.invoke({"context": format_context(question, docs), "question": question})
+    return answer, source_names(docs)
+
+def generation_idle():
+    return generate_limiter.active == 0 and not generate_limiter.stats()["waiting"]
+
+menu = PrecomputedMenu(answer_menu_question, current_namespace, idle=generation_idle) if MENU else None
+
+def format_precomputed(entry):
+    note = f"📌 Réponse pré-calculée (il y a {entry['age_s'] / 60:.0f} min)"
+    if entry["stale"]:
+        note += " — mise à jour en cours en arrière-plan"
+    return f"💡 **Réponse :**\n\n{entry['answer']}", format_sources(entry["sources"]) + f"\n\n{note}"
 
 # =========================================================
 # FONCTIONS D'INTERFACE MÉTIER
 # ---------------------------------------------------------
-# rag_interface(query):
+# rag_interface(query) : générateur asynchrone de (réponse, sources) pour Gradio
 # - gère l'absence de saisie
-# - invoque la chaîne RAG
-# - renvoie la réponse et un bloc "sources" indicatif
+# - question du menu déjà calculée -> réponse immédiate
+# - cache sémantique, sinon retrieval + rerank puis génération en streaming :
+#   * sources affichées dès la fin du retrieval, avant la génération
+#   * position dans la file tant que la génération attend une place
+#   * modèle choisi par le routeur une fois la place obtenue
+#   * réponse mise à jour à chaque token (astream)
+#   * temps jusqu'au premier token (TTFT) affiché et journalisé
+# - appels bloquants (cache, retriever) hors de la boucle asyncio
 #
 # resolve_question(selected, typed, action):
 # - choisit la question effective selon l'origine (sélecteur vs saisie)
 # =========================================================
-def rag_interface(query):
+async def rag_interface(query):
     if not query:
-        return "⚠️ Veuillez entrer une question.", ""
+        yield "⚠️ Veuillez entrer une question.", ""
+        return
+    entry = menu.get(query) if menu is not None else None
+    if entry:
+        yield format_precomputed(entry)
+        return
     try:
-        answer = qa_chain.invoke(query)
-        return f"💡 **Réponse :**\n\n{answer}", f"📂 **Fichiers consultés :**\n(index Chroma local)"
+        t0 = time.time()
+        namespace, vector, hit = "", None, None
+        async with retrieve_limiter.slot():
+            if answer_cache is not None:
+                namespace = answer_namespace(await asyncio.to_thread(index_version, retriever),
+                                             generation_model, question_prompt.template)
+                hit, vector = await asyncio.to_thread(answer_cache.lookup, query, namespace)
+            if not hit:
+                # vecteur du lookup réutilisé (retrieval, rerank) : un seul embedding de la question
+                embedding = vector.tolist() if vector is not None else None
+                docs = await retriever.ainvoke(query, embedding=embedding)
+                rerank_note = ""
+                if reranker is not None:
+                    docs, rerank_stats = await asyncio.to_thread(reranker.rerank, query, docs, embedding)
+                    rerank_note = (f" (dont rerank {rerank_stats['rerank_ms']:.0f} ms :"
+                                   f" {rerank_stats['kept']}/{rerank_stats['candidates']} passages retenus)")
+        if hit:
+            stats = answer_cache.stats()
+            yield f"💡 **Réponse :**\n\n{hit['answer']}", (
+                format_sources(hit["sources"])
+                + f"\n\n⚡ Réponse en cache (similarité {hit['similarity']}, {(time.time() - t0) * 1000:.0f} ms,"
+                f" taux de succès {stats['hit_rate']:.0%})"
+            )
+            return
+        sources = source_names(docs)
+        retrieve_ms = (time.time() - t0) * 1000
+        sources_md = format_sources(sources) + f"\n\n🔎 Retrieval : {retrieve_ms:.0f} ms{rerank_note}"
+        yield "⏳ Génération de la réponse...", sources_md
+
+        inputs = {"context": format_context(query, docs), "question": query}
+        # routage avant la file : les questions en attente comptent dans la saturation d'un modèle
+        decision = router.route(query, docs) if router is not None else None
+        try:
+            async for position in generate_limiter.acquire():
+                yield f"⏳ File d'attente : position {position} (générations en cours : {generate_limiter.active})", sources_md
+        except BaseException:
+            if decision is not None:
+                router.cancel(decision)
+            raise
+        try:
+            tokens = stream_routed(inputs, decision) if decision is not None else answer_chain.astream(inputs)
+            answer, ttft_ms = "", None
+            async for token in tokens:
+                if ttft_ms is None:
+                    ttft_ms = (time.time() - t0) * 1000
+                answer += token
+                yield f"💡 **Réponse :**\n\n{answer}", gr.update()
+        finally:
+            await generate_limiter.release()
+        total_ms = (time.time() - t0) * 1000
+        model_note = f" | modèle {decision['model']}" if decision is not None else ""
+        print(f"⏱ Retrieval {retrieve_ms:.0f} ms{rerank_note} | premier token {ttft_ms or total_ms:.0f} ms | total {total_ms:.0f} ms{model_note}")
+        if answer_cache is not None:
+            answer_cache.store(query, answer, sources, namespace, vector)
+        yield f"💡 **Réponse :**\n\n{answer}", (
+            format_sources(sources)
+            + f"\n\n⏱ Retrieval {retrieve_ms:.0f} ms{rerank_note} | premier token {ttft_ms or total_ms:.0f} ms | total {total_ms:.0f} ms{model_note}"
+        )
+    except OverloadedError as e:
+        yield f"🚦 Assistant surchargé ({e}). Merci de réessayer dans quelques instants.", ""
     except Exception as e:
-        return f"❌ Erreur : {str(e)}", ""
+        yield f"❌ Erreur : {str(e)}", ""
 
 def resolve_question(selected, typed, action):
     if action == "typed":
@@ -208,11 +334,10 @@ with gr.Blocks(title="🧠 Assistant CWD", theme=gr.themes.Soft(primary_hue="red
 
     with gr.Row():
         with gr.Column():
-            # Sélecteur de questions prédéfinies (facilite les tests)
+            # Sélecteur de questions prédéfinies (réponses pré-calculées, rag_menu)
             question_selector = gr.Dropdown(
                 label="📋 Choisissez une question (optionnel)",
-                choices=[
-                ],
+                choices=menu.questions if menu is not None else [],
                 interactive=True
             )
             # Zone de saisie libre
@@ -247,20 +372,38 @@ with gr.Blocks(title="🧠 Assistant CWD", theme=gr.themes.Soft(primary_hue="red
         outputs=last_action
     )
 
+    # --- Question du menu déjà calculée : réponse affichée dès la sélection ---
+    def show_precomputed(selected):
+        entry = menu.get(selected) if menu is not None and selected else None
+        if not entry:
+            return gr.update(), gr.update()
+        return format_precomputed(entry)
+
+    question_selector.change(
+        fn=show_precomputed,
+        inputs=question_selector,
+        outputs=[answer_output, sources_output]
+    )
+
     # --- Affichage d'un état "réflexion" avant l'appel RAG ---
     def trigger_thinking(selector, typed, action):
         return gr.update(visible=True, value="⏳ L’assistant réfléchit..."), selector, typed, action
 
+    # --- Réponse en streaming (générateur asynchrone : Gradio affiche chaque mise à jour) ---
+    async def run_rag(selector, typed, action):
+        async for update in rag_interface(resolve_question(selector, typed, action)):
+            yield update
+
     # --- Pipeline clic:
     # 1) affiche "thinking"
-    # 2) exécute la RAG sur la question résolue
+    # 2) exécute la RAG sur la question résolue (sources, puis tokens au fil de l'eau)
     # 3) masque "thinking"
     run_button.click(
         fn=trigger_thinking,
         inputs=[question_selector, question_input, last_action],
         outputs=[thinking_output, question_selector, question_input, last_action]
     ).then(
-        fn=lambda selector, typed, action: rag_interface(resolve_question(selector, typed, action)),
+        fn=run_rag,
         inputs=[question_selector, question_input, last_action],
         outputs=[answer_output, sources_output]
     ).then(
@@ -275,6 +418,18 @@ with gr.Blocks(title="🧠 Assistant CWD", theme=gr.themes.Soft(primary_hue="red
 # - server_port=6060: port HTTP
 # - debug=True: logs détaillés (utile dev)
 # - root_path="/rag_cwd": chemin racine si derrière un proxy
+# - warm_up : modèle(s) du roster chargé(s) et préfixe du prompt évalué dès le démarrage
+#   (en arrière-plan, RAG_LLM_WARMUP=0 pour désactiver)
+# - menu.start : tâche de fond des réponses pré-calculées
+# - queue : handlers asynchrones, jusqu'à RETRIEVE_CONCURRENCY + GENERATE_QUEUE
+#   requêtes admises (les limites fines sont celles de rag_limits), au-delà
+#   Gradio met en attente puis refuse
 # =========================================================
 if __name__ == "__main__":
+    if LLM_WARMUP:
+        for model in llms.values():
+            warm_up(model, question_prompt, background=True)
+    if menu is not None:
+        menu.start()
+    demo.queue(default_concurrency_limit=RETRIEVE_CONCURRENCY + GENERATE_QUEUE, max_size=GENERATE_QUEUE)
     demo.launch(server_name="127.0.0.1", server_port=6050, debug=True, root_path="/rag_cwd")
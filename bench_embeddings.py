@@ -0,0 +1,189 @@
+# bench_embeddings.py
+# ---------------------------------------------------------
+# Banc comparatif des modèles d'embedding Ollama sur nos vrais chunks
+# ---------------------------------------------------------
+# Même jeu de chunks pour tous les modèles (rag_loader.stream_files +
+# découpeur de l'indexeur). Pour chaque modèle :
+# - débit d'embedding (chunks/s, sans cache), dimension des vecteurs
+# - taille disque de l'index (collection temporaire, backend RAG_VECTOR_BACKEND)
+# - latence par question : embedding de la question + recherche (p50/p95)
+# - recall@k et MRR sur les questions du DATASET de run_eval_offline.py
+# Pertinence (indépendante des modèles) : un chunk est pertinent pour une
+# question s'il couvre au moins --min-overlap des termes de la réponse de
+# référence (rag_lexical.tokenize) ; à défaut, le chunk qui la couvre le mieux.
+# Sortie : tableau Markdown + JSON comparatif.
+#
+# Exemple :
+#   python bench_embeddings.py --models nomic-embed-text snowflake-arctic-embed mxbai-embed-large --k 5
+# ---------------------------------------------------------
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from rag_config import DATA_DIR, EMBED_MODEL, INDEX_BATCH_SIZE, OLLAMA_BASE
+
+
+# =========================================================
+# DONNÉES
+# ---------------------------------------------------------
+# load_chunks   : chunks du corpus, découpés comme à l'indexation
+# load_examples : (question, réponse de référence) du DATASET d'évaluation
+# relevant_sets : chunks pertinents par question (recouvrement lexical)
+# =========================================================
+def load_chunks(data_dir: str = DATA_DIR, limit=None) -> List[Dict]:
+    from rag_loader import stream_files
+    chunks = []
+    for item in stream_files(data_dir):
+        chunks += [{"text": c, "metadata": item["metadata"]} for c in item["chunks"]]
+        if limit and len(chunks) >= limit:
+            return chunks[:limit]
+    if not chunks:
+        raise SystemExit(f"Aucun chunk trouvé dans {data_dir}")
+    return chunks
+
+
+def load_examples() -> List[Dict]:
+    from dataset import DATASET
+    return [{"question": ex["inputs"]["question"], "answer": ex["outputs"]["answer"]} for ex in DATASET]
+
+
+def relevant_sets(chunks: Sequence[Dict], examples: Sequence[Dict], min_overlap: float) -> List[set]:
+    from rag_lexical import tokenize
+    chunk_tokens = [set(tokenize(c["text"])) for c in chunks]
+    out = []
+    for ex in examples:
+        ref = {t for t in tokenize(ex["answer"]) if len(t) > 2}
+        if not ref:
+            out.append(set())
+            continue
+        cover = np.asarray([len(ref & toks) / len(ref) for toks in chunk_tokens])
+        rel = set(np.flatnonzero(cover >= min_overlap).tolist())
+        if not rel and cover.max() > 0:
+            rel = {int(cover.argmax())}
+        out.append(rel)
+    return out
+
+
+# =========================================================
+# MESURE D'UN MODÈLE
+# =========================================================
+def _dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / 1e6
+
+
+def run_model(model: str, chunks: Sequence[Dict], examples: Sequence[Dict], relevant: Sequence[set],
+              k: int, use_cache: bool = False) -> Dict:
+    from rag_embeddings import OllamaBatchEmbedder
+    from rag_index import open_client, open_collection
+
+    embedder = OllamaBatchEmbedder(model, OLLAMA_BASE)
+    texts = [c["text"] for c in chunks]
+    t0 = time.perf_counter()
+    vectors = embedder.embed(texts, use_cache=use_cache)
+    embed_s = time.perf_counter() - t0
+
+    workdir = tempfile.mkdtemp(prefix="bench_embed_")
+    try:
+        collection = open_collection(open_client(workdir), "bench")
+        ids = [str(i) for i in range(len(texts))]
+        for i in range(0, len(texts), INDEX_BATCH_SIZE):
+            collection.upsert(ids=ids[i:i + INDEX_BATCH_SIZE], embeddings=vectors[i:i + INDEX_BATCH_SIZE],
+                              documents=texts[i:i + INDEX_BATCH_SIZE],
+                              metadatas=[c["metadata"] for c in chunks[i:i + INDEX_BATCH_SIZE]])
+        disk_mb = _dir_size_mb(workdir)
+
+        embed_ms, search_ms, recalls, rr = [], [], [], []
+        for ex, rel in zip(examples, relevant):
+            t = time.perf_counter()
+            q = embedder.embed([ex["question"]], use_cache=False)
+            t1 = time.perf_counter()
+            got = collection.query(query_embeddings=q, n_results=min(k, len(texts)), include=[])["ids"][0]
+            t2 = time.perf_counter()
+            embed_ms.append((t1 - t) * 1000)
+            search_ms.append((t2 - t1) * 1000)
+            if not rel:
+                continue
+            ranks = [r for r, g in enumerate(got, 1) if int(g) in rel]
+            recalls.append(len(ranks) / min(len(rel), k))
+            rr.append(1 / ranks[0] if ranks else 0.0)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    total_ms = np.asarray(embed_ms) + np.asarray(search_ms)
+    return {
+        "model": model,
+        "dim": len(vectors[0]),
+        "chunks_per_s": round(len(texts) / embed_s, 1),
+        "embed_s": round(embed_s, 2),
+        "disk_mb": round(disk_mb, 1),
+        "query_embed_p50_ms": round(float(np.percentile(embed_ms, 50)), 1),
+        "search_p50_ms": round(float(np.percentile(search_ms, 50)), 2),
+        "query_p95_ms": round(float(np.percentile(total_ms, 95)), 1),
+        f"recall@{k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        "mrr": round(float(np.mean(rr)), 4) if rr else None,
+        "questions": len(recalls),
+    }
+
+
+# =========================================================
+# RAPPORT
+# =========================================================
+def to_markdown(rows: list, k: int) -> str:
+    cols = ["model", "dim", "chunks_per_s", "embed_s", "disk_mb", "query_embed_p50_ms", "search_p50_ms",
+            "query_p95_ms", f"recall@{k}", "mrr"]
+    lines = ["| " + " | ".join(cols) + " |", "|" + "---|" * len(cols)]
+    lines += ["| " + " | ".join(str(r[c]) for c in cols) + " |" for r in rows]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparatif des modèles d'embedding : coût / qualité sur le corpus")
+    parser.add_argument("--models", nargs="+",
+                        default=[EMBED_MODEL, "snowflake-arctic-embed", "mxbai-embed-large"])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-overlap", type=float, default=0.5,
+                        help="part des termes de la réponse de référence qu'un chunk pertinent doit couvrir")
+    parser.add_argument("--limit", type=int, default=None, help="nombre max de chunks (tests rapides)")
+    parser.add_argument("--cache", action="store_true", help="réutilise le cache d'embeddings (débit non mesuré)")
+    parser.add_argument("--out", default="bench_embeddings_report", help="préfixe des fichiers .md/.json")
+    args = parser.parse_args()
+
+    print("📥 Découpage du corpus...")
+    chunks = load_chunks(DATA_DIR, args.limit)
+    examples = load_examples()
+    relevant = relevant_sets(chunks, examples, args.min_overlap)
+    scored = sum(1 for r in relevant if r)
+    print(f"🧩 {len(chunks)} chunks, {len(examples)} questions ({scored} avec chunk de référence), k={args.k}")
+
+    rows = []
+    for model in args.models:
+        try:
+            row = run_model(model, chunks, examples, relevant, args.k, args.cache)
+        except Exception as e:
+            print(f"⚠️ {model} ignoré : {e}")
+            continue
+        rows.append(row)
+        print(f"⏱ {model} -> dim={row['dim']} {row['chunks_per_s']} chunks/s recall@{args.k}={row[f'recall@{args.k}']} "
+              f"MRR={row['mrr']} p95={row['query_p95_ms']}ms disque={row['disk_mb']}MB")
+
+    report = to_markdown(rows, args.k)
+    with open(args.out + ".md", "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+    with open(args.out + ".json", "w", encoding="utf-8") as f:
+        json.dump({"k": args.k, "chunks": len(chunks), "questions": scored, "min_overlap": args.min_overlap,
+                   "results": rows}, f, ensure_ascii=False, indent=2)
+    print("\n" + report)
+    print(f"✅ Rapport écrit dans {args.out}.md / {args.out}.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# bench_hnsw.py
+# ---------------------------------------------------------
+# Banc de réglage HNSW (Chroma) sur nos vrais chunks
+# ---------------------------------------------------------
+# Pour chaque combinaison (hnsw:M, construction_ef, search_ef) :
+# - construit une collection Chroma temporaire avec les vecteurs déjà indexés
+#   (aucun appel d'embedding)
+# - mesure temps de construction, taille disque, RSS, latence p50/p95
+# - calcule le recall@k contre une recherche exacte (force brute NumPy)
+# Chaque configuration tourne dans un processus neuf (RSS non pollué).
+# Sortie : tableau Markdown + JSON, recommandation et variables RAG_HNSW_*
+# à reprendre dans la configuration de l'indexeur (rag_config.py).
+#
+# Exemple :
+#   python bench_hnsw.py --M 8 16 32 --construction-ef 100 200 --search-ef 10 50 100 --k 5
+# ---------------------------------------------------------
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import get_context
+
+import numpy as np
+
+from rag_config import CHROMA_DIR, COLLECTION, EMBED_MODEL, OLLAMA_BASE
+
+
+# =========================================================
+# DONNÉES
+# ---------------------------------------------------------
+# load_vectors : embeddings de la collection réelle (rag_index.open_collection)
+# load_queries : questions du DATASET d'évaluation (embeddées) ou
+#                échantillon de chunks du corpus
+# =========================================================
+def load_vectors(limit=None) -> np.ndarray:
+    from rag_index import open_client, open_collection
+    from rag_snapshots import current_index_dir
+    data = open_collection(open_client(current_index_dir(CHROMA_DIR)), COLLECTION).get(include=["embeddings"], limit=limit)
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    if not len(vectors):
+        raise SystemExit(f"Collection {COLLECTION} vide dans {CHROMA_DIR} : lancez d'abord l'indexation.")
+    return vectors
+
+
+def load_queries(vectors: np.ndarray, source: str, n: int, seed: int) -> np.ndarray:
+    if source == "dataset":
+        from dataset import DATASET
+        from rag_embeddings import OllamaBatchEmbedder
+        questions = [ex["inputs"]["question"] for ex in DATASET]
+        return np.asarray(OllamaBatchEmbedder(EMBED_MODEL, OLLAMA_BASE).embed(questions, use_cache=False),
+                          dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(vectors), size=min(n, len(vectors)), replace=False)
+    # léger bruit : une requête n'est jamais strictement identique à un chunk
+    noise = rng.normal(0, 0.01, size=(len(picked), vectors.shape[1])).astype(np.float32)
+    return vectors[picked] + noise
+
+
+def exact_topk(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    v = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    sims = v @ q.T
+    top = np.argpartition(-sims, k - 1, axis=0)[:k]
+    return top.T
+
+
+# =========================================================
+# MESURE D'UNE CONFIGURATION (processus dédié)
+# =========================================================
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def _dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / 1e6
+
+
+def run_config(vec_path: str, query_path: str, truth_path: str, M: int, cef: int, sef: int, k: int) -> dict:
+    import chromadb
+
+    vectors = np.load(vec_path, mmap_mode="r")
+    queries = np.load(query_path)
+    truth = np.load(truth_path)
+    workdir = tempfile.mkdtemp(prefix="bench_hnsw_")
+    try:
+        rss0 = _rss_mb()
+        client = chromadb.PersistentClient(path=workdir)
+        col = client.create_collection(
+            name="bench",
+            metadata={"hnsw:space": "cosine", "hnsw:M": M, "hnsw:construction_ef": cef, "hnsw:search_ef": sef},
+        )
+        t0 = time.perf_counter()
+        ids = [str(i) for i in range(len(vectors))]
+        step = 4096
+        for i in range(0, len(vectors), step):
+            col.add(ids=ids[i:i + step], embeddings=np.asarray(vectors[i:i + step]).tolist())
+        build_s = time.perf_counter() - t0
+
+        latencies, recalls = [], []
+        for q, expected in zip(queries, truth):
+            t = time.perf_counter()
+            got = col.query(query_embeddings=[q.tolist()], n_results=k, include=[])["ids"][0]
+            latencies.append((time.perf_counter() - t) * 1000)
+            recalls.append(len({int(g) for g in got} & set(expected.tolist())) / k)
+        return {
+            "M": M, "construction_ef": cef, "search_ef": sef,
+            "build_s": round(build_s, 2),
+            "disk_mb": round(_dir_size_mb(workdir), 1),
+            "rss_mb": round(_rss_mb() - rss0, 1),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            f"recall@{k}": round(float(np.mean(recalls)), 4),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# =========================================================
+# RAPPORT & RECOMMANDATION
+# ---------------------------------------------------------
+# Recommandation : recall >= cible, puis p95 minimal, puis mémoire minimale.
+# Si aucune configuration n'atteint la cible : meilleur recall.
+# =========================================================
+def recommend(rows: list, k: int, target: float) -> dict:
+    key = f"recall@{k}"
+    ok = [r for r in rows if r[key] >= target]
+    if ok:
+        return min(ok, key=lambda r: (r["p95_ms"], r["rss_mb"], r["build_s"]))
+    return max(rows, key=lambda r: (r[key], -r["p95_ms"]))
+
+
+def to_markdown(rows: list, k: int) -> str:
+    cols = ["M", "construction_ef", "search_ef", "build_s", "disk_mb", "rss_mb", "p50_ms", "p95_ms", f"recall@{k}"]
+    lines = ["| " + " | ".join(cols) + " |", "|" + "---|" * len(cols)]
+    lines += ["| " + " | ".join(str(r[c]) for c in cols) + " |" for r in rows]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réglage HNSW : courbes recall / latence sur le corpus indexé")
+    parser.add_argument("--M", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", choices=["sample", "dataset"], default="sample")
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=None, help="nombre max de chunks (tests rapides)")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_hnsw_report", help="préfixe des fichiers .md/.json")
+    args = parser.parse_args()
+
+    print("📥 Chargement des vecteurs de la collection...")
+    vectors = load_vectors(args.limit)
+    queries = load_queries(vectors, args.queries, args.n_queries, args.seed)
+    truth = exact_topk(vectors, queries, args.k)
+    print(f"🧩 {len(vectors)} chunks (dim {vectors.shape[1]}), {len(queries)} requêtes, k={args.k}")
+
+    tmp = tempfile.mkdtemp(prefix="bench_hnsw_data_")
+    paths = [os.path.join(tmp, f) for f in ("vectors.npy", "queries.npy", "truth.npy")]
+    for path, arr in zip(paths, (vectors, queries, truth)):
+        np.save(path, arr)
+
+    rows = []
+    try:
+        for M, cef, sef in product(args.M, args.construction_ef, args.search_ef):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                row = pool.submit(run_config, *paths, M, cef, sef, args.k).result()
+            rows.append(row)
+            print(f"⏱ M={M} cef={cef} sef={sef} -> recall@{args.k}={row[f'recall@{args.k}']} "
+                  f"p95={row['p95_ms']}ms build={row['build_s']}s rss={row['rss_mb']}MB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    best = recommend(rows, args.k, args.target_recall)
+    env = {
+        "RAG_HNSW_M": best["M"],
+        "RAG_HNSW_CONSTRUCTION_EF": best["construction_ef"],
+        "RAG_HNSW_SEARCH_EF": best["search_ef"],
+    }
+    report = to_markdown(rows, args.k)
+    report += (f"\n\n**Recommandation** (recall@{args.k} ≥ {args.target_recall}, p95 minimal) : "
+               f"M={best['M']}, construction_ef={best['construction_ef']}, search_ef={best['search_ef']}\n\n"
+               "À appliquer à l'indexeur :\n\n```bash\n"
+               + "\n".join(f"export {k}={v}" for k, v in env.items()) + "\n```\n")
+
+    with open(args.out + ".md", "w", encoding="utf-8") as f:
+        f.write(report)
+    with open(args.out + ".json", "w", encoding="utf-8") as f:
+        json.dump({"k": args.k, "chunks": len(vectors), "results": rows, "recommended": best, "env": env},
+                  f, ensure_ascii=False, indent=2)
+    print("\n" + report)
+    print(f"✅ Rapport écrit dans {args.out}.md / {args.out}.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# bench_llm_warm.py
+# ---------------------------------------------------------
+# Mesures à froid / à chaud du modèle de génération (Ollama)
+# ---------------------------------------------------------
+# Compare, pour des questions réelles (retriever + format_context) :
+# 1) froid       : modèle déchargé, sans préchauffage (situation avant keep_alive)
+# 2) préchauffé  : après warm_up (modèle chargé + préfixe statique évalué)
+# 3) à chaud     : question suivante, même préfixe (cache de prompt d'Ollama)
+# 4) préfixe variable : contexte placé avant les consignes (disposition non
+#    compatible avec le cache) -> tout le prompt est réévalué
+# Colonnes : chargement, tokens de prompt évalués (hors cache), temps
+# d'évaluation du prompt, génération, total (statistiques renvoyées par Ollama).
+#
+# Exemple :
+#   python bench_llm_warm.py --model gpt-oss:latest --questions "Comment graisser sa selle ?" "Quelle garantie ?"
+# ---------------------------------------------------------
+import argparse
+import json
+
+from langchain_core.prompts import PromptTemplate
+from langchain_ollama import OllamaLLM
+
+from rag_config import LLM_KEEP_ALIVE, OLLAMA_BASE
+from rag_context import format_context
+from rag_prompts import generate, rag_prompt, unload, warm_up
+
+INSTRUCTIONS = """
+Vous êtes un assistant technique de la marque CWD. Répondez de manière directe, concise et strictement factuelle,
+en vous appuyant uniquement sur les documents fournis, et citez le nom du fichier source.
+"""
+
+
+def to_markdown(rows: list) -> str:
+    cols = ["scenario", "load_ms", "prompt_tokens", "prompt_eval_ms", "eval_ms", "total_ms"]
+    lines = ["| " + " | ".join(cols) + " |", "|" + "---|" * len(cols)]
+    lines += ["| " + " | ".join(str(r[c]) for c in cols) + " |" for r in rows]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence à froid / à chaud du LLM (keep_alive, cache de prompt)")
+    parser.add_argument("--model", default="gpt-oss:latest")
+    parser.add_argument("--questions", nargs="+",
+                        default=["Comment graisser sa selle ?", "Quelle est la durée de vie moyenne d'une selle ?"])
+    parser.add_argument("--num-predict", type=int, default=32, help="tokens générés par requête")
+    parser.add_argument("--out", default="bench_llm_warm_report", help="préfixe des fichiers .md/.json")
+    args = parser.parse_args()
+    if len(args.questions) < 2:
+        parser.error("au moins deux questions (mesure à chaud sur la seconde)")
+
+    from rag_service import connect_retriever
+    retriever = connect_retriever(search_type="mmr", k=5, fetch_k=20, lambda_mult=0.5)
+    items = [(q, format_context(q, retriever.invoke(q))) for q in args.questions]
+
+    llm = OllamaLLM(model=args.model, base_url=OLLAMA_BASE, temperature=0.1, num_ctx=8192, keep_alive=LLM_KEEP_ALIVE)
+    prompt = rag_prompt(INSTRUCTIONS)
+    variable_first = PromptTemplate.from_template(
+        "=== CONTEXTE ===\n{context}\n\n=== QUESTION ===\n{question}\n\n" + INSTRUCTIONS.strip() + "\n\n=== RÉPONSE ===\n"
+    )
+
+    def run(label, template, question, context):
+        stats = generate(llm, template.format(context=context, question=question), num_predict=args.num_predict)
+        row = {"scenario": label, **stats}
+        print(f"⏱ {label} : chargement {stats['load_ms']} ms, {stats['prompt_tokens']} tokens de prompt "
+              f"({stats['prompt_eval_ms']} ms), total {stats['total_ms']} ms")
+        return row
+
+    rows = []
+    print(f"🧊 Déchargement de {args.model}...")
+    unload(llm)
+    rows.append(run("froid (sans préchauffage)", prompt, *items[0]))
+
+    unload(llm)
+    warm_up(llm, prompt)
+    rows.append(run("préchauffé (préfixe en cache)", prompt, *items[0]))
+    rows.append(run("à chaud, question suivante", prompt, *items[1]))
+    rows.append(run("préfixe variable (contexte en tête)", variable_first, *items[0]))
+    rows.append(run("préfixe variable, question suivante", variable_first, *items[1]))
+
+    report = to_markdown(rows)
+    with open(args.out + ".md", "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+    with open(args.out + ".json", "w", encoding="utf-8") as f:
+        json.dump({"model": args.model, "keep_alive": LLM_KEEP_ALIVE, "num_predict": args.num_predict,
+                   "results": rows}, f, ensure_ascii=False, indent=2)
+    print("\n" + report)
+    print(f"✅ Rapport écrit dans {args.out}.md / {args.out}.json")
+
+
+if __name__ == "__main__":
+    main()
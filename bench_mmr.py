@@ -0,0 +1,128 @@
+# bench_mmr.py
+# ---------------------------------------------------------
+# Microbenchmark MMR : chemin LangChain/Chroma d'origine vs rag_mmr
+# ---------------------------------------------------------
+# 1) sélection seule (vecteurs aléatoires, dimension --dim) :
+#    langchain maximal_marginal_relevance vs mmr_select, mêmes indices attendus
+# 2) recherche complète sur l'index courant (si disponible) :
+#    - origine  : db.max_marginal_relevance_search_by_vector (candidats relus
+#                 avec leurs embeddings dans Chroma à chaque question)
+#    - rag_mmr  : VectorMMR (ids/documents depuis Chroma, vecteurs en mémoire)
+#    latence p50/p95 par fetch_k, recouvrement des chunks retenus (ensemble,
+#    l'ordre de sélection MMR de rag_mmr diffère de l'ordre Chroma)
+# Sortie : tableau Markdown + JSON.
+#
+# Exemple :
+#   python bench_mmr.py --fetch-k 20 50 100 200 --k 5 --repeat 20
+# ---------------------------------------------------------
+import argparse
+import json
+import time
+
+import numpy as np
+
+from rag_config import SMOKE_QUERIES
+from rag_mmr import VectorMMR, mmr_select
+
+
+def _timed(fn, repeat: int):
+    latencies = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        latencies.append((time.perf_counter() - t) * 1000)
+    return out, latencies
+
+
+def _row(part: str, path: str, fetch_k: int, latencies, agreement: float) -> dict:
+    return {"part": part, "path": path, "fetch_k": fetch_k,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "agreement": round(agreement, 3)}
+
+
+# =========================================================
+# 1) SÉLECTION SEULE
+# =========================================================
+def bench_selection(fetch_ks, k: int, lambda_mult: float, dim: int, repeat: int, seed: int) -> list:
+    from langchain_community.vectorstores.utils import maximal_marginal_relevance
+    rng = np.random.default_rng(seed)
+    rows = []
+    for fetch_k in fetch_ks:
+        query = rng.normal(size=dim).astype(np.float32)
+        candidates = rng.normal(size=(fetch_k, dim)).astype(np.float32)
+        as_lists = candidates.tolist()   # format renvoyé par Chroma au chemin d'origine
+        ref, t_ref = _timed(lambda: maximal_marginal_relevance(query, as_lists, k=k, lambda_mult=lambda_mult), repeat)
+        got, t_new = _timed(lambda: mmr_select(query, candidates, k, lambda_mult), repeat)
+        same = float(list(ref) == list(got))
+        rows.append(_row("sélection", "langchain maximal_marginal_relevance", fetch_k, t_ref, 1.0))
+        rows.append(_row("sélection", "rag_mmr.mmr_select", fetch_k, t_new, same))
+    return rows
+
+
+# =========================================================
+# 2) RECHERCHE COMPLÈTE SUR L'INDEX COURANT
+# =========================================================
+def bench_index(fetch_ks, k: int, lambda_mult: float, repeat: int, questions) -> list:
+    from rag_service import open_local_stores
+    stores, path, embed_model = open_local_stores()
+    name, db = next(iter(stores.items()))
+    print(f"📦 Index {path} ({name}, {db._collection.count()} chunks)")
+    vectors = [embed_model.embed_query(q) for q in questions]
+
+    t0 = time.perf_counter()
+    mmr = VectorMMR(db, preload=True)
+    print(f"🔥 Préchargement des vecteurs : {(time.perf_counter() - t0) * 1000:.0f} ms ({mmr.stats()})")
+
+    rows = []
+    for fetch_k in fetch_ks:
+        t_ref, t_new, agreement = [], [], []
+        for v in vectors:
+            ref, lat = _timed(lambda: db.max_marginal_relevance_search_by_vector(
+                v, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult), repeat)
+            t_ref += lat
+            got, lat = _timed(lambda: mmr.search_by_vector(v, k, fetch_k, lambda_mult), repeat)
+            t_new += lat
+            expected = {d.page_content for d in ref}
+            agreement.append(len(expected & {d.page_content for d in got}) / max(len(expected), 1))
+        rows.append(_row("index", "db.max_marginal_relevance_search_by_vector", fetch_k, t_ref, 1.0))
+        rows.append(_row("index", "rag_mmr.VectorMMR (cache chaud)", fetch_k, t_new, float(np.mean(agreement))))
+    return rows
+
+
+def to_markdown(rows: list) -> str:
+    cols = ["part", "path", "fetch_k", "p50_ms", "p95_ms", "agreement"]
+    lines = ["| " + " | ".join(cols) + " |", "|" + "---|" * len(cols)]
+    lines += ["| " + " | ".join(str(r[c]) for c in cols) + " |" for r in rows]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MMR LangChain/Chroma vs MMR vectorisé (rag_mmr)")
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[20, 50, 100, 200])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--dim", type=int, default=768, help="dimension des vecteurs (partie sélection)")
+    parser.add_argument("--repeat", type=int, default=20, help="répétitions par mesure")
+    parser.add_argument("--questions", nargs="+", default=list(SMOKE_QUERIES))
+    parser.add_argument("--selection-only", action="store_true", help="sans l'index courant")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_mmr_report", help="préfixe des fichiers .md/.json")
+    args = parser.parse_args()
+
+    rows = bench_selection(args.fetch_k, args.k, args.lambda_mult, args.dim, args.repeat, args.seed)
+    if not args.selection_only:
+        rows += bench_index(args.fetch_k, args.k, args.lambda_mult, args.repeat, args.questions)
+
+    report = to_markdown(rows)
+    with open(args.out + ".md", "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+    with open(args.out + ".json", "w", encoding="utf-8") as f:
+        json.dump({"k": args.k, "lambda_mult": args.lambda_mult, "repeat": args.repeat, "results": rows},
+                  f, ensure_ascii=False, indent=2)
+    print("\n" + report)
+    print(f"✅ Rapport écrit dans {args.out}.md / {args.out}.json")
+
+
+if __name__ == "__main__":
+    main()
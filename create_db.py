@@ -1,17 +1,22 @@
 #%%
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Document
+from llama_index.core import VectorStoreIndex, Document
 from llama_index.core.agent.workflow import FunctionAgent
 # from llama_index.llms.openai import OpenAI
 from llama_index.core import Settings
 from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.ollama import OllamaEmbedding
+from llama_index.vector_stores.chroma import ChromaVectorStore
 
-# snowflake-arctic-embed
-embed_model = OllamaEmbedding(
-    model_name="nomic-embed-text",
+from rag_config import DATA_DIR, CHROMA_DIR, RERANK_CANDIDATES, VECTOR_BACKEND
+from rag_embeddings import llama_index_embedding
+from rag_rerank import get_reranker, llama_index_postprocessor
+from rag_snapshots import open_index
+
+# snowflake-arctic-embed : comparer les modèles avec bench_embeddings.py
+embed_model = llama_index_embedding(
+    model="nomic-embed-text",
     base_url="http://localhost:11434",
     # ollama_additional_kwargs={"mirostat": 0},
-    num_ctx=80000, 
+    options={"num_ctx": 80000},
 )
 Settings.embed_model = embed_model
 # Configurez le modèle Ollama
@@ -22,10 +27,23 @@ Settings.llm = Ollama(model="gemma3:27b", num_ctx=80000, base_url="http://localh
 
 # Create a RAG tool using LlamaIndex
 # documents = SimpleDirectoryReader(r'/var/www/RAG/Data_parse', recursive=True).load_data()
-documents = SimpleDirectoryReader(r'/var/www/RAG/Data_parse/', recursive=True).load_data()
-print( documents )
-index = VectorStoreIndex.from_documents(documents,show_progress=True,embed_model=embed_model)
-query_engine = index.as_query_engine()
+# Index Chroma persistant partagé : rechargé si le manifeste correspond,
+# mis à jour de façon incrémentale sinon (plus de VectorStoreIndex en mémoire à chaque run)
+# (RAG_VECTOR_BACKEND=numpy -> vector store mmap de rag_npstore)
+_, collection, _ = open_index(embed_model.get_text_embedding_batch, "nomic-embed-text", DATA_DIR, CHROMA_DIR)
+if VECTOR_BACKEND == "numpy":
+    from rag_npstore import llama_index_vector_store
+    vector_store = llama_index_vector_store(collection)
+else:
+    vector_store = ChromaVectorStore(chroma_collection=collection)
+index = VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
+# Reranking (RAG_RERANK) : RERANK_CANDIDATES nœuds récupérés, seuls les meilleurs au-dessus du seuil vont au LLM
+reranker = get_reranker()
+if reranker is not None:
+    query_engine = index.as_query_engine(similarity_top_k=RERANK_CANDIDATES,
+                                         node_postprocessors=[llama_index_postprocessor(reranker)])
+else:
+    query_engine = index.as_query_engine()
 
 
 # Exemple de requête
@@ -1,33 +1,11 @@
-import os
-import re
 import time  # Pour mesurer le temps de réponse
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_ollama import OllamaLLM
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain.prompts import ChatPromptTemplate
 
-# =========================================================
-# CONFIGURATION GLOBALE
-# ---------------------------------------------------------
-# DATA_DIR   : répertoire où se trouvent les documents
-# CHROMA_DIR : répertoire où sera stocké l’index Chroma
-# =========================================================
-DATA_DIR = "/var/www/RAG/Data_parse"
-CHROMA_DIR = "/var/www/RAG/chroma_index"
-
-# =========================================================
-# EMBEDDING MODEL (Ollama)
-# ---------------------------------------------------------
-# Modèle utilisé : "nomic-embed-text"
-# Sert à transformer le texte en vecteurs numériques
-# =========================================================
-embed_model = OllamaEmbeddings(
-    model="nomic-embed-text", 
-    base_url="http://localhost:11434"
-)
+from rag_context import format_context
+from rag_prompts import rag_prompt
+from rag_router import ModelRouter
+from rag_service import connect_retriever
 
 # =========================================================
 # LISTE DE MODELES LLM A TESTER
@@ -78,65 +56,17 @@ models = [
     )
 ]
 
-# =========================================================
-# NETTOYAGE TEXTE
-# ---------------------------------------------------------
-# - supprime les espaces multiples
-# - remplace les espaces insécables
-# =========================================================
-def clean_text(text: str) -> str:
-    text = re.sub(r'\s+', ' ', text)
-    text = text.replace('\u00A0', ' ')
-    return text
-
-# =========================================================
-# CHARGEMENT & NETTOYAGE DOCUMENTS
-# ---------------------------------------------------------
-# - charge récursivement les fichiers texte
-# - nettoie le contenu avec clean_text
-# =========================================================
-def load_and_clean_docs():
-    loader = DirectoryLoader(
-        DATA_DIR,
-        glob="**/*",
-        loader_cls=TextLoader,
-        show_progress=True,
-        use_multithreading=True,
-        loader_kwargs={"autodetect_encoding": True}
-    )
-    docs = loader.load()
-    for doc in docs:
-        doc.page_content = clean_text(doc.page_content)
-    return docs
-
-# =========================================================
-# CONSTRUCTION OU RECHARGEMENT DE L’INDEX CHROMA
-# ---------------------------------------------------------
-# - si CHROMA_DIR existe : recharge l’index
-# - sinon : crée un nouvel index à partir des documents
-# =========================================================
-if os.path.exists(CHROMA_DIR):
-    db = Chroma(persist_directory=CHROMA_DIR, embedding_function=embed_model)
-else:
-    print("📚 Création de l’index vectoriel...")
-    docs = load_and_clean_docs()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_documents(docs)
-    db = Chroma.from_documents(chunks, embed_model, persist_directory=CHROMA_DIR)
-    db.persist()
-
 # =========================================================
 # RETRIEVER
 # ---------------------------------------------------------
-# - MMR (Maximal Marginal Relevance)
-#   * k=5 résultats finaux
-#   * fetch_k=20 candidats initiaux
-#   * lambda=0.5 équilibre pertinence/diversité
+# - Service de retrieval partagé (rag_service.py) s'il tourne,
+#   sinon index Chroma local (même configuration : rag_config)
+# - Méthode : MMR (Maximal Marginal Relevance)
+#   * k=5     : nombre final de passages retournés
+#   * fetch_k : 20 candidats initiaux
+#   * lambda_mult=0.5 : équilibre entre pertinence & diversité
 # =========================================================
-retriever = db.as_retriever(
-    search_type="mmr",
-    search_kwargs={"k": 5 , "fetch_k": 20 , "lambda": 0.5}
-)
+retriever = connect_retriever(search_type="mmr", k=5, fetch_k=20, lambda_mult=0.5)
 
 # =========================================================
 # PROMPT RAG
@@ -145,8 +75,9 @@ retriever = db.as_retriever(
 # - réponse précise et factuelle
 # - pas d'invention
 # - citer la source
+# - rag_prompt : consignes en préfixe fixe, contexte et question en fin
 # =========================================================
-question_prompt = ChatPromptTemplate.from_template(""" 
+question_prompt = rag_prompt("""
 Vous êtes un assistant expert de la marque CWD. Répondez  en vous basant sur les documents fournis.
 
 Contraintes :
@@ -155,40 +86,31 @@ Contraintes :
 - **Ne reformulez pas la question**
 - **N’ajoutez pas de conseils, génériques ou hors sujet**
 - Si une information est utilisée, citez sa **source (nom du document)**
-
-=== CONTEXTE ===
-{context}
-
-=== QUESTION ===
-{question}
-
-=== RÉPONSE COURTE ===
-""")
+""", answer_header="=== RÉPONSE COURTE ===")
 
 # =========================================================
-# FORMATAGE DES DOCUMENTS POUR LE CONTEXTE
+# CHAÎNE QA
+# ---------------------------------------------------------
+# - prend un modèle + une question (+ contexte déjà construit)
+# - contexte : format_context (rag_context), chunks étiquetés et
+#   dédoublonnés sous budget RAG_CONTEXT_TOKENS
+# - renvoie la réponse générée
 # =========================================================
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+def get_response_for_model(model, query, context=None):
+    if context is None:
+        context = format_context(query, retriever.invoke(query))
+    qa_chain = question_prompt | model | StrOutputParser()
+    return qa_chain.invoke({"context": context, "question": query})
 
 # =========================================================
-# CHAÎNE QA
+# ROUTEUR (rag_router)
 # ---------------------------------------------------------
-# - prend un modèle + une question
-# - exécute la RAG chain
-# - renvoie la réponse générée
+# - modèles ci-dessus, supposés rangés du plus rapide au plus lourd
+# - affiche le modèle que choisirait le routeur pour chaque question,
+#   à comparer aux réponses et durées de tous les modèles (réglage des
+#   seuils RAG_ROUTER_THRESHOLDS) ; journal RAG_ROUTER_LOG
 # =========================================================
-def get_response_for_model(model, query):
-    qa_chain = (
-        {
-            "context": retriever | format_docs,
-            "question": RunnablePassthrough(),
-        }
-        | question_prompt
-        | model
-        | StrOutputParser()
-    )
-    return qa_chain.invoke(query)
+router = ModelRouter([m.model for m in models])
 
 # =========================================================
 # INTERFACE TERMINAL (tests multi-modèles)
@@ -207,18 +129,32 @@ while True:
             print("👋 Fin du programme.")
             break
         
-        # Test pour chaque modèle configuré
-        for model in models:
-            print(f"🔄 Test du modèle: {model.model}")
-            start_time = time.time()
-            response = get_response_for_model(model, query)
-            end_time = time.time()
-            duration = end_time - start_time
+        # Même contexte pour tous les modèles : un seul retrieval par question
+        docs = retriever.invoke(query)
+        context = format_context(query, docs)
+        decision = router.route(query, docs)
+        print(f"🧭 Modèle choisi par le routeur : {decision['model']} (complexité {decision['score']}, {decision['features']})")
+        durations = {}
 
-            # Affichage
-            print(f"\n🧠 Réponse du modèle {model.model} :\n", response)
-            print(f"⏱ Durée de réflexion : {duration:.2f} secondes")
-            print("-" * 60)
+        # Test pour chaque modèle configuré
+        # (échec ou Ctrl+C en cours de boucle : la place réservée par route() est rendue)
+        try:
+            for model in models:
+                print(f"🔄 Test du modèle: {model.model}")
+                start_time = time.time()
+                response = get_response_for_model(model, query, context)
+                end_time = time.time()
+                duration = end_time - start_time
+                durations[model.model] = duration
+
+                # Affichage
+                print(f"\n🧠 Réponse du modèle {model.model} :\n", response)
+                print(f"⏱ Durée de réflexion : {duration:.2f} secondes")
+                print("-" * 60)
+        except BaseException:
+            router.cancel(decision)
+            raise
+        router.record(decision, durations[decision["model"]] * 1000)
 
     except KeyboardInterrupt:
         print("\n👋 Interrompu.")
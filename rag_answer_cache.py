@@ -0,0 +1,149 @@
+# rag_answer_cache.py
+# ---------------------------------------------------------
+# Cache sémantique des réponses (questions répétées)
+# ---------------------------------------------------------
+# - Clé : embedding de la question (EMBED_MODEL ; jamais écrit dans le cache
+#   d'embeddings disque, réservé aux chunks)
+# - Succès : similarité cosinus >= ANSWER_CACHE_THRESHOLD avec une question
+#   déjà répondue citant les mêmes produits (codes SE / matière, marque :
+#   question_products) -> réponse + sources renvoyées sans retrieval ni génération
+# - Invalidation : chaque entrée porte un espace de noms (version de l'index,
+#   modèle de génération, empreinte du prompt) ; tout changement vide le cache
+# - Expiration : ANSWER_CACHE_TTL secondes ; éviction LRU au-delà de ANSWER_CACHE_SIZE
+# - Métriques : stats() -> succès, échecs, taux de succès, évictions, expirations
+# Cache en mémoire, propre au processus (une instance par interface).
+# ---------------------------------------------------------
+import functools
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_config import (
+    ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, EMBED_MODEL, OLLAMA_BASE,
+)
+from rag_lexical import NOT_CODES, SADDLE_RE, UPPER_CODE_RE
+from rag_metadata import BRANDS
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+def answer_namespace(index_version: str, model: str, prompt: str) -> str:
+    """Espace de noms des entrées : version de l'index + modèle + empreinte du prompt."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    return f"{index_version}|{model}|{digest}"
+
+
+def question_products(question: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """(codes cités, marques citées) : "SE123" et "SE124" ont des embeddings presque identiques."""
+    codes = {f"SE{m.group(1)}" for m in SADDLE_RE.finditer(question)}
+    codes |= {c for c in UPPER_CODE_RE.findall(SADDLE_RE.sub(" ", question)) if c not in NOT_CODES}
+    words = set(re.findall(r"\w+", question.upper()))
+    return tuple(sorted(codes)), tuple(b for b in BRANDS if b in words)
+
+
+# =========================================================
+# CACHE
+# ---------------------------------------------------------
+# lookup(question, namespace) -> (entrée ou None, vecteur de la question normalisé,
+#   repris par le retrieval en cas d'échec : retriever.invoke(q, embedding=...))
+#   entrée = {"question", "answer", "sources", "similarity", "age_s"} ; seules
+#   les entrées aux mêmes produits (question_products) sont candidates
+# store(question, answer, sources, namespace, vector) : vecteur de lookup réutilisé
+# Recherche exacte : produit scalaire sur la matrice des entrées (quelques
+# centaines de vecteurs normalisés, < 1 ms).
+# =========================================================
+class SemanticAnswerCache:
+    def __init__(self, embed: Optional[EmbedFn] = None, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_SIZE):
+        if embed is None:
+            from rag_embeddings import OllamaBatchEmbedder
+            embed = functools.partial(OllamaBatchEmbedder(EMBED_MODEL, OLLAMA_BASE).embed, use_cache=False)
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace: Optional[str] = None
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._next_id = 0
+        self._matrix: Optional[np.ndarray] = None   # reconstruite paresseusement
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def _vector(self, question: str) -> np.ndarray:
+        v = np.asarray(self.embed([question.strip()])[0], dtype=np.float32)
+        return v / (np.linalg.norm(v) + 1e-12)
+
+    def _check_namespace(self, namespace: str) -> None:
+        if namespace != self.namespace:
+            if self._entries:
+                self.counters["invalidations"] += 1
+                print(f"🧹 Cache de réponses vidé ({len(self._entries)} entrées) : index, modèle ou prompt modifié")
+            self._entries.clear()
+            self._matrix = None
+            self.namespace = namespace
+
+    def _expire(self, now: float) -> None:
+        expired = [i for i, e in self._entries.items() if now - e["created"] > self.ttl]
+        for i in expired:
+            del self._entries[i]
+        if expired:
+            self.counters["expired"] += len(expired)
+            self._matrix = None
+
+    def lookup(self, question: str, namespace: str = "") -> Tuple[Optional[Dict], np.ndarray]:
+        vector = self._vector(question)
+        products = question_products(question)
+        now = time.time()
+        with self._lock:
+            self._check_namespace(namespace)
+            self._expire(now)
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix = np.stack([e["vector"] for e in self._entries.values()])
+                same = np.array([e["products"] == products for e in self._entries.values()])
+                sims = np.where(same, self._matrix @ vector, -np.inf)
+                best = int(sims.argmax())
+                if sims[best] >= self.threshold:
+                    key = list(self._entries)[best]
+                    self._entries.move_to_end(key)
+                    self._matrix = None
+                    entry = self._entries[key]
+                    self.counters["hits"] += 1
+                    return {"question": entry["question"], "answer": entry["answer"], "sources": entry["sources"],
+                            "similarity": round(float(sims[best]), 4), "age_s": round(now - entry["created"], 1)}, vector
+            self.counters["misses"] += 1
+            return None, vector
+
+    def store(self, question: str, answer: str, sources: Sequence = (), namespace: str = "",
+              vector: Optional[np.ndarray] = None) -> None:
+        if vector is None:
+            vector = self._vector(question)
+        with self._lock:
+            self._check_namespace(namespace)
+            self._entries[self._next_id] = {"question": question, "answer": answer, "sources": list(sources),
+                                            "products": question_products(question), "vector": vector,
+                                            "created": time.time()}
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self._matrix = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.counters["hits"] + self.counters["misses"]
+            return {**self.counters, "entries": len(self._entries),
+                    "hit_rate": round(self.counters["hits"] / total, 4) if total else 0.0}
+
+
+__all__ = ["answer_namespace", "question_products", "SemanticAnswerCache"]
@@ -0,0 +1,248 @@
+# rag_chunking.py
+# ---------------------------------------------------------
+# Découpage guidé par la structure Markdown, budget en tokens
+# ---------------------------------------------------------
+# Nos convertisseurs (docling, OCR, pptx, vidéo) produisent des titres #/##.
+# Plutôt que des fragments de 500 caractères qui coupent au milieu des
+# sections, on :
+# - découpe le document en sections sur les titres (hors blocs de code)
+# - regroupe des sections entières tant que le budget de tokens est respecté
+#   (tokens mesurés avec le tokenizer du modèle d'embedding)
+# - préfixe chaque chunk par son chemin de titres ("Titre > Sous-titre")
+# - ne redécoupe (paragraphes, puis phrases, puis mots) que les sections
+#   trop longues pour tenir seules dans le budget
+# Disponible pour LangChain (MarkdownSectionSplitter) et LlamaIndex
+# (llama_index_splitter).
+# ---------------------------------------------------------
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain.text_splitter import TextSplitter
+
+from rag_config import CHUNK_TOKENS, CHUNK_TOKENIZER
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+APPROX_TOKENIZER = "approx"
+
+
+# =========================================================
+# COMPTAGE DE TOKENS
+# ---------------------------------------------------------
+# TokenCounter : tokenizer HuggingFace du modèle d'embedding (paquet
+# `tokenizers`) ; CHUNK_TOKENIZER=approx : estimation ~4 caractères/token.
+# Échec de chargement = erreur, pas de repli silencieux : les chunks (et le
+# manifeste, qui note CHUNK_TOKENIZER) ne changent pas au gré du réseau.
+# Picklable : le tokenizer résolu voyage sérialisé (JSON) vers les workers de
+# rag_loader, qui ne le rechargent pas.
+# get_token_counter : instance partagée (chargée une seule fois)
+# set_token_counter : instance reçue du processus parent
+# =========================================================
+class TokenCounter:
+    def __init__(self, name: str = CHUNK_TOKENIZER):
+        self.name = name
+        self._tok = None
+        if name == APPROX_TOKENIZER:
+            return
+        try:
+            from tokenizers import Tokenizer
+            # chemin local (tokenizer.json) ou identifiant HuggingFace
+            self._tok = Tokenizer.from_file(name) if os.path.isfile(name) else Tokenizer.from_pretrained(name)
+        except Exception as e:
+            raise RuntimeError(
+                f"Tokenizer {name} indisponible ({e.__class__.__name__}: {e}) : installez `tokenizers`, "
+                f"indiquez un tokenizer.json local, ou RAG_CHUNK_TOKENIZER={APPROX_TOKENIZER} (~4 caractères/token)"
+            ) from e
+
+    def __getstate__(self) -> Dict:
+        return {"name": self.name, "json": self._tok.to_str() if self._tok is not None else None}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.name, self._tok = state["name"], None
+        if state["json"] is not None:
+            from tokenizers import Tokenizer
+            self._tok = Tokenizer.from_str(state["json"])
+
+    def __call__(self, text: str) -> int:
+        if self._tok is not None:
+            return len(self._tok.encode(text, add_special_tokens=False).ids)
+        return max(1, len(text) // 4)
+
+
+_COUNTER: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    global _COUNTER
+    if _COUNTER is None:
+        _COUNTER = TokenCounter()
+    return _COUNTER
+
+
+def set_token_counter(counter: TokenCounter) -> None:
+    global _COUNTER
+    _COUNTER = counter
+
+
+# =========================================================
+# SECTIONS MARKDOWN
+# ---------------------------------------------------------
+# parse_sections(text) -> [(chemin de titres, ligne de titre, corps)]
+# Le texte avant le premier titre forme une section sans titre.
+# =========================================================
+def parse_sections(text: str) -> List[Tuple[List[str], str, str]]:
+    sections = []
+    path: List[Tuple[int, str]] = []
+    heading, body = "", []
+    in_fence = False
+
+    def flush():
+        if heading or "".join(body).strip():
+            sections.append(([t for _, t in path], heading, "\n".join(body).strip()))
+
+    for line in text.splitlines():
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        m = None if in_fence else HEADING_RE.match(line)
+        if m:
+            flush()
+            level, title = len(m.group(1)), m.group(2).strip()
+            path = [(lv, t) for lv, t in path if lv < level] + [(level, title)]
+            heading, body = line.strip(), []
+        else:
+            body.append(line)
+    flush()
+    return sections
+
+
+# =========================================================
+# DÉCOUPEUR
+# =========================================================
+class MarkdownSectionChunker:
+    def __init__(self, max_tokens: int = CHUNK_TOKENS, count_tokens: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max_tokens
+        self.count = count_tokens or get_token_counter()
+
+    @staticmethod
+    def breadcrumb(path: List[str]) -> str:
+        return " > ".join(path)
+
+    def _render(self, path: List[str], body: str) -> str:
+        crumb = self.breadcrumb(path)
+        return f"{crumb}\n\n{body}".strip() if crumb else body.strip()
+
+    # -----------------------------------------------------
+    # Section trop longue : paragraphes -> phrases -> mots
+    # -----------------------------------------------------
+    def _split_long(self, text: str, budget: int) -> List[str]:
+        budget = max(16, budget)
+        for pattern in (r"\n\s*\n", SENTENCE_RE, r"\s+"):
+            units = [u for u in re.split(pattern, text) if u.strip()]
+            if len(units) > 1:
+                break
+        else:
+            # un seul "mot" géant : coupe en caractères (~4 par token)
+            step = budget * 4
+            return [text[i:i + step] for i in range(0, len(text), step)]
+
+        sep = "\n\n" if pattern == r"\n\s*\n" else " "
+        pieces, current = [], ""
+        for unit in units:
+            candidate = f"{current}{sep}{unit}" if current else unit
+            if self.count(candidate) <= budget:
+                current = candidate
+                continue
+            if current:
+                pieces.append(current)
+            if self.count(unit) > budget:
+                pieces.extend(self._split_long(unit, budget))
+                current = ""
+            else:
+                current = unit
+        if current:
+            pieces.append(current)
+        return pieces
+
+    # -----------------------------------------------------
+    # Regroupement glouton des sections dans le budget
+    # -----------------------------------------------------
+    def split_text(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        cur_path: List[str] = []
+        cur_blocks: List[str] = []
+        cur_tokens = 0
+
+        def flush():
+            nonlocal cur_blocks, cur_tokens
+            if cur_blocks:
+                chunks.append(self._render(cur_path, "\n\n".join(cur_blocks)))
+            cur_blocks, cur_tokens = [], 0
+
+        for path, heading, body in parse_sections(text):
+            if not body:
+                # titre seul : il sera repris dans le fil d'Ariane des sections suivantes
+                continue
+            prefix_tokens = self.count(self.breadcrumb(path)) + 2 if path else 0
+            # 1er bloc d'un chunk : le titre est déjà dans le fil d'Ariane
+            first_block = body
+            full_block = f"{heading}\n{body}".strip() if heading else body
+            n_full = self.count(full_block)
+
+            if prefix_tokens + self.count(first_block) > self.max_tokens:
+                flush()
+                for piece in self._split_long(first_block, self.max_tokens - prefix_tokens):
+                    chunks.append(self._render(path, piece))
+                continue
+
+            if cur_blocks and cur_tokens + n_full + 2 <= self.max_tokens:
+                cur_blocks.append(full_block)
+                cur_tokens += n_full + 2
+                continue
+
+            flush()
+            cur_path = path
+            cur_blocks = [first_block]
+            cur_tokens = prefix_tokens + self.count(first_block)
+
+        flush()
+        return [c for c in chunks if c.strip()]
+
+
+# =========================================================
+# ADAPTATEURS
+# ---------------------------------------------------------
+# - MarkdownSectionSplitter : TextSplitter LangChain (split_documents, etc.)
+# - llama_index_splitter    : TextSplitter LlamaIndex (import paresseux)
+# =========================================================
+class MarkdownSectionSplitter(TextSplitter):
+    def __init__(self, max_tokens: int = CHUNK_TOKENS, **kwargs):
+        super().__init__(chunk_size=max_tokens, chunk_overlap=0, **kwargs)
+        self._chunker = MarkdownSectionChunker(max_tokens)
+
+    def split_text(self, text: str) -> List[str]:
+        return self._chunker.split_text(text)
+
+
+def llama_index_splitter(max_tokens: int = CHUNK_TOKENS):
+    from llama_index.core.node_parser.interface import TextSplitter as LlamaTextSplitter
+    from pydantic import PrivateAttr
+
+    class LlamaMarkdownSectionSplitter(LlamaTextSplitter):
+        _chunker: MarkdownSectionChunker = PrivateAttr()
+
+        def __init__(self, max_tokens: int):
+            super().__init__()
+            self._chunker = MarkdownSectionChunker(max_tokens)
+
+        def split_text(self, text: str) -> List[str]:
+            return self._chunker.split_text(text)
+
+    return LlamaMarkdownSectionSplitter(max_tokens)
+
+
+__all__ = [
+    "TokenCounter", "get_token_counter", "set_token_counter", "parse_sections", "MarkdownSectionChunker",
+    "MarkdownSectionSplitter", "llama_index_splitter",
+]
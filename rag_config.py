@@ -0,0 +1,180 @@
+# rag_config.py
+# ---------------------------------------------------------
+# Configuration partagée par l'indexeur et les interfaces RAG
+# (surchargée par variables d'environnement, comme rag_bot.py)
+# ---------------------------------------------------------
+import os
+
+# ---------- Chemins ----------
+DATA_DIR = os.environ.get("RAG_DATA_DIR", "/var/www/RAG/Data_parse")     # .md / .txt
+CHROMA_DIR = os.environ.get("RAG_CHROMA_DIR", "/var/www/RAG/chroma_index")
+COLLECTION = os.environ.get("RAG_COLLECTION", "cwd_knowledge")
+
+# ---------- Ollama ----------
+OLLAMA_BASE = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+EMBED_MODEL = os.environ.get("RAG_EMBED_MODEL", "nomic-embed-text")
+
+# ---------- Chunking ----------
+# markdown  : sections Markdown regroupées jusqu'à CHUNK_TOKENS tokens (rag_chunking.py)
+# recursive : RecursiveCharacterTextSplitter(CHUNK_SIZE, CHUNK_OVERLAP) historique
+CHUNKER = os.environ.get("RAG_CHUNKER", "markdown")
+CHUNK_SIZE = int(os.environ.get("RAG_CHUNK_SIZE", "500"))
+CHUNK_OVERLAP = int(os.environ.get("RAG_CHUNK_OVERLAP", "50"))
+CHUNK_TOKENS = int(os.environ.get("RAG_CHUNK_TOKENS", "384"))
+# Tokenizer du modèle d'embedding : identifiant HuggingFace ou chemin vers tokenizer.json
+# (paquet `tokenizers`, erreur s'il ne se charge pas) ; "approx" = ~4 caractères/token
+CHUNK_TOKENIZER = os.environ.get("RAG_CHUNK_TOKENIZER", "nomic-ai/nomic-embed-text-v1.5")
+
+# ---------- Indexation ----------
+# Extensions des fichiers texte produits par les convertisseurs (*-to-md.py)
+TEXT_EXTENSIONS = tuple(
+    ext.strip().lower()
+    for ext in os.environ.get("RAG_TEXT_EXTENSIONS", ".md,.txt").split(",")
+    if ext.strip()
+)
+# Dossiers jamais parcourus (images extraites par les convertisseurs, etc.)
+EXCLUDED_DIRS = tuple(d.strip() for d in os.environ.get("RAG_EXCLUDED_DIRS", "images").split(",") if d.strip())
+# Processus de lecture/nettoyage/découpage en parallèle (1 = dans le processus courant)
+LOADER_WORKERS = int(os.environ.get("RAG_LOADER_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Nombre de chunks envoyés à Chroma par appel add()
+INDEX_BATCH_SIZE = int(os.environ.get("RAG_INDEX_BATCH_SIZE", "512"))
+
+# ---------- Dédoublonnage des chunks quasi identiques (MinHash/LSH, rag_dedup.py) ----------
+DEDUP = os.environ.get("RAG_DEDUP", "1") == "1"
+DEDUP_THRESHOLD = float(os.environ.get("RAG_DEDUP_THRESHOLD", "0.85"))     # Jaccard estimé minimal
+DEDUP_NUM_PERM = int(os.environ.get("RAG_DEDUP_NUM_PERM", "128"))          # taille de la signature
+DEDUP_BANDS = int(os.environ.get("RAG_DEDUP_BANDS", "16"))                 # bandes LSH (NUM_PERM / BANDS lignes)
+DEDUP_SHINGLE = int(os.environ.get("RAG_DEDUP_SHINGLE", "5"))              # n-grammes de mots
+
+# ---------- Shards par racine de corpus (rag_shards.py) ----------
+# "nom=dossier;nom=dossier" relatif à DATA_DIR, ex. "cwd=CWD FR;lim=LIM FR"
+# -> collections COLLECTION_cwd, COLLECTION_lim. Vide = une seule collection.
+SHARDS = tuple(
+    (name.strip(), root.strip())
+    for name, _, root in (s.partition("=") for s in os.environ.get("RAG_SHARDS", "").split(";"))
+    if name.strip() and root.strip()
+)
+# Mots-clés de routage "nom=mot,mot;nom=mot" (en plus du nom du shard et de son dossier)
+SHARD_KEYWORDS = {
+    name.strip(): tuple(w.strip() for w in words.split(",") if w.strip())
+    for name, _, words in (s.partition("=") for s in os.environ.get(
+        "RAG_SHARD_KEYWORDS",
+        "lim=biomécanique,biomecanique,thèse,these,cinématique,kinematics,pression,pressure,étude,study;"
+        "cwd=prix,tarif,argumentaire,commande,finition,fiche produit",
+    ).split(";"))
+    if name.strip()
+}
+# Shards supplémentaires interrogés si leur similarité au centroïde est à moins de cette marge du meilleur
+SHARD_MARGIN = float(os.environ.get("RAG_SHARD_MARGIN", "0.03"))
+
+# ---------- Snapshots d'index (rag_snapshots.py) ----------
+# Chaque reconstruction produit CHROMA_DIR/snapshots/<version>, validé puis
+# publié via le lien CHROMA_DIR/current ; les serveurs basculent à chaud.
+SNAPSHOTS = os.environ.get("RAG_SNAPSHOTS", "1") == "1"
+SNAPSHOT_KEEP = int(os.environ.get("RAG_SNAPSHOT_KEEP", "3"))               # snapshots conservés (rollback)
+SNAPSHOT_POLL = float(os.environ.get("RAG_SNAPSHOT_POLL", "10"))            # s entre deux vérifications de `current`
+SMOKE_QUERIES = tuple(q.strip() for q in os.environ.get(
+    "RAG_SMOKE_QUERIES", "entretien de la selle|référence de selle|cuir").split("|") if q.strip())
+
+# ---------- Embeddings (client batch Ollama /api/embed) ----------
+EMBED_BATCH_SIZE = int(os.environ.get("RAG_EMBED_BATCH_SIZE", "64"))        # textes par requête
+EMBED_CONCURRENCY = int(os.environ.get("RAG_EMBED_CONCURRENCY", "4"))       # requêtes simultanées max
+EMBED_MAX_RETRIES = int(os.environ.get("RAG_EMBED_MAX_RETRIES", "3"))
+EMBED_TIMEOUT = float(os.environ.get("RAG_EMBED_TIMEOUT", "120"))
+
+# ---------- Cache disque des embeddings (vide = désactivé) ----------
+EMBED_CACHE_DIR = os.environ.get("RAG_EMBED_CACHE_DIR", "/var/www/RAG/embed_cache")
+EMBED_CACHE_DTYPE = os.environ.get("RAG_EMBED_CACHE_DTYPE", "float16")     # float16 | float32
+
+# ---------- Modèles de génération (rag_prompts.py) ----------
+# Durée de maintien en mémoire des modèles interactifs après une requête ("30m", "2h", -1 = toujours)
+LLM_KEEP_ALIVE = os.environ.get("RAG_LLM_KEEP_ALIVE", "30m")
+LLM_KEEP_ALIVE = int(LLM_KEEP_ALIVE) if LLM_KEEP_ALIVE.lstrip("-").isdigit() else LLM_KEEP_ALIVE
+LLM_WARMUP = os.environ.get("RAG_LLM_WARMUP", "1") == "1"                    # préchauffage au démarrage
+
+# ---------- Routage du modèle de génération (rag_router.py) ----------
+ROUTER = os.environ.get("RAG_ROUTER", "0") == "1"                           # 0 = modèle unique de l'interface
+# Roster du plus rapide au plus lourd (ex. "llama3:latest,gpt-oss:latest,gpt-oss:120b")
+ROUTER_MODELS = tuple(m.strip() for m in os.environ.get(
+    "RAG_ROUTER_MODELS", "llama3:latest,gpt-oss:latest").split(",") if m.strip())
+# Score de complexité minimal de chaque palier au-dessus du premier (vide = paliers réguliers)
+ROUTER_THRESHOLDS = tuple(float(t) for t in os.environ.get("RAG_ROUTER_THRESHOLDS", "0.35").split(",") if t.strip())
+ROUTER_SLO_MS = float(os.environ.get("RAG_ROUTER_SLO_MS", "30000"))         # latence cible d'une réponse
+ROUTER_MAX_INFLIGHT = int(os.environ.get("RAG_ROUTER_MAX_INFLIGHT", "2"))   # générations en cours ou en file avant repli
+ROUTER_LOG = os.environ.get("RAG_ROUTER_LOG", "/var/www/RAG/router_log.jsonl")   # vide = sans journal
+
+# ---------- Contexte des prompts (rag_context.py) ----------
+# Budget du contexte injecté (num_ctx 8192 = prompt + contexte + réponse) ; 0 = sans limite
+CONTEXT_TOKENS = int(os.environ.get("RAG_CONTEXT_TOKENS", "3000"))
+CONTEXT_DEDUP = float(os.environ.get("RAG_CONTEXT_DEDUP", "0.8"))   # recouvrement de tokens = phrase redondante
+
+# ---------- Reranking entre retrieval et prompt (rag_rerank.py) ----------
+RERANK = os.environ.get("RAG_RERANK", "embedding")                        # embedding | cross-encoder | none
+RERANK_MODEL = os.environ.get("RAG_RERANK_MODEL", "")                     # vide = EMBED_MODEL / cross-encoder par défaut
+RERANK_CANDIDATES = int(os.environ.get("RAG_RERANK_CANDIDATES", "20"))    # candidats rescorés par question
+RERANK_TOP_N = int(os.environ.get("RAG_RERANK_TOP_N", "5"))               # chunks passés au LLM (max)
+RERANK_THRESHOLD = os.environ.get("RAG_RERANK_THRESHOLD", "")             # vide = seuil par défaut du reranker
+RERANK_THRESHOLD = float(RERANK_THRESHOLD) if RERANK_THRESHOLD else None
+RERANK_MIN_KEEP = int(os.environ.get("RAG_RERANK_MIN_KEEP", "1"))         # chunks gardés même sous le seuil
+RERANK_BATCH_SIZE = int(os.environ.get("RAG_RERANK_BATCH_SIZE", "16"))    # paires par lot (cross-encoder)
+
+# ---------- Cache sémantique des réponses (rag_answer_cache.py) ----------
+ANSWER_CACHE = os.environ.get("RAG_ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))  # similarité cosinus min.
+ANSWER_CACHE_TTL = float(os.environ.get("RAG_ANSWER_CACHE_TTL", "86400"))            # s avant expiration
+ANSWER_CACHE_SIZE = int(os.environ.get("RAG_ANSWER_CACHE_SIZE", "512"))              # entrées max (LRU)
+
+# ---------- Menu de questions pré-calculées de l'app Gradio (rag_menu.py) ----------
+MENU = os.environ.get("RAG_MENU", "1") == "1"
+MENU_FILE = os.environ.get("RAG_MENU_FILE", "/var/www/RAG/questions_menu.txt")   # une question par ligne
+MENU_STORE = os.environ.get("RAG_MENU_STORE", "/var/www/RAG/menu_answers.json")  # réponses persistées
+MENU_MAX_AGE = float(os.environ.get("RAG_MENU_MAX_AGE", "604800"))              # s avant recalcul
+MENU_POLL = float(os.environ.get("RAG_MENU_POLL", "60"))                         # s entre deux vérifications
+MENU_REFRESH_HOURS = os.environ.get("RAG_MENU_REFRESH_HOURS", "")                # ex. "20-7" ; vide = toujours
+MENU_SERVE_STALE = os.environ.get("RAG_MENU_SERVE_STALE", "1") == "1"            # réponse périmée servie pendant le recalcul
+
+# ---------- Concurrence de l'app Gradio (rag_limits.py) ----------
+RETRIEVE_CONCURRENCY = int(os.environ.get("RAG_RETRIEVE_CONCURRENCY", "16"))   # retrievals simultanés
+RETRIEVE_QUEUE = int(os.environ.get("RAG_RETRIEVE_QUEUE", "16"))               # retrievals en attente max
+GENERATE_CONCURRENCY = int(os.environ.get("RAG_GENERATE_CONCURRENCY", "2"))    # générations Ollama simultanées
+GENERATE_QUEUE = int(os.environ.get("RAG_GENERATE_QUEUE", "16"))               # requêtes en attente max
+QUEUE_TIMEOUT = float(os.environ.get("RAG_QUEUE_TIMEOUT", "300"))              # s d'attente max dans la file
+
+# ---------- Service de retrieval partagé (rag_service.py) ----------
+SERVICE_HOST = os.environ.get("RAG_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.environ.get("RAG_SERVICE_PORT", "6070"))
+SERVICE_URL = os.environ.get("RAG_SERVICE_URL", f"http://{SERVICE_HOST}:{SERVICE_PORT}")
+# auto : service si joignable, sinon index local | remote : service obligatoire | local : jamais de service
+SERVICE_MODE = os.environ.get("RAG_SERVICE_MODE", "auto")
+SERVICE_TIMEOUT = float(os.environ.get("RAG_SERVICE_TIMEOUT", "30"))
+# Version de l'index servi (clé des caches de réponses) relue au plus toutes les N s
+SERVICE_VERSION_TTL = float(os.environ.get("RAG_SERVICE_VERSION_TTL", "5"))
+# Caches mémoire LRU : vecteurs des questions, résultats de recherche par version d'index (0 = désactivé)
+QUERY_CACHE_SIZE = int(os.environ.get("RAG_QUERY_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RAG_RETRIEVAL_CACHE_SIZE", "256"))
+
+# ---------- MMR vectorisé (rag_mmr.py) ----------
+# Vecteurs des chunks gardés en mémoire pour le MMR (plus de relecture des candidats dans Chroma)
+MMR_HOT_CACHE = os.environ.get("RAG_MMR_HOT_CACHE", "1") == "1"
+MMR_PRELOAD = os.environ.get("RAG_MMR_PRELOAD", "1") == "1"                 # toute la collection au chargement
+
+# ---------- Recherche hybride (BM25 + vecteurs) ----------
+HYBRID_SEARCH = os.environ.get("RAG_HYBRID_SEARCH", "1") == "1"
+RRF_K = int(os.environ.get("RAG_RRF_K", "60"))                              # constante de fusion RRF
+# Codes produit/matière connus en plus de ceux détectés dans le corpus (séparés par des virgules)
+PRODUCT_CODES = tuple(c.strip() for c in os.environ.get("RAG_PRODUCT_CODES", "").split(",") if c.strip())
+
+# ---------- Filtres de métadonnées ----------
+# Filtre "where" déduit de la question (marque, référence de selle) quand aucun n'est passé
+INFER_FILTERS = os.environ.get("RAG_INFER_FILTERS", "1") == "1"
+
+# ---------- Backend vectoriel ----------
+# chroma : collection Chroma (HNSW) | numpy : matrice mmap + recherche exacte (rag_npstore.py)
+VECTOR_BACKEND = os.environ.get("RAG_VECTOR_BACKEND", "chroma")
+NPSTORE_DTYPE = os.environ.get("RAG_NPSTORE_DTYPE", "float32")              # float32 | float16
+
+# ---------- Paramètres HNSW de Chroma (vides = valeurs par défaut de Chroma) ----------
+# Cf. bench_hnsw.py pour choisir ces valeurs sur notre corpus
+HNSW_M = os.environ.get("RAG_HNSW_M", "")
+HNSW_CONSTRUCTION_EF = os.environ.get("RAG_HNSW_CONSTRUCTION_EF", "")
+HNSW_SEARCH_EF = os.environ.get("RAG_HNSW_SEARCH_EF", "")
@@ -0,0 +1,132 @@
+# rag_context.py
+# ---------------------------------------------------------
+# Construction du contexte des prompts sous budget de tokens
+# ---------------------------------------------------------
+# Remplace format_docs (concaténation brute des chunks) :
+# 1) chunks découpés en lignes puis en phrases (ordre d'origine conservé)
+# 2) phrases redondantes supprimées : doublon exact, ou phrase d'au moins
+#    DEDUP_MIN_WORDS termes dont une part >= CONTEXT_DEDUP de ses propres
+#    termes figure déjà dans une phrase retenue (chunks qui se chevauchent,
+#    passages répétés d'un document à l'autre)
+# 3) si le contexte dépasse CONTEXT_TOKENS : suppression des phrases les
+#    moins pertinentes jusqu'à tenir dans le budget. Score d'une phrase =
+#    part des termes de la question qu'elle contient + pertinence de son
+#    chunk : score de rerank (metadata["rerank_score"], similarité
+#    question/chunk calculée au retrieval) ramené à 0..1 s'il est présent,
+#    sinon rang du chunk dans la réponse du retriever (MMR / fusion RRF :
+#    pas un classement par similarité seule)
+# 4) chaque chunk retenu est précédé d'une étiquette courte "[n] fichier"
+#    que le LLM peut citer
+# Comptage des tokens : tokenizer du découpage (rag_chunking.get_token_counter).
+# ---------------------------------------------------------
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from rag_chunking import SENTENCE_RE, get_token_counter
+from rag_config import CONTEXT_DEDUP, CONTEXT_TOKENS
+from rag_lexical import tokenize
+
+RANK_WEIGHT = 0.5     # poids de la pertinence du chunk face au recouvrement avec la question
+DEDUP_MIN_WORDS = 4   # phrases plus courtes : seuls les doublons exacts sont retirés
+
+
+def chunk_priors(docs: Sequence) -> List[float]:
+    """Pertinence 0..1 de chaque chunk : score de rerank normalisé, sinon 1 / (1 + rang)."""
+    scores = [(doc.metadata or {}).get("rerank_score") for doc in docs]
+    if docs and all(s is not None for s in scores):
+        low, high = min(scores), max(scores)
+        return [(s - low) / (high - low) if high > low else 1.0 for s in scores]
+    return [1 / (1 + rank) for rank in range(len(docs))]
+
+
+def _sentences(text: str) -> List[Tuple[int, str]]:
+    """-> [(n° de ligne, phrase)] ; lignes de tableau / listes : une seule unité."""
+    out = []
+    for n, line in enumerate(text.splitlines()):
+        if line.lstrip().startswith(("|", "-", "*", "#")):
+            out.append((n, line))
+        else:
+            out += [(n, s) for s in SENTENCE_RE.split(line) if s.strip()]
+    return out
+
+
+def source_tag(doc, n: int) -> str:
+    source = (doc.metadata or {}).get("source")
+    return f"[{n}] {os.path.basename(source)}" if source else f"[{n}]"
+
+
+# =========================================================
+# CONSTRUCTION
+# ---------------------------------------------------------
+# build_context(question, docs, budget, dedup) -> (contexte, stats)
+# stats : tokens avant/après, phrases supprimées (doublons / pertinence),
+#         étiquettes des sources retenues
+# format_context(question, docs) -> contexte seul (remplace format_docs)
+# =========================================================
+def build_context(question: str, docs: Sequence, budget: int = CONTEXT_TOKENS,
+                  dedup: float = CONTEXT_DEDUP) -> Tuple[str, Dict]:
+    count = get_token_counter()
+    q_tokens = set(tokenize(question))
+    units = []            # [doc_index, n° de ligne, phrase, tokens, score]
+    seen: List[set] = []
+    exact = set()
+    duplicates = 0
+    tokens_in = 0
+    priors = chunk_priors(docs)
+    for rank, doc in enumerate(docs):
+        for line, sentence in _sentences(doc.page_content):
+            n_tokens = count(sentence)
+            tokens_in += n_tokens
+            words = set(tokenize(sentence))
+            norm = re.sub(r"\s+", " ", sentence.strip().lower())
+            if norm in exact or (len(words) >= DEDUP_MIN_WORDS and any(
+                    len(words & other) / len(words) >= dedup for other in seen)):
+                duplicates += 1
+                continue
+            exact.add(norm)
+            if words:
+                seen.append(words)
+            overlap = len(q_tokens & words) / len(q_tokens) if q_tokens else 0.0
+            units.append([rank, line, sentence, n_tokens, overlap + RANK_WEIGHT * priors[rank]])
+
+    tags = {rank: source_tag(doc, rank + 1) for rank, doc in enumerate(docs)}
+    tag_tokens = {rank: count(tag) + 1 for rank, tag in tags.items()}
+    total = sum(u[3] for u in units) + sum(tag_tokens[r] for r in {u[0] for u in units})
+    dropped = 0
+    if budget and total > budget:
+        # retrait des phrases les moins pertinentes (les dernières des chunks à
+        # égalité) ; la meilleure phrase est toujours conservée
+        for i in sorted(range(len(units)), key=lambda i: (units[i][4], -i))[:-1]:
+            if total <= budget:
+                break
+            rank = units[i][0]
+            total -= units[i][3]
+            units[i] = None
+            dropped += 1
+            if not any(u is not None and u[0] == rank for u in units):
+                total -= tag_tokens[rank]
+
+    blocks: Dict[int, Dict[int, List[str]]] = {}
+    for unit in units:
+        if unit is not None:
+            blocks.setdefault(unit[0], {}).setdefault(unit[1], []).append(unit[2])
+    context = "\n\n".join(
+        tags[rank] + "\n" + "\n".join(" ".join(sentences) for sentences in lines.values())
+        for rank, lines in sorted(blocks.items())
+    )
+    stats = {
+        "tokens_in": tokens_in,
+        "tokens_out": total,
+        "duplicates": duplicates,
+        "dropped": dropped,
+        "sources": [tags[rank] for rank in sorted(blocks)],
+    }
+    return context, stats
+
+
+def format_context(question: str, docs: Sequence, budget: Optional[int] = None) -> str:
+    return build_context(question, docs, CONTEXT_TOKENS if budget is None else budget)[0]
+
+
+__all__ = ["source_tag", "chunk_priors", "build_context", "format_context"]
@@ -0,0 +1,297 @@
+# rag_dedup.py
+# ---------------------------------------------------------
+# Dédoublonnage des chunks quasi identiques pendant l'indexation
+# ---------------------------------------------------------
+# Data_parse contient beaucoup de textes presque identiques (doublons FR/EN
+# avec tableaux communs, brochures réexportées, même fiche en image OCR et
+# en PDF). Plutôt que de tous les embedder :
+# - MinHasher  : signature MinHash de chaque chunk (n-grammes de mots)
+# - LSHIndex   : bandes LSH pour trouver les candidats, Jaccard estimé vérifié
+# - DedupStore : fichier SQLite à côté de l'index
+#     * signatures des chunks représentants (ceux stockés dans la collection)
+#     * alias : chunks écartés -> représentant, texte et métadonnées conservés
+#       (un alias redevient candidat si son représentant disparaît)
+# - Deduplicator : applique tout cela pendant rag_index.sync_index, chunk par chunk
+# Le représentant porte la liste de toutes ses sources (métadonnée "sources").
+# Un chunk n'est rattaché qu'à un représentant de mêmes facettes (marque,
+# langue, type, selle, matière : rag_metadata.FACET_FIELDS) : les filtres de
+# recherche portent sur les métadonnées du représentant, un alias d'une autre
+# marque ou d'une autre langue y serait introuvable.
+# ---------------------------------------------------------
+import json
+import os
+import sqlite3
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from rag_config import DEDUP_BANDS, DEDUP_NUM_PERM, DEDUP_SHINGLE, DEDUP_THRESHOLD
+from rag_lexical import tokenize
+from rag_metadata import FACET_FIELDS
+
+MERSENNE = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+SOURCES_SEP = " | "
+
+
+# =========================================================
+# MINHASH
+# ---------------------------------------------------------
+# h_i(x) = (a_i * x + b_i) mod p, x = crc32 du n-gramme ; signature = min par h_i
+# (mêmes graines à chaque exécution : signatures comparables entre synchronisations)
+# =========================================================
+class MinHasher:
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, shingle: int = DEDUP_SHINGLE, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.a = rng.randint(1, int(MERSENNE), size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, int(MERSENNE), size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> set:
+        words = tokenize(text) or [text.strip()]
+        k = min(self.shingle, len(words))
+        return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = self.shingles(text)
+        hv = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        phv = ((hv[:, None] * self.a + self.b) % MERSENNE) & MAX_HASH
+        return phv.min(axis=0).astype(np.uint32)
+
+
+def estimated_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+# =========================================================
+# INDEX LSH (en mémoire, reconstruit à chaque synchronisation)
+# =========================================================
+class LSHIndex:
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, bands: int = DEDUP_BANDS,
+                 threshold: float = DEDUP_THRESHOLD):
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.buckets: List[Dict[bytes, set]] = [{} for _ in range(bands)]
+        self.sigs: Dict[str, np.ndarray] = {}
+
+    def _keys(self, sig: np.ndarray) -> List[bytes]:
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, key: str, sig: np.ndarray) -> None:
+        self.sigs[key] = sig
+        for band, bkey in zip(self.buckets, self._keys(sig)):
+            band.setdefault(bkey, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        sig = self.sigs.pop(key, None)
+        if sig is None:
+            return
+        for band, bkey in zip(self.buckets, self._keys(sig)):
+            band.get(bkey, set()).discard(key)
+
+    def query(self, sig: np.ndarray) -> Optional[str]:
+        """Clé du représentant le plus proche au-dessus du seuil, sinon None."""
+        candidates = set()
+        for band, bkey in zip(self.buckets, self._keys(sig)):
+            candidates |= band.get(bkey, set())
+        best, best_sim = None, self.threshold
+        for key in sorted(candidates):
+            sim = estimated_jaccard(sig, self.sigs[key])
+            if sim >= best_sim:
+                best, best_sim = key, sim
+        return best
+
+
+# =========================================================
+# ÉTAT PERSISTÉ (SQLite)
+# ---------------------------------------------------------
+# signatures(id, sig)                      : représentants
+# aliases(id, rep, document, metadata)     : chunks rattachés à un représentant
+# =========================================================
+class DedupStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS signatures (id TEXT PRIMARY KEY, sig BLOB NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS aliases (id TEXT PRIMARY KEY, rep TEXT NOT NULL, "
+            "document TEXT NOT NULL, metadata TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS aliases_rep ON aliases(rep);"
+        )
+
+    def signatures(self) -> Dict[str, np.ndarray]:
+        return {cid: np.frombuffer(blob, dtype=np.uint32)
+                for cid, blob in self.db.execute("SELECT id, sig FROM signatures")}
+
+    def put_signatures(self, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        self.db.executemany("INSERT OR REPLACE INTO signatures VALUES (?, ?)",
+                            [(cid, sig.astype(np.uint32).tobytes()) for cid, sig in items])
+
+    def delete_signatures(self, ids: Iterable[str]) -> None:
+        self.db.executemany("DELETE FROM signatures WHERE id = ?", [(cid,) for cid in ids])
+
+    def aliases(self) -> Dict[str, Tuple[str, Dict]]:
+        """id -> (représentant, métadonnées) ; les textes restent sur disque."""
+        return {cid: (rep, json.loads(meta))
+                for cid, rep, meta in self.db.execute("SELECT id, rep, metadata FROM aliases")}
+
+    def alias_documents(self, ids: Iterable[str]) -> Dict[str, str]:
+        out = {}
+        for cid in ids:
+            row = self.db.execute("SELECT document FROM aliases WHERE id = ?", (cid,)).fetchone()
+            if row:
+                out[cid] = row[0]
+        return out
+
+    def update_alias_metadata(self, cid: str, meta: Dict) -> None:
+        self.db.execute("UPDATE aliases SET metadata = ? WHERE id = ?", (json.dumps(meta, ensure_ascii=False), cid))
+
+    def alias_chars(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(LENGTH(document)), 0) FROM aliases").fetchone()[0]
+
+    def put_aliases(self, rows: Iterable[Tuple[str, str, str, Dict]]) -> None:
+        self.db.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?, ?)",
+                            [(cid, rep, doc, json.dumps(meta, ensure_ascii=False)) for cid, rep, doc, meta in rows])
+
+    def delete_aliases(self, ids: Iterable[str]) -> None:
+        self.db.executemany("DELETE FROM aliases WHERE id = ?", [(cid,) for cid in ids])
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+# =========================================================
+# DÉDOUBLONNAGE D'UNE SYNCHRONISATION
+# ---------------------------------------------------------
+# Deduplicator(store, collection, existing_meta) : un LSHIndex par jeu de
+# valeurs de facettes (facet_key)
+# - assign(cid, text, meta) : rattache le chunk à un représentant quasi identique
+#   (retourne son id) ou l'enregistre comme nouveau représentant (None)
+# - retag(cid, meta)        : nouvelle source_hash d'un alias inchangé
+# - finish(stale)           : retire alias/signatures obsolètes, retourne les
+#   alias orphelins (représentant supprimé) à traiter comme nouveaux chunks
+# - source_updates(stale, retag) : métadonnées "sources"/"duplicates" à jour
+# =========================================================
+class Deduplicator:
+    def __init__(self, store: DedupStore, collection, existing_meta: Dict[str, Dict], batch_size: int = 512):
+        self.store = store
+        self.collection = collection
+        self.existing_meta = existing_meta
+        self.batch_size = batch_size
+        self.hasher = MinHasher()
+        self.lsh: Dict[Tuple, LSHIndex] = {}
+        self.partition: Dict[str, Tuple] = {}   # représentant -> facet_key
+        self.aliases = store.aliases()
+        self.added = set()
+
+        sigs = store.signatures()
+        missing = [cid for cid in existing_meta if cid not in sigs]
+        for i in range(0, len(missing), batch_size):
+            batch = collection.get(ids=missing[i:i + batch_size], include=["documents"])
+            computed = [(cid, self.hasher.signature(doc)) for cid, doc in zip(batch["ids"], batch["documents"])]
+            store.put_signatures(computed)
+            sigs.update(computed)
+        for cid, meta in existing_meta.items():
+            self._add(cid, sigs[cid], meta)
+
+    def _add(self, cid: str, sig: np.ndarray, meta: Dict) -> None:
+        key = facet_key(meta)
+        self.partition[cid] = key
+        self.lsh.setdefault(key, LSHIndex()).add(cid, sig)
+
+    def assign(self, cid: str, text: str, meta: Dict) -> Optional[str]:
+        sig = self.hasher.signature(text)
+        lsh = self.lsh.get(facet_key(meta))
+        rep = lsh.query(sig) if lsh is not None else None
+        if rep:
+            self.aliases[cid] = (rep, meta)
+            self.added.add(cid)
+            self.store.put_aliases([(cid, rep, text, meta)])
+        else:
+            self._add(cid, sig, meta)
+            self.store.put_signatures([(cid, sig)])
+        return rep
+
+    def retag(self, cid: str, meta: Dict) -> None:
+        self.aliases[cid] = (self.aliases[cid][0], meta)
+        self.store.update_alias_metadata(cid, meta)
+
+    def finish(self, stale: set) -> List[Tuple[str, str, Dict]]:
+        stale_reps = stale & self.existing_meta.keys()
+        for cid in stale_reps:
+            key = self.partition.pop(cid, None)
+            if key in self.lsh:
+                self.lsh[key].remove(cid)
+        self.store.delete_signatures(stale_reps)
+        dead = [a for a in self.aliases if a in stale]
+        orphans = [a for a, (rep, _) in self.aliases.items() if a not in stale and rep in stale]
+        docs = self.store.alias_documents(orphans)
+        out = [(a, docs[a], self.aliases[a][1]) for a in orphans]
+        for a in dead + orphans:
+            del self.aliases[a]
+            self.added.discard(a)
+        self.store.delete_aliases(dead + orphans)
+        return out
+
+    def source_updates(self, stale: set, retag: Dict[str, Dict]) -> Dict[str, Dict]:
+        by_rep: Dict[str, List[Dict]] = {}
+        for rep, meta in self.aliases.values():
+            by_rep.setdefault(rep, []).append(meta)
+        updates = {}
+        for cid, old in self.existing_meta.items():
+            if cid not in stale:
+                meta = with_sources(_base(retag.get(cid, old)), by_rep.get(cid, []))
+                if meta != old:
+                    updates[cid] = meta
+        new_reps = [rep for rep in by_rep if rep not in self.existing_meta]
+        for i in range(0, len(new_reps), self.batch_size):
+            batch = self.collection.get(ids=new_reps[i:i + self.batch_size], include=["metadatas"])
+            for cid, meta in zip(batch["ids"], batch["metadatas"]):
+                updates[cid] = with_sources(_base(meta or {}), by_rep[cid])
+        return updates
+
+    def stats(self) -> Dict[str, int]:
+        self.store.commit()
+        return {
+            "duplicates": len(self.aliases),
+            "duplicates_new": len(self.added),
+            "duplicate_chars": self.store.alias_chars(),
+        }
+
+
+def facet_key(meta: Dict) -> Tuple:
+    return tuple((meta or {}).get(f, "") for f in FACET_FIELDS)
+
+
+def _base(meta: Dict) -> Dict:
+    return {k: v for k, v in meta.items() if k not in ("sources", "duplicates")}
+
+
+def remove_store(path: str) -> None:
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def with_sources(meta: Dict, alias_metas: List[Dict]) -> Dict:
+    """Métadonnées du représentant + toutes les sources de ses quasi-doublons."""
+    sources = sorted({meta.get("source", "")} | {m.get("source", "") for m in alias_metas})
+    return {**meta, "sources": SOURCES_SEP.join(s for s in sources if s), "duplicates": len(alias_metas)}
+
+
+def dedup_settings() -> Dict:
+    return {"num_perm": DEDUP_NUM_PERM, "bands": DEDUP_BANDS, "threshold": DEDUP_THRESHOLD,
+            "shingle": DEDUP_SHINGLE, "partition": list(FACET_FIELDS)}
+
+
+__all__ = [
+    "MinHasher", "LSHIndex", "DedupStore", "Deduplicator", "estimated_jaccard", "facet_key", "remove_store",
+    "with_sources",
+    "dedup_settings", "SOURCES_SEP",
+]
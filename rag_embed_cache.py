@@ -0,0 +1,240 @@
+# rag_embed_cache.py
+# ---------------------------------------------------------
+# Cache disque des embeddings, partagé par LangChain et LlamaIndex
+# ---------------------------------------------------------
+# - Clé : (modèle + options de requête Ollama, sha256 du texte normalisé) ;
+#   num_ctx & co changent la troncature donc les vecteurs (cache_model)
+# - Vecteurs : matrice binaire float16/float32 par modèle, lue en mmap
+# - Index des clés : SQLite (table model/key -> ligne de la matrice)
+# - Écritures sérialisées par une transaction SQLite IMMEDIATE :
+#   plusieurs processus (app Gradio, indexeur...) peuvent partager le cache ;
+#   lectures dans une transaction (nombre de lignes et index des clés de la
+#   même version)
+# LRUCache : petit cache mémoire borné (vecteurs des questions, résultats de
+# recherche), les questions n'étant pas écrites dans le cache disque.
+# ---------------------------------------------------------
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rag_config import EMBED_CACHE_DIR, EMBED_CACHE_DTYPE
+
+
+# =========================================================
+# CLÉ DE CACHE
+# ---------------------------------------------------------
+# text_key : NFC + espaces compressés, puis sha256
+# (deux chunks identiques à l'espacement près partagent le même vecteur)
+# =========================================================
+def text_key(text: str) -> str:
+    norm = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+    return hashlib.sha256(norm.encode("utf-8")).hexdigest()
+
+
+def cache_model(model: str, options: Optional[Dict] = None) -> str:
+    """Espace de noms du cache : modèle seul, ou modèle + options de requête (ex. num_ctx)."""
+    if not options:
+        return model
+    return f"{model}|{json.dumps(options, sort_keys=True, separators=(',', ':'))}"
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: str = EMBED_CACHE_DIR, dtype: str = EMBED_CACHE_DTYPE):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._maps = {}          # model -> (np.memmap, nb de lignes mappées)
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"),
+            timeout=60,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS stores (model TEXT PRIMARY KEY, dim INTEGER, dtype TEXT, rows INTEGER)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (model TEXT, key TEXT, row INTEGER, PRIMARY KEY (model, key))"
+        )
+
+    # -----------------------------------------------------
+    # Fichier de vecteurs d'un modèle (nom de fichier sûr)
+    # -----------------------------------------------------
+    def _path(self, model: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        return os.path.join(self.cache_dir, f"{safe}.{self.dtype.name}.bin")
+
+    def _store(self, model: str):
+        return self._db.execute("SELECT dim, dtype, rows FROM stores WHERE model = ?", (model,)).fetchone()
+
+    # Remappe le fichier si d'autres écritures l'ont agrandi
+    def _matrix(self, model: str, dim: int, rows: int) -> np.memmap:
+        cached = self._maps.get(model)
+        if cached is None or cached[1] < rows:
+            mm = np.memmap(self._path(model), dtype=self.dtype, mode="r", shape=(rows, dim))
+            self._maps[model] = cached = (mm, rows)
+        return cached[0]
+
+    # =====================================================
+    # LECTURE
+    # -----------------------------------------------------
+    # get_many : un vecteur (list[float]) ou None par texte
+    # =====================================================
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        if not texts:
+            return out
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            # une seule transaction de lecture : un put_many concurrent (autre
+            # processus) ne peut pas ajouter de clés au-delà de `rows` entre les deux requêtes
+            self._db.execute("BEGIN")
+            try:
+                store = self._store(model)
+                if store is None:
+                    return out
+                dim, dtype, rows = store
+                if dtype != self.dtype.name:
+                    return out
+                found = {}
+                unique = list(set(keys))
+                for i in range(0, len(unique), 500):
+                    part = unique[i:i + 500]
+                    q = f"SELECT key, row FROM vectors WHERE model = ? AND key IN ({','.join('?' * len(part))})"
+                    found.update(self._db.execute(q, [model, *part]).fetchall())
+            finally:
+                self._db.execute("COMMIT")
+            if not found:
+                return out
+            mat = self._matrix(model, dim, rows)
+            for i, k in enumerate(keys):
+                row = found.get(k)
+                if row is not None and row < len(mat):
+                    out[i] = np.asarray(mat[row], dtype=np.float32).tolist()
+        return out
+
+    # =====================================================
+    # ÉCRITURE
+    # -----------------------------------------------------
+    # put_many : ajoute en fin de matrice les textes encore inconnus
+    # (lignes réservées dans la même transaction que l'index des clés)
+    # =====================================================
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        if not texts:
+            return
+        pending = {}
+        for t, v in zip(texts, vectors):
+            pending.setdefault(text_key(t), v)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                store = self._store(model)
+                dim = len(next(iter(pending.values())))
+                if store is None:
+                    rows = 0
+                    self._db.execute(
+                        "INSERT INTO stores (model, dim, dtype, rows) VALUES (?, ?, ?, 0)",
+                        (model, dim, self.dtype.name),
+                    )
+                else:
+                    if store[0] != dim or store[1] != self.dtype.name:
+                        raise ValueError(f"Cache d'embeddings incohérent pour {model} (dim/dtype)")
+                    rows = store[2]
+                known = set()
+                keys = list(pending)
+                for i in range(0, len(keys), 500):
+                    part = keys[i:i + 500]
+                    q = f"SELECT key FROM vectors WHERE model = ? AND key IN ({','.join('?' * len(part))})"
+                    known.update(k for (k,) in self._db.execute(q, [model, *part]).fetchall())
+                new_keys = [k for k in keys if k not in known]
+                if new_keys:
+                    block = np.asarray([pending[k] for k in new_keys], dtype=self.dtype)
+                    with open(self._path(model), "ab+") as f:
+                        f.truncate(rows * dim * self.dtype.itemsize)
+                        f.seek(0, os.SEEK_END)
+                        f.write(block.tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._db.executemany(
+                        "INSERT INTO vectors (model, key, row) VALUES (?, ?, ?)",
+                        [(model, k, rows + i) for i, k in enumerate(new_keys)],
+                    )
+                    self._db.execute("UPDATE stores SET rows = ? WHERE model = ?", (rows + len(new_keys), model))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def count(self, model: str) -> int:
+        with self._lock:
+            store = self._store(model)
+        return store[2] if store else 0
+
+
+# =========================================================
+# CACHE MÉMOIRE LRU
+# ---------------------------------------------------------
+# get(key) -> valeur ou None ; put(key, valeur) ; stats() -> succès / échecs
+# maxsize <= 0 : désactivé (tout est un échec, rien n'est conservé)
+# =========================================================
+class LRUCache:
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._data),
+                    "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+
+# =========================================================
+# CACHE PAR DÉFAUT (un par processus)
+# ---------------------------------------------------------
+# Désactivé si RAG_EMBED_CACHE_DIR est vide.
+# =========================================================
+_DEFAULT = None
+
+
+def default_cache() -> Optional[EmbeddingCache]:
+    global _DEFAULT
+    if not EMBED_CACHE_DIR:
+        return None
+    if _DEFAULT is None:
+        _DEFAULT = EmbeddingCache()
+    return _DEFAULT
+
+
+__all__ = ["EmbeddingCache", "LRUCache", "default_cache", "text_key", "cache_model"]
@@ -0,0 +1,205 @@
+# rag_embeddings.py
+# ---------------------------------------------------------
+# Client d'embeddings Ollama par lots, concurrent, partagé par
+# LangChain (Embeddings) et LlamaIndex (BaseEmbedding)
+# ---------------------------------------------------------
+# - Appelle l'endpoint batch /api/embed (plusieurs textes par requête)
+# - Taille de lot et nombre de requêtes simultanées réglables
+# - Relance les lots en échec (backoff exponentiel)
+# - Mesure le débit (chunks/s)
+# - Lit/écrit le cache disque rag_embed_cache : un texte déjà vu n'est
+#   jamais réembeddé, quel que soit le framework qui le demande
+# ---------------------------------------------------------
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+from langchain_core.embeddings import Embeddings
+
+from rag_config import (
+    OLLAMA_BASE, EMBED_MODEL, EMBED_BATCH_SIZE, EMBED_CONCURRENCY,
+    EMBED_MAX_RETRIES, EMBED_TIMEOUT, QUERY_CACHE_SIZE,
+)
+from rag_embed_cache import LRUCache, cache_model, default_cache
+
+_DEFAULT_CACHE = object()
+
+
+# =========================================================
+# CLIENT BATCH
+# ---------------------------------------------------------
+# OllamaBatchEmbedder.embed(texts):
+# - découpe en lots de batch_size
+# - envoie au plus max_concurrency lots en parallèle
+# - conserve l'ordre des textes en sortie
+# - ne calcule que les textes absents du cache (use_cache=True)
+# - cumule les statistiques (chunks, secondes, relances, hits cache)
+# =========================================================
+class OllamaBatchEmbedder:
+    def __init__(
+        self,
+        model: str = EMBED_MODEL,
+        base_url: str = OLLAMA_BASE,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_concurrency: int = EMBED_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+        timeout: float = EMBED_TIMEOUT,
+        options: Optional[Dict] = None,
+        cache=_DEFAULT_CACHE,
+        verbose: bool = True,
+    ):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.options = options
+        self.cache_model = cache_model(model, options)   # clé du cache disque
+        self.cache = default_cache() if cache is _DEFAULT_CACHE else cache
+        self.verbose = verbose
+        self.stats = {"chunks": 0, "requests": 0, "retries": 0, "seconds": 0.0, "cache_hits": 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # Une session HTTP par thread (keep-alive, pas de partage entre threads)
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        body = {"model": self.model, "input": texts, "truncate": True}
+        if self.options:
+            body["options"] = self.options
+        for attempt in range(self.max_retries + 1):
+            try:
+                r = self._session().post(f"{self.base_url}/api/embed", json=body, timeout=self.timeout)
+                r.raise_for_status()
+                vectors = r.json()["embeddings"]
+                if len(vectors) != len(texts):
+                    raise RuntimeError(f"{len(vectors)} vecteurs reçus pour {len(texts)} textes")
+                with self._lock:
+                    self.stats["requests"] += 1
+                return vectors
+            except (requests.RequestException, KeyError, ValueError, RuntimeError) as e:
+                if attempt == self.max_retries:
+                    raise RuntimeError(f"Échec embeddings Ollama après {attempt + 1} tentatives : {e}") from e
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(min(2 ** attempt, 30))
+
+    def embed(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+        if not texts:
+            return []
+        if use_cache and self.cache is not None:
+            vectors = self.cache.get_many(self.cache_model, texts)
+            missing = [i for i, v in enumerate(vectors) if v is None]
+            with self._lock:
+                self.stats["cache_hits"] += len(texts) - len(missing)
+            if missing:
+                todo = [texts[i] for i in missing]
+                computed = self._embed_all(todo)
+                self.cache.put_many(self.cache_model, todo, computed)
+                for i, v in zip(missing, computed):
+                    vectors[i] = v
+            if self.verbose and len(texts) > self.batch_size:
+                print(f"💾 Cache embeddings : {len(texts) - len(missing)}/{len(texts)} chunks déjà connus")
+            return vectors
+        return self._embed_all(texts)
+
+    def _embed_all(self, texts: List[str]) -> List[List[float]]:
+        t0 = time.time()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1 or self.max_concurrency == 1:
+            results = [self._embed_batch(b) for b in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                results = list(pool.map(self._embed_batch, batches))
+        vectors = [v for batch in results for v in batch]
+
+        dt = time.time() - t0
+        with self._lock:
+            self.stats["chunks"] += len(texts)
+            self.stats["seconds"] += dt
+        if self.verbose and len(batches) > 1:
+            print(f"⚡ Embeddings {self.model} : {len(texts)} chunks en {dt:.1f}s ({len(texts) / max(dt, 1e-9):.1f} chunks/s)")
+        return vectors
+
+    def throughput(self) -> float:
+        """Débit cumulé en chunks/s depuis la création du client."""
+        return self.stats["chunks"] / self.stats["seconds"] if self.stats["seconds"] else 0.0
+
+
+# =========================================================
+# ADAPTATEUR LANGCHAIN
+# ---------------------------------------------------------
+# Remplace OllamaEmbeddings : même interface embed_documents / embed_query
+# =========================================================
+class OllamaBatchEmbeddings(Embeddings):
+    def __init__(self, embedder: Optional[OllamaBatchEmbedder] = None, query_cache_size: int = QUERY_CACHE_SIZE,
+                 **kwargs):
+        self.embedder = embedder or OllamaBatchEmbedder(**kwargs)
+        self.model = self.embedder.model
+        self.query_cache = LRUCache(query_cache_size)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed(list(texts))
+
+    # Les questions ne sont pas écrites dans le cache disque, seulement dans
+    # un LRU mémoire (question répétée, routage des shards puis recherche)
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.query_cache.get(text)
+        if vector is None:
+            vector = self.embedder.embed([text], use_cache=False)[0]
+            self.query_cache.put(text, vector)
+        return vector
+
+
+# =========================================================
+# ADAPTATEUR LLAMAINDEX
+# ---------------------------------------------------------
+# llama_index_embedding(...) : BaseEmbedding adossé au même client.
+# Import paresseux : les interfaces LangChain n'ont pas à charger llama_index.
+# =========================================================
+_LLAMA_CLS = None
+
+
+def llama_index_embedding(embedder: Optional[OllamaBatchEmbedder] = None, **kwargs):
+    global _LLAMA_CLS
+    if _LLAMA_CLS is None:
+        from llama_index.core.base.embeddings.base import BaseEmbedding
+        from pydantic import PrivateAttr
+
+        class OllamaBatchEmbedding(BaseEmbedding):
+            _embedder: OllamaBatchEmbedder = PrivateAttr()
+
+            def __init__(self, embedder: OllamaBatchEmbedder, **data):
+                super().__init__(model_name=embedder.model, embed_batch_size=embedder.batch_size, **data)
+                self._embedder = embedder
+
+            def _get_query_embedding(self, query: str) -> List[float]:
+                return self._embedder.embed([query], use_cache=False)[0]
+
+            def _get_text_embedding(self, text: str) -> List[float]:
+                return self._embedder.embed([text])[0]
+
+            def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+                return self._embedder.embed(texts)
+
+            async def _aget_query_embedding(self, query: str) -> List[float]:
+                return self._get_query_embedding(query)
+
+            # Un seul appel pour tous les textes : le client gère lots et concurrence
+            def get_text_embedding_batch(self, texts: List[str], show_progress: bool = False, **kwargs) -> List[List[float]]:
+                return self._embedder.embed(list(texts))
+
+        _LLAMA_CLS = OllamaBatchEmbedding
+
+    return _LLAMA_CLS(embedder or OllamaBatchEmbedder(**kwargs))
+
+
+__all__ = ["OllamaBatchEmbedder", "OllamaBatchEmbeddings", "llama_index_embedding"]
@@ -0,0 +1,421 @@
+# rag_index.py
+# ---------------------------------------------------------
+# Indexation incrémentale du corpus Data_parse dans Chroma
+# ---------------------------------------------------------
+# - IDs de chunks déterministes : hash(source) + hash(contenu du chunk)
+# - Un fichier dont le contenu n'a pas changé n'est ni redécoupé ni réembeddé
+# - Seuls les nouveaux chunks sont embeddés (upsert)
+# - Les chunks dont la source a changé ou disparu sont supprimés
+# - Un manifeste (modèle d'embedding, découpage, nettoyage, empreinte du
+#   corpus) permet de recharger l'index au démarrage sans le reconstruire
+# - L'index lexical BM25 (rag_lexical) est reconstruit à chaque synchronisation
+# ---------------------------------------------------------
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import chromadb
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+
+from rag_config import (
+    CHROMA_DIR, COLLECTION, DATA_DIR, EMBED_MODEL, CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP,
+    CHUNK_TOKENS, CHUNK_TOKENIZER,
+    TEXT_EXTENSIONS, EXCLUDED_DIRS, INDEX_BATCH_SIZE, VECTOR_BACKEND, DEDUP,
+    HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF,
+)
+from rag_lexical import build_lexical_index, lexical_path
+from rag_metadata import METADATA_VERSION, facet_values
+from rag_dedup import DedupStore, Deduplicator, dedup_settings, remove_store, with_sources
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+SplitFn = Callable[[str], List[str]]
+
+
+# =========================================================
+# IDENTIFIANTS & EMPREINTES
+# ---------------------------------------------------------
+# - file_hash : empreinte du contenu brut d'un fichier source
+# - chunk_id  : identifiant stable d'un chunk (source + contenu)
+# =========================================================
+def file_hash(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(source: str, text: str) -> str:
+    src = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+    txt = hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+    return f"{src}-{txt}"
+
+
+# =========================================================
+# LECTURE DU CORPUS
+# ---------------------------------------------------------
+# - iter_source_files : fichiers texte sous data_dir (tri stable), filtrés par
+#   extension sans descendre dans EXCLUDED_DIRS ni les dossiers cachés
+# - read_text         : utf-8, repli cp1252 pour les vieux exports
+# =========================================================
+def iter_source_files(data_dir: str = DATA_DIR) -> Iterator[Path]:
+    if not os.path.isdir(data_dir):
+        raise FileNotFoundError(f"Répertoire introuvable: {data_dir}")
+    paths = []
+    for root, dirs, files in os.walk(data_dir):
+        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS and not d.startswith(".")]
+        paths += [os.path.join(root, f) for f in files
+                  if os.path.splitext(f)[1].lower() in TEXT_EXTENSIONS and not f.startswith(".")]
+    yield from sorted(Path(p) for p in paths)
+
+
+def read_text(path) -> str:
+    return decode_text(Path(path).read_bytes())
+
+
+def decode_text(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("cp1252", errors="replace")
+
+
+# =========================================================
+# NETTOYAGE TEXTE
+# ---------------------------------------------------------
+# clean_text:
+# - remplace l'espace insécable par un espace normal
+# - compresse les espaces multiples à l'intérieur des lignes
+# - garde les sauts de ligne (titres Markdown, paragraphes), 2 au maximum
+# - retire espaces en début/fin
+# CLEAN_VERSION est enregistré dans le manifeste : toute modification de
+# clean_text doit l'incrémenter pour forcer la reconstruction de l'index.
+# =========================================================
+CLEAN_VERSION = 2
+
+
+def clean_text(text: str) -> str:
+    text = text.replace('\u00A0', ' ').replace('\r\n', '\n').replace('\r', '\n')
+    text = re.sub(r'[^\S\n]+', ' ', text)
+    text = re.sub(r' *\n *', '\n', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+
+# =========================================================
+# DÉCOUPAGE
+# ---------------------------------------------------------
+# Découpeur partagé par toutes les entrées (LangChain & LlamaIndex),
+# pour que la collection reste cohérente quel que soit l'outil qui indexe.
+# RAG_CHUNKER=markdown (défaut) : sections Markdown, budget en tokens (rag_chunking)
+# RAG_CHUNKER=recursive         : ancien découpage en caractères
+# =========================================================
+def default_splitter() -> TextSplitter:
+    if CHUNKER == "markdown":
+        from rag_chunking import MarkdownSectionSplitter
+        return MarkdownSectionSplitter(CHUNK_TOKENS)
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def chunker_settings() -> Dict:
+    if CHUNKER == "markdown":
+        return {"name": "markdown_sections", "max_tokens": CHUNK_TOKENS, "tokenizer": CHUNK_TOKENIZER}
+    return {"name": "recursive_character", "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+
+
+# =========================================================
+# COLLECTION CHROMA
+# ---------------------------------------------------------
+# - open_client     : client persistant sur chroma_dir
+#   (RAG_VECTOR_BACKEND=numpy -> NumpyClient, même API, cf. rag_npstore)
+# - open_collection : collection cible (cosine + paramètres HNSW configurés), créée si besoin
+# - close_client    : libère un client (ex. ancien index après bascule de snapshot) :
+#   sans cela chromadb garde son System (SQLite, segments HNSW) en cache par dossier
+# =========================================================
+def hnsw_metadata() -> Dict:
+    meta = {"hnsw:space": "cosine"}
+    for key, value in (("hnsw:M", HNSW_M), ("hnsw:construction_ef", HNSW_CONSTRUCTION_EF),
+                       ("hnsw:search_ef", HNSW_SEARCH_EF)):
+        if value:
+            meta[key] = int(value)
+    return meta
+
+
+def open_client(chroma_dir: str = CHROMA_DIR):
+    if VECTOR_BACKEND == "numpy":
+        from rag_npstore import NumpyClient
+        return NumpyClient(chroma_dir)
+    return chromadb.PersistentClient(path=chroma_dir)
+
+
+def close_client(client) -> None:
+    close = getattr(client, "close", None)
+    if close is not None:
+        close()
+        return
+    # chromadb sans Client.close() : System partagé retiré du cache de son dossier puis arrêté
+    from chromadb.api.client import SharedSystemClient
+    system = SharedSystemClient._identifier_to_system.pop(client._identifier, None)
+    if system is not None:
+        system.stop()
+
+
+def open_collection(client=None, name: str = COLLECTION):
+    client = client or open_client()
+    return client.get_or_create_collection(name=name, metadata=hnsw_metadata())
+
+
+# =========================================================
+# SYNCHRONISATION INCRÉMENTALE
+# ---------------------------------------------------------
+# sync_index(collection, embed_documents, split_text, data_dir, dedup_path):
+# 1) lit l'état indexé (id -> source, source_hash), alias de dédoublonnage compris
+# 2) fichiers lus, nettoyés et découpés en parallèle, en flux (rag_loader) :
+#    * hash identique  -> on garde ses chunks tels quels (fichier non décodé)
+#    * hash différent  -> on n'embedde que les chunks inconnus
+#      (métadonnées : source, source_hash + champs de rag_metadata.extract_metadata)
+#    * chunk quasi identique à un chunk stocké -> alias (si dedup_path, cf. rag_dedup)
+#    * upsert dès que INDEX_BATCH_SIZE nouveaux chunks sont prêts : la mémoire
+#      dépend de la taille des lots, pas de celle du corpus
+# 3) supprime les chunks orphelins (source modifiée ou disparue)
+# Retourne des statistiques (fichiers, chunks ajoutés/supprimés/conservés, doublons).
+# =========================================================
+def sync_index(
+    collection,
+    embed_documents: EmbedFn,
+    split_text: Optional[SplitFn] = None,
+    data_dir: str = DATA_DIR,
+    dedup_path: Optional[str] = None,
+) -> Dict[str, float]:
+    from rag_loader import stream_files
+
+    t0 = time.time()
+    existing = collection.get(include=["metadatas"])
+    existing_meta = {cid: meta or {} for cid, meta in zip(existing["ids"], existing["metadatas"])}
+    dedup = Deduplicator(DedupStore(dedup_path), collection, existing_meta, INDEX_BATCH_SIZE) if dedup_path else None
+    aliases = dedup.aliases if dedup else {}
+    known_ids = set(existing_meta) | set(aliases)
+    indexed: Dict[str, Dict] = {}
+    for cid, meta in list(existing_meta.items()) + [(a, m) for a, (_, m) in aliases.items()]:
+        entry = indexed.setdefault(meta.get("source"), {"hashes": set(), "ids": set()})
+        entry["hashes"].add(meta.get("source_hash"))
+        entry["ids"].add(cid)
+    skip_hashes = {src: next(iter(e["hashes"])) for src, e in indexed.items() if len(e["hashes"]) == 1}
+
+    keep = set()
+    retag: Dict[str, Dict] = {}      # chunks inchangés d'un fichier modifié -> nouvelle source_hash
+    pending: Dict[str, tuple] = {}   # nouveaux chunks en attente d'embedding
+    seen = set()
+    n_files = n_changed = n_added = 0
+    embed_seconds = 0.0
+
+    def flush():
+        nonlocal n_added, embed_seconds
+        ids = list(pending)
+        if not ids:
+            return
+        t = time.time()
+        texts = [pending[cid][0] for cid in ids]
+        metas = [with_sources(pending[cid][1], []) if dedup else pending[cid][1] for cid in ids]
+        collection.upsert(ids=ids, embeddings=embed_documents(texts), documents=texts, metadatas=metas)
+        embed_seconds += time.time() - t
+        n_added += len(ids)
+        pending.clear()
+
+    def add(cid: str, text: str, meta: Dict):
+        if dedup and dedup.assign(cid, text, meta):
+            return
+        pending[cid] = (text, meta)
+        if len(pending) >= INDEX_BATCH_SIZE:
+            flush()
+
+    for item in stream_files(data_dir, skip_hashes, split_text=split_text):
+        n_files += 1
+        if item["unchanged"]:
+            keep |= indexed[item["source"]]["ids"]
+            continue
+        n_changed += 1
+        meta = item["metadata"]
+        for text in item["chunks"]:
+            cid = chunk_id(item["source"], text)
+            if cid in known_ids:
+                keep.add(cid)
+                if cid in aliases:
+                    dedup.retag(cid, meta)
+                else:
+                    retag[cid] = meta
+            elif cid not in seen:
+                seen.add(cid)
+                add(cid, text, meta)
+
+    stale = known_ids - keep
+    stale_reps = sorted(stale & existing_meta.keys())
+    for i in range(0, len(stale_reps), INDEX_BATCH_SIZE):
+        collection.delete(ids=stale_reps[i:i + INDEX_BATCH_SIZE])
+
+    dedup_stats: Dict[str, int] = {}
+    if dedup:
+        for cid, text, meta in dedup.finish(stale):
+            add(cid, text, meta)
+    flush()
+    if dedup:
+        retag.update(dedup.source_updates(stale, retag))
+        dedup_stats = dedup.stats()
+        dedup.store.close()
+
+    retag_ids = sorted(retag)
+    for i in range(0, len(retag_ids), INDEX_BATCH_SIZE):
+        batch = retag_ids[i:i + INDEX_BATCH_SIZE]
+        collection.update(ids=batch, metadatas=[retag[cid] for cid in batch])
+    t_end = time.time()
+
+    stats = {
+        "files": n_files,
+        "files_changed": n_changed,
+        "added": n_added,
+        "deleted": len(stale),
+        "kept": len(keep),
+        "embed_seconds": round(embed_seconds, 2),
+        "total_seconds": round(t_end - t0, 2),
+        **dedup_stats,
+    }
+    print(
+        f"🗂️ Index synchronisé : {n_files} fichiers ({n_changed} modifiés) | "
+        f"+{stats['added']} / -{stats['deleted']} chunks, {stats['kept']} conservés | "
+        f"{stats['total_seconds']}s (embeddings {stats['embed_seconds']}s)"
+    )
+    if dedup_stats:
+        total = collection.count() + dedup_stats["duplicates"]
+        print(
+            f"🧬 Dédoublonnage : {dedup_stats['duplicates_new']} nouveaux quasi-doublons écartés | "
+            f"{dedup_stats['duplicates']} / {total} chunks non stockés "
+            f"({100 * dedup_stats['duplicates'] / max(total, 1):.1f} %, "
+            f"{dedup_stats['duplicate_chars'] / 1e6:.2f} M caractères non embeddés)"
+        )
+    return stats
+
+
+# =========================================================
+# MANIFESTE D'INDEX
+# ---------------------------------------------------------
+# - corpus_fingerprint : empreinte (chemin, taille, mtime) de tous les fichiers,
+#   calculée sans lire leur contenu
+# - index_settings     : tout ce qui rend les vecteurs incompatibles s'il change
+#   (modèle d'embedding, paramètres de découpage, version du nettoyage)
+# - manifest_path      : un manifeste par collection (et par backend vectoriel),
+#   à côté de la base Chroma
+# - dedup_path         : état du dédoublonnage (signatures, alias), même emplacement
+# =========================================================
+def corpus_fingerprint(data_dir: str = DATA_DIR) -> str:
+    h = hashlib.sha256()
+    for path in iter_source_files(data_dir):
+        st = path.stat()
+        h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def index_settings(embed_model_name: str = EMBED_MODEL) -> Dict:
+    return {
+        "embed_model": embed_model_name,
+        "chunker": chunker_settings(),
+        "clean_version": CLEAN_VERSION,
+        "metadata_version": METADATA_VERSION,
+        "extensions": list(TEXT_EXTENSIONS),
+        "backend": VECTOR_BACKEND,
+        "hnsw": hnsw_metadata() if VECTOR_BACKEND == "chroma" else None,
+        "dedup": dedup_settings() if DEDUP else None,
+    }
+
+
+def manifest_path(chroma_dir: str = CHROMA_DIR, name: str = COLLECTION) -> str:
+    suffix = "" if VECTOR_BACKEND == "chroma" else f".{VECTOR_BACKEND}"
+    return os.path.join(chroma_dir, f"{name}{suffix}.manifest.json")
+
+
+def dedup_path(chroma_dir: str = CHROMA_DIR, name: str = COLLECTION) -> str:
+    suffix = "" if VECTOR_BACKEND == "chroma" else f".{VECTOR_BACKEND}"
+    return os.path.join(chroma_dir, f"{name}{suffix}.dedup.sqlite")
+
+
+def read_manifest(chroma_dir: str = CHROMA_DIR, name: str = COLLECTION) -> Optional[Dict]:
+    try:
+        with open(manifest_path(chroma_dir, name), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_manifest(manifest: Dict, chroma_dir: str = CHROMA_DIR, name: str = COLLECTION) -> None:
+    path = manifest_path(chroma_dir, name)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+# =========================================================
+# CHARGEMENT OU (RE)CONSTRUCTION AU DÉMARRAGE
+# ---------------------------------------------------------
+# load_or_build(client, embed_documents, ...):
+# - manifeste identique               -> on recharge l'index tel quel
+# - seule l'empreinte du corpus change -> synchronisation incrémentale
+# - paramètres différents / pas de manifeste sur une collection non vide
+#                                      -> collection vidée puis reconstruite
+# Le manifeste n'est écrit qu'après une synchronisation réussie :
+# un index obsolète n'est jamais servi silencieusement.
+# L'index lexical est reconstruit après chaque synchronisation (ou s'il manque).
+# =========================================================
+def load_or_build(
+    client,
+    embed_documents: EmbedFn,
+    embed_model_name: str = EMBED_MODEL,
+    data_dir: str = DATA_DIR,
+    chroma_dir: str = CHROMA_DIR,
+    name: str = COLLECTION,
+):
+    settings = index_settings(embed_model_name)
+    fingerprint = corpus_fingerprint(data_dir)
+    manifest = read_manifest(chroma_dir, name)
+    collection = open_collection(client, name)
+
+    if manifest and manifest.get("settings") == settings:
+        if manifest.get("corpus_fingerprint") == fingerprint:
+            print(f"♻️ Index à jour chargé depuis {chroma_dir} ({collection.count()} chunks)")
+            if not os.path.exists(lexical_path(chroma_dir, name)):
+                build_lexical_index(collection, chroma_dir, name)
+            return collection
+        print("🔄 Corpus modifié : mise à jour incrémentale de l'index...")
+    elif manifest or collection.count():
+        print("📚 Paramètres d'index modifiés : reconstruction complète...")
+        client.delete_collection(name)
+        remove_store(dedup_path(chroma_dir, name))
+        collection = open_collection(client, name)
+    else:
+        print("📚 Création de l'index vectoriel...")
+        remove_store(dedup_path(chroma_dir, name))
+
+    stats = sync_index(collection, embed_documents, data_dir=data_dir,
+                       dedup_path=dedup_path(chroma_dir, name) if DEDUP else None)
+    build_lexical_index(collection, chroma_dir, name)
+    write_manifest({
+        "collection": name,
+        "settings": settings,
+        "corpus_fingerprint": fingerprint,
+        "chunks": collection.count(),
+        "facets": facet_values(collection),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "last_sync": stats,
+    }, chroma_dir, name)
+    return collection
+
+
+__all__ = [
+    "chunk_id", "file_hash", "iter_source_files", "read_text", "clean_text", "default_splitter",
+    "chunker_settings",
+    "open_client", "close_client", "open_collection", "sync_index",
+    "corpus_fingerprint", "index_settings", "dedup_path", "read_manifest", "write_manifest", "load_or_build",
+]
@@ -0,0 +1,233 @@
+# rag_lexical.py
+# ---------------------------------------------------------
+# Index lexical BM25 persisté à côté de la collection Chroma
+# ---------------------------------------------------------
+# - Construit pendant l'indexation (aucun embedding nécessaire)
+# - Chemin rapide "code exact" : si la question contient un code produit /
+#   matière connu (SE123, GV...), la réponse vient du seul index lexical,
+#   sans appel d'embedding
+# - fuse : fusion RRF (Reciprocal Rank Fusion) des résultats lexicaux et vectoriels
+# ---------------------------------------------------------
+import gzip
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+
+from langchain_core.documents import Document
+
+from rag_config import CHROMA_DIR, COLLECTION, PRODUCT_CODES, RRF_K
+from rag_npstore import match_where
+
+
+# =========================================================
+# CODES PRODUITS / MATIÈRES
+# ---------------------------------------------------------
+# - référence de selle "SE" + chiffres citée dans le texte, ou référence de la
+#   fiche (métadonnée saddle, issue de l'en-tête "**Selle : SE123**" ajouté par
+#   image-to-md.py) ; jamais déduite de chiffres quelconques du nom de fichier
+#   (années, numéros de page des thèses et transcriptions)
+# - code matière en majuscules présent dans le nom du fichier (ex. 'GV',
+#   y compris entre "_" : "fiche_123_GV")
+# Les codes connus sont appris à la construction de l'index.
+# =========================================================
+SADDLE_RE = re.compile(r"\bSE\s?-?(\d{2,3})\b", re.IGNORECASE)
+UPPER_CODE_RE = re.compile(r"(?<![A-Za-z0-9])([A-Z]{2,4}\d{0,3})(?![A-Za-z0-9])")
+# Sigles fréquents qui ne sont pas des codes produit
+NOT_CODES = {"CWD", "LIM", "FR", "EN", "PDF", "MD", "TXT", "PPTX", "DOCX", "XLSX", "OCR", "RAG", "IA"}
+
+
+def extract_codes(text: str, source: str = "", saddle: str = "") -> Set[str]:
+    codes = {f"SE{m.group(1)}" for m in SADDLE_RE.finditer(text)}
+    if saddle:
+        codes.add(saddle)
+    if source:
+        codes |= {c for c in UPPER_CODE_RE.findall(Path(source).stem) if c not in NOT_CODES}
+    return codes
+
+
+def question_codes(question: str, known: Set[str]) -> Set[str]:
+    """Codes connus cités dans la question (SE normalisé, sigles sensibles à la casse)."""
+    found = {f"SE{m.group(1)}" for m in SADDLE_RE.finditer(question)}
+    found |= set(UPPER_CODE_RE.findall(question))
+    return {c for c in found if c in known}
+
+
+# =========================================================
+# TOKENISATION
+# ---------------------------------------------------------
+# minuscules, accents retirés, mots alphanumériques, mots vides FR/EN retirés
+# =========================================================
+STOPWORDS = set("""
+a au aux avec ce ces cet cette dans de des du elle en est et il ils je la le les leur
+lui ma mais me mes mon ne nos notre nous on ou par pas pour qu que qui sa se ses son
+sur ta te tes ton tu un une vos votre vous y d l n s t c j m qu est sont être avoir
+the of and to in is are for on with as by an be this that it or at from
+""".split())
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [t for t in TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+# =========================================================
+# INDEX BM25
+# ---------------------------------------------------------
+# - docs     : [id, texte, métadonnées] (pour répondre sans Chroma)
+# - postings : terme -> [[indice doc, tf], ...]
+# - codes    : code -> [indices docs]
+# =========================================================
+class BM25Index:
+    def __init__(self, docs: List[list], postings: Dict[str, list], codes: Dict[str, list],
+                 k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.postings = postings
+        self.codes = codes
+        self.k1 = k1
+        self.b = b
+        self.lengths = [0] * len(docs)
+        for plist in postings.values():
+            for i, tf in plist:
+                self.lengths[i] += tf
+        self.avgdl = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.known_codes = set(codes)
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Optional[Dict]]) -> "BM25Index":
+        docs, postings, codes = [], {}, {}
+        for i, (cid, text, meta) in enumerate(zip(ids, texts, metadatas)):
+            meta = meta or {}
+            source = meta.get("source", "")
+            docs.append([cid, text, meta])
+            # Le nom du fichier fait partie du texte indexé (codes matière, références)
+            counts = Counter(tokenize(text) + tokenize(Path(source).stem if source else ""))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append([i, tf])
+            for code in extract_codes(text, source, meta.get("saddle", "")):
+                codes.setdefault(code, []).append(i)
+        for code in PRODUCT_CODES:
+            codes.setdefault(code, [])
+        return cls(docs, postings, codes)
+
+    # -----------------------------------------------------
+    # Persistance (JSON gzip, écriture atomique)
+    # -----------------------------------------------------
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump({"docs": self.docs, "postings": self.postings, "codes": self.codes}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["docs"], data["postings"], data["codes"])
+
+    # -----------------------------------------------------
+    # Recherche
+    # -----------------------------------------------------
+    def _to_document(self, i: int, score: float) -> Document:
+        cid, text, meta = self.docs[i]
+        return Document(page_content=text, metadata={**meta, "lexical_score": round(score, 4)}, id=cid)
+
+    def matching(self, where: Optional[Dict]) -> Optional[Set[int]]:
+        """Indices des chunks dont les métadonnées respectent le filtre (None = pas de filtre)."""
+        if not where:
+            return None
+        return {i for i, (_, _, meta) in enumerate(self.docs) if match_where(meta, where)}
+
+    def scores(self, question: str, restrict: Optional[Set[int]] = None) -> Dict[int, float]:
+        n = len(self.docs)
+        out: Dict[int, float] = {}
+        for term in set(tokenize(question)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for i, tf in plist:
+                if restrict is not None and i not in restrict:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avgdl or 1))
+                out[i] = out.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return out
+
+    def search(self, question: str, k: int = 20, where: Optional[Dict] = None) -> List[Document]:
+        ranked = sorted(self.scores(question, self.matching(where)).items(), key=lambda x: -x[1])[:k]
+        return [self._to_document(i, s) for i, s in ranked]
+
+    def code_lookup(self, question: str, k: int = 5, where: Optional[Dict] = None) -> List[Document]:
+        """
+        Chemin rapide : chunks contenant les codes cités (tous si possible),
+        classés par BM25 sur la question complète. Liste vide si aucun code connu.
+        where : filtre de métadonnées optionnel (syntaxe Chroma).
+        """
+        codes = question_codes(question, self.known_codes)
+        if not codes:
+            return []
+        sets = [set(self.codes.get(c, [])) for c in codes]
+        candidates = set.intersection(*sets) or set.union(*sets)
+        allowed = self.matching(where)
+        if allowed is not None:
+            candidates &= allowed
+        if not candidates:
+            return []
+        scored = self.scores(question, restrict=candidates)
+        ranked = sorted(candidates, key=lambda i: -scored.get(i, 0.0))[:k]
+        return [self._to_document(i, scored.get(i, 0.0)) for i in ranked]
+
+
+# =========================================================
+# FUSION HYBRIDE (RRF)
+# ---------------------------------------------------------
+# score(doc) = somme sur chaque liste de 1 / (RRF_K + rang)
+# Identité d'un chunk : son id (rag_index.chunk_id) recalculé si absent.
+# =========================================================
+def _doc_key(doc: Document) -> str:
+    from rag_index import chunk_id
+    return doc.id or chunk_id(doc.metadata.get("source", ""), doc.page_content)
+
+
+def fuse(result_lists: Sequence[Sequence[Document]], k: int = 5, rrf_k: int = RRF_K) -> List[Document]:
+    scores: Dict[str, float] = {}
+    by_key: Dict[str, Document] = {}
+    for docs in result_lists:
+        for rank, doc in enumerate(docs):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            by_key.setdefault(key, doc)
+    ranked = sorted(scores, key=lambda key: -scores[key])[:k]
+    return [by_key[key] for key in ranked]
+
+
+# =========================================================
+# EMPLACEMENT & CHARGEMENT
+# =========================================================
+def lexical_path(chroma_dir: str = CHROMA_DIR, name: str = COLLECTION) -> str:
+    return os.path.join(chroma_dir, f"{name}.bm25.json.gz")
+
+
+def build_lexical_index(collection, chroma_dir: str = CHROMA_DIR, name: str = COLLECTION) -> BM25Index:
+    data = collection.get(include=["documents", "metadatas"])
+    index = BM25Index.build(data["ids"], data["documents"], data["metadatas"])
+    index.save(lexical_path(chroma_dir, name))
+    print(f"🔤 Index lexical BM25 : {len(index.docs)} chunks, {len(index.known_codes)} codes connus")
+    return index
+
+
+def load_lexical_index(chroma_dir: str = CHROMA_DIR, name: str = COLLECTION) -> Optional[BM25Index]:
+    path = lexical_path(chroma_dir, name)
+    return BM25Index.load(path) if os.path.exists(path) else None
+
+
+__all__ = [
+    "BM25Index", "extract_codes", "question_codes", "tokenize", "fuse",
+    "lexical_path", "build_lexical_index", "load_lexical_index",
+]
@@ -0,0 +1,129 @@
+# rag_limits.py
+# ---------------------------------------------------------
+# Limites de concurrence par étape (asyncio) pour les interfaces
+# ---------------------------------------------------------
+# StageLimiter(nom, concurrence, file max, délai) :
+# - au plus `concurrency` requêtes dans l'étape (ex. génération Ollama)
+# - au-delà, file d'attente FIFO bornée à `max_queue` requêtes :
+#   * file pleine       -> OverloadedError immédiate
+#   * attente > timeout -> OverloadedError
+# - acquire() : générateur asynchrone qui produit la position dans la file
+#   tant que la requête attend (retour utilisateur), puis se termine quand
+#   la place est obtenue ; release() la libère
+# - slot() : contexte asynchrone équivalent, sans retour de position
+# - hold() : contexte synchrone pour les threads de fond (ex. menu pré-calculé) :
+#   prend une place seulement si elle est libre sans file d'attente, sinon
+#   OverloadedError (le travail de fond cède la place aux utilisateurs) ; la
+#   place compte dans `active`, les requêtes en file la voient se libérer au
+#   prochain rafraîchissement (POLL_S)
+# Un StageLimiter appartient à la boucle asyncio qui l'utilise (celle de Gradio) ;
+# seul hold() peut être appelé depuis un autre thread.
+# ---------------------------------------------------------
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict
+
+POLL_S = 1.0   # rafraîchissement de la position même sans libération
+
+
+class OverloadedError(RuntimeError):
+    pass
+
+
+class StageLimiter:
+    def __init__(self, name: str, concurrency: int, max_queue: int = 0, timeout: float = 60.0):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._queue: deque = deque()
+        self._cond = asyncio.Condition()
+        self._active_lock = threading.Lock()   # `active` partagé avec les threads de fond (hold)
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0, "timeouts": 0, "background": 0}
+
+    def _try_take(self) -> bool:
+        with self._active_lock:
+            if self.active >= self.concurrency:
+                return False
+            self.active += 1
+            self.counters["admitted"] += 1
+            return True
+
+    def _ready(self, ticket) -> bool:
+        return self._queue[0] is ticket and self.active < self.concurrency
+
+    async def acquire(self) -> AsyncIterator[int]:
+        async with self._cond:
+            if not self._queue and self._try_take():
+                return
+            if len(self._queue) >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise OverloadedError(f"{self.name} : file d'attente pleine ({self.max_queue} requêtes)")
+            ticket = object()
+            self._queue.append(ticket)
+            self.counters["queued"] += 1
+
+        deadline = time.monotonic() + self.timeout
+        try:
+            while True:
+                async with self._cond:
+                    if self._queue[0] is ticket and self._try_take():
+                        self._queue.popleft()
+                        self._cond.notify_all()
+                        return
+                    position = self._queue.index(ticket) + 1
+                yield position
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["timeouts"] += 1
+                    raise OverloadedError(f"{self.name} : délai d'attente dépassé ({self.timeout:.0f} s)")
+                async with self._cond:
+                    if not self._ready(ticket):
+                        try:
+                            await asyncio.wait_for(self._cond.wait(), min(remaining, POLL_S))
+                        except asyncio.TimeoutError:
+                            pass
+        finally:
+            # abandon (délai, déconnexion du client) : on sort de la file
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                async with self._cond:
+                    self._cond.notify_all()
+
+    async def release(self) -> None:
+        async with self._cond:
+            with self._active_lock:
+                self.active -= 1
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        async for _ in self.acquire():
+            pass
+        try:
+            yield
+        finally:
+            await self.release()
+
+    @contextmanager
+    def hold(self):
+        with self._active_lock:
+            if self._queue or self.active >= self.concurrency:
+                raise OverloadedError(f"{self.name} : aucune place libre pour une tâche de fond")
+            self.active += 1
+            self.counters["background"] += 1
+        try:
+            yield
+        finally:
+            with self._active_lock:
+                self.active -= 1
+
+    def stats(self) -> Dict:
+        return {**self.counters, "active": self.active, "waiting": len(self._queue)}
+
+
+__all__ = ["OverloadedError", "StageLimiter"]
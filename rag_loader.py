@@ -0,0 +1,121 @@
+# rag_loader.py
+# ---------------------------------------------------------
+# Chargement du corpus en flux, en parallèle, filtré par extension
+# ---------------------------------------------------------
+# Remplace DirectoryLoader(glob="**/*", loader_cls=TextLoader), qui tentait
+# de décoder chaque fichier (images comprises) et chargeait tout le corpus
+# en mémoire avant nettoyage :
+# - seuls les fichiers texte (TEXT_EXTENSIONS) hors EXCLUDED_DIRS sont lus
+#   (rag_index.iter_source_files)
+# - lecture + empreinte + nettoyage + métadonnées + découpage dans un pool
+#   de processus (LOADER_WORKERS) ; le tokenizer du découpage est résolu une
+#   fois dans le parent et transmis aux workers à leur démarrage
+# - les résultats sont produits un par un (générateur) dans l'ordre des
+#   fichiers, avec au plus 2 x LOADER_WORKERS fichiers en vol : la mémoire
+#   reste proportionnelle aux lots, pas au corpus
+# Interfaces :
+# - stream_files      : pour rag_index.sync_index (chunks + métadonnées)
+# - CorpusLoader      : BaseLoader LangChain (lazy_load -> Documents nettoyés)
+# ---------------------------------------------------------
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+
+from rag_chunking import get_token_counter, set_token_counter
+from rag_config import CHUNKER, DATA_DIR, LOADER_WORKERS
+from rag_index import clean_text, decode_text, default_splitter, iter_source_files
+from rag_metadata import extract_metadata
+
+SplitFn = Callable[[str], List[str]]
+
+# Découpeur par processus (construit une fois par worker)
+_SPLIT: Optional[SplitFn] = None
+
+
+def _init_worker(counter) -> None:
+    """Démarrage d'un worker : tokenizer déjà résolu par le parent."""
+    if counter is not None:
+        set_token_counter(counter)
+
+
+# =========================================================
+# TRAITEMENT D'UN FICHIER (exécuté dans un worker)
+# ---------------------------------------------------------
+# load_file(path, data_dir, skip_hash, split, split_text) -> dict :
+#   source, source_hash, unchanged, metadata, text (si split=False), chunks
+# Si l'empreinte vaut skip_hash, le fichier n'est ni décodé ni découpé.
+# =========================================================
+def load_file(path: str, data_dir: str = DATA_DIR, skip_hash: Optional[str] = None,
+              split: bool = True, split_text: Optional[SplitFn] = None) -> Dict:
+    global _SPLIT
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    if digest == skip_hash:
+        return {"source": path, "source_hash": digest, "unchanged": True}
+
+    text = decode_text(raw)
+    meta = {"source": path, "source_hash": digest, **extract_metadata(path, text, data_dir)}
+    text = clean_text(text)
+    out = {"source": path, "source_hash": digest, "unchanged": False, "metadata": meta}
+    if not split:
+        out["text"] = text
+        return out
+    if split_text is None:
+        if _SPLIT is None:
+            _SPLIT = default_splitter().split_text
+        split_text = _SPLIT
+    out["chunks"] = [c for c in split_text(text) if c.strip()]
+    return out
+
+
+# =========================================================
+# FLUX DE FICHIERS
+# ---------------------------------------------------------
+# stream_files(data_dir, skip_hashes, split, split_text, workers)
+# skip_hashes : source -> empreinte déjà indexée (fichiers inchangés sautés)
+# split_text  : découpeur personnalisé (doit être picklable si workers > 1)
+# =========================================================
+def stream_files(data_dir: str = DATA_DIR, skip_hashes: Optional[Dict[str, str]] = None,
+                 split: bool = True, split_text: Optional[SplitFn] = None,
+                 workers: int = LOADER_WORKERS) -> Iterator[Dict]:
+    skip_hashes = skip_hashes or {}
+    paths = (str(p) for p in iter_source_files(data_dir))
+
+    if workers <= 1:
+        for path in paths:
+            yield load_file(path, data_dir, skip_hashes.get(path), split, split_text)
+        return
+
+    counter = get_token_counter() if split and split_text is None and CHUNKER == "markdown" else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(counter,)) as pool:
+        in_flight = deque()
+        for path in paths:
+            in_flight.append(pool.submit(load_file, path, data_dir, skip_hashes.get(path), split, split_text))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+# =========================================================
+# LOADER LANGCHAIN
+# ---------------------------------------------------------
+# CorpusLoader(data_dir).lazy_load() -> Documents nettoyés (un par fichier),
+# à enchaîner avec n'importe quel TextSplitter sans tout charger en mémoire.
+# =========================================================
+class CorpusLoader(BaseLoader):
+    def __init__(self, data_dir: str = DATA_DIR, workers: int = LOADER_WORKERS):
+        self.data_dir = data_dir
+        self.workers = workers
+
+    def lazy_load(self) -> Iterator[Document]:
+        for item in stream_files(self.data_dir, split=False, workers=self.workers):
+            yield Document(page_content=item["text"], metadata=item["metadata"])
+
+
+__all__ = ["load_file", "stream_files", "CorpusLoader"]
@@ -0,0 +1,168 @@
+# rag_menu.py
+# ---------------------------------------------------------
+# Réponses pré-calculées du menu de questions (app Gradio)
+# ---------------------------------------------------------
+# - Questions : fichier texte RAG_MENU_FILE, une question par ligne
+#   (lignes vides et commentaires "#" ignorés), ordre conservé dans le menu
+# - Réponses + sources calculées par une tâche de fond et persistées en JSON
+#   (RAG_MENU_STORE) : servies instantanément, y compris après redémarrage
+# - Chaque entrée porte l'espace de noms de son calcul (version de l'index,
+#   modèle, empreinte du prompt : rag_answer_cache.answer_namespace) ; elle est
+#   périmée si cet espace de noms change ou après RAG_MENU_MAX_AGE secondes
+# - Entrée périmée : servie avec mention (RAG_MENU_SERVE_STALE) et recalculée
+#   en arrière-plan ; entrée absente : question traitée en direct
+# - La tâche de fond ne calcule que si l'app est inactive (aucune génération
+#   en cours) et, pour les entrées périmées, dans la plage horaire
+#   RAG_MENU_REFRESH_HOURS (ex. "20-7" ; vide = à toute heure) : la charge
+#   part en heures creuses ; un calcul qui n'obtient pas de place (compute lève
+#   OverloadedError, cf. StageLimiter.hold) est repris au passage suivant
+# ---------------------------------------------------------
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from rag_config import MENU_FILE, MENU_MAX_AGE, MENU_POLL, MENU_REFRESH_HOURS, MENU_SERVE_STALE, MENU_STORE
+from rag_limits import OverloadedError
+
+ComputeFn = Callable[[str], Tuple[str, Sequence[str]]]   # question -> (réponse, sources)
+
+
+def load_questions(path: str = MENU_FILE) -> List[str]:
+    if not os.path.exists(path):
+        print(f"⚠️ Menu de questions introuvable : {path}")
+        return []
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+
+def in_hours(spec: str, hour: int) -> bool:
+    """Plage horaire "début-fin" (fin exclue, peut passer minuit) ; vide = toujours."""
+    if not spec:
+        return True
+    start, end = (int(h) for h in spec.split("-", 1))
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+# =========================================================
+# MENU PRÉ-CALCULÉ
+# ---------------------------------------------------------
+# get(question) -> entrée {"answer", "sources", "age_s", "stale"} ou None
+# refresh_once() : calcule les entrées absentes / périmées (une à la fois)
+# start() : tâche de fond, réveillée dès qu'une entrée périmée est servie
+# =========================================================
+class PrecomputedMenu:
+    def __init__(self, compute: ComputeFn, namespace: Callable[[], str], questions_path: str = MENU_FILE,
+                 store_path: str = MENU_STORE, max_age: float = MENU_MAX_AGE,
+                 refresh_hours: str = MENU_REFRESH_HOURS, idle: Optional[Callable[[], bool]] = None):
+        self.compute = compute
+        self.namespace_fn = namespace
+        self.questions = load_questions(questions_path)
+        self.store_path = store_path
+        self.max_age = max_age
+        self.refresh_hours = refresh_hours
+        self.idle = idle
+        self.namespace: Optional[str] = None
+        self.entries: Dict[str, Dict] = self._load()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.counters = {"served": 0, "stale_served": 0, "computed": 0, "errors": 0}
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.store_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.store_path) or ".", exist_ok=True)
+        tmp = self.store_path + ".tmp"
+        with self._lock:
+            data = json.dumps(self.entries, ensure_ascii=False, indent=2)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.store_path)
+
+    def _stale(self, entry: Dict, now: float) -> bool:
+        return entry["namespace"] != self.namespace or now - entry["created"] > self.max_age
+
+    def get(self, question: str) -> Optional[Dict]:
+        question = (question or "").strip()
+        if question not in self.questions:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(question)
+            if entry is None:
+                return None
+            stale = self._stale(entry, now)
+            if stale and not MENU_SERVE_STALE:
+                self._wake.set()
+                return None
+            self.counters["served"] += 1
+            if stale:
+                self.counters["stale_served"] += 1
+                self._wake.set()
+            return {"answer": entry["answer"], "sources": entry["sources"],
+                    "age_s": round(now - entry["created"], 1), "stale": stale}
+
+    def pending(self) -> Tuple[List[str], List[str]]:
+        """-> (questions sans réponse, questions à réponse périmée)."""
+        now = time.time()
+        with self._lock:
+            missing = [q for q in self.questions if q not in self.entries]
+            stale = [q for q in self.questions if q in self.entries and self._stale(self.entries[q], now)]
+        return missing, stale
+
+    def refresh_once(self) -> int:
+        self.namespace = self.namespace_fn()
+        missing, stale = self.pending()
+        todo = missing + (stale if in_hours(self.refresh_hours, time.localtime().tm_hour) else [])
+        done = 0
+        for question in todo:
+            if self.idle is not None and not self.idle():
+                break   # requêtes en cours : reprise au prochain passage
+            namespace = self.namespace
+            try:
+                t0 = time.time()
+                answer, sources = self.compute(question)
+            except OverloadedError:
+                break   # requêtes utilisateur prioritaires : reprise au prochain passage
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"⚠️ Menu : échec du pré-calcul de « {question} » : {e}")
+                continue
+            with self._lock:
+                self.entries[question] = {"answer": answer, "sources": list(sources),
+                                          "namespace": namespace, "created": time.time()}
+                self.counters["computed"] += 1
+            self._save()
+            done += 1
+            print(f"📌 Menu : réponse pré-calculée en {time.time() - t0:.1f} s — {question}")
+        return done
+
+    def start(self, interval: float = MENU_POLL) -> "PrecomputedMenu":
+        if self.questions and self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self, interval: float) -> None:
+        while True:
+            try:
+                self.refresh_once()
+            except Exception as e:
+                print(f"⚠️ Menu : mise à jour impossible : {e}")
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def stats(self) -> Dict:
+        missing, stale = self.pending()
+        return {**self.counters, "questions": len(self.questions), "missing": len(missing), "stale": len(stale)}
+
+
+__all__ = ["load_questions", "in_hours", "PrecomputedMenu"]
@@ -0,0 +1,162 @@
+# rag_metadata.py
+# ---------------------------------------------------------
+# Métadonnées des chunks (indexation) et filtres "where" (recherche)
+# ---------------------------------------------------------
+# À l'indexation, extract_metadata déduit du chemin et des en-têtes
+# ajoutés par image-to-md.py ("**Selle : SE123**", "**Matière : ...**") :
+#   brand     : CWD / LIM (dossier racine "CWD FR", "LIM FR"...)
+#   language  : fr / en (dossier, suffixe _fr/_en, sinon mots vides du texte)
+#   doc_type  : fiche, argumentaire, these, transcription, protocole, document
+#   saddle    : référence de selle (SE123), uniquement si le document en décrit
+#               une : en-tête "**Selle : ...**" ou "SE123" explicite dans le nom
+#   material  : matière (en-tête) ou code matière du nom de fichier
+# À la recherche, infer_where déduit un filtre de la question (marque, selle)
+# en ne retenant que des valeurs présentes dans l'index (facettes du manifeste).
+# ---------------------------------------------------------
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from rag_config import CHROMA_DIR, COLLECTION, DATA_DIR
+from rag_lexical import SADDLE_RE, extract_codes
+
+# METADATA_VERSION est enregistré dans le manifeste : toute modification de
+# extract_metadata doit l'incrémenter pour forcer la reconstruction de l'index.
+METADATA_VERSION = 2
+FACET_FIELDS = ("brand", "language", "doc_type", "saddle", "material")
+
+BRANDS = ("CWD", "LIM")
+DOC_TYPES = (
+    # (type, mots-clés du chemin, sans accents, en majuscules) : le premier trouvé l'emporte
+    ("transcription", ("TRANSCRIPTION", "VIDEO")),
+    ("these", ("THESE", "THESIS")),
+    ("fiche", ("FICHE", "CODIFICATION")),
+    ("argumentaire", ("ARGUMENTAIRE",)),
+    ("protocole", ("PROTOCOLE",)),
+)
+SADDLE_HEADER_RE = re.compile(r"\*\*Selle\s*:\s*(SE\s?\d{2,3})\*\*", re.IGNORECASE)
+SADDLE_STEM_RE = re.compile(r"(?<![A-Za-z0-9])SE[\s_\-]?(\d{2,3})(?!\d)", re.IGNORECASE)
+MATERIAL_HEADER_RE = re.compile(r"\*\*Matière\s*:\s*(.+?)\*\*", re.IGNORECASE)
+LANG_PART_RE = re.compile(r"(?:^|[\s_\-])(FR|EN)(?:$|[\s_\-.])", re.IGNORECASE)
+WORD_RE = re.compile(r"[a-zà-ÿ]+")
+FR_WORDS = {"le", "la", "les", "des", "du", "et", "est", "une", "pour", "dans", "sur", "avec", "que", "qui"}
+EN_WORDS = {"the", "and", "is", "of", "to", "in", "for", "with", "that", "on", "are", "this", "by"}
+
+
+def _ascii_upper(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).upper()
+
+
+# =========================================================
+# EXTRACTION (indexation)
+# ---------------------------------------------------------
+# extract_metadata(path, text, data_dir) -> dict (champs vides omis :
+# Chroma n'accepte pas None comme valeur de métadonnée)
+# =========================================================
+def detect_language(parts: Iterable[str], text: str) -> str:
+    for part in parts:
+        m = LANG_PART_RE.search(part)
+        if m:
+            return m.group(1).lower()
+    words = WORD_RE.findall(text[:4000].lower())
+    fr = sum(w in FR_WORDS for w in words)
+    en = sum(w in EN_WORDS for w in words)
+    if fr == en:
+        return ""
+    return "fr" if fr > en else "en"
+
+
+def extract_metadata(path, text: str, data_dir: str = DATA_DIR) -> Dict[str, str]:
+    path = Path(path)
+    try:
+        parts = path.relative_to(data_dir).parts
+    except ValueError:
+        parts = path.parts
+    if len(parts) == 1 or not any(b in _ascii_upper(parts[0]).split() for b in BRANDS):
+        # data_dir = racine d'un shard ("DATA_DIR/CWD FR") : le dossier racine est data_dir lui-même
+        root = Path(data_dir).name
+        if any(b in _ascii_upper(root).split() for b in BRANDS):
+            parts = (root, *parts)
+    upper = [_ascii_upper(p) for p in parts]
+
+    meta: Dict[str, str] = {}
+    top = upper[0].split() if len(upper) > 1 else []
+    brand = next((b for b in BRANDS if b in top), "")
+    if brand:
+        meta["brand"] = brand
+
+    # nom de fichier ("..._en.pdf") puis dossier racine ("CWD FR")
+    language = detect_language([path.stem, parts[0]] if len(parts) > 1 else [path.stem], text)
+    if language:
+        meta["language"] = language
+
+    joined = " / ".join(upper)
+    meta["doc_type"] = next((t for t, keys in DOC_TYPES if any(k in joined for k in keys)), "document")
+
+    # pas de selle déduite d'autres chiffres du nom (années, numéros de page...)
+    m = SADDLE_HEADER_RE.search(text[:500]) or SADDLE_STEM_RE.search(path.stem)
+    if m:
+        meta["saddle"] = "SE" + re.sub(r"\D", "", m.group(1))
+
+    m = MATERIAL_HEADER_RE.search(text[:500])
+    materials = sorted(c for c in extract_codes("", str(path)) if not c.startswith("SE"))
+    if m:
+        meta["material"] = m.group(1).strip()
+    elif materials:
+        meta["material"] = materials[0]
+    return meta
+
+
+def facet_values(collection) -> Dict[str, List[str]]:
+    """Valeurs distinctes de chaque champ dans la collection (enregistrées dans le manifeste)."""
+    values: Dict[str, set] = {f: set() for f in FACET_FIELDS}
+    for meta in collection.get(include=["metadatas"])["metadatas"]:
+        for field in FACET_FIELDS:
+            if meta and meta.get(field):
+                values[field].add(meta[field])
+    return {f: sorted(v) for f, v in values.items()}
+
+
+def load_facets(chroma_dir: str = CHROMA_DIR, name: str = COLLECTION) -> Dict[str, List[str]]:
+    from rag_index import read_manifest
+    return (read_manifest(chroma_dir, name) or {}).get("facets") or {}
+
+
+# =========================================================
+# FILTRES (recherche)
+# ---------------------------------------------------------
+# - to_where     : {"brand": "CWD", "saddle": "SE123"} -> syntaxe Chroma
+#                  ({"$and": [...]} dès qu'il y a plusieurs champs)
+# - infer_where  : filtre déduit de la question (marque citée, selle connue)
+# =========================================================
+def to_where(filters: Optional[Dict]) -> Optional[Dict]:
+    if not filters:
+        return None
+    clauses = [{k: v} for k, v in filters.items()]
+    if len(clauses) == 1 or any(k.startswith("$") for k in filters):
+        return filters
+    return {"$and": clauses}
+
+
+def infer_where(question: str, facets: Dict[str, List[str]]) -> Optional[Dict]:
+    filters: Dict = {}
+    words = set(re.findall(r"\w+", _ascii_upper(question)))
+    brands = [b for b in facets.get("brand", []) if b in words]
+    if len(brands) == 1:
+        filters["brand"] = brands[0]
+
+    known = set(facets.get("saddle", []))
+    saddles = sorted({f"SE{m.group(1)}" for m in SADDLE_RE.finditer(question)} & known)
+    if len(saddles) == 1:
+        filters["saddle"] = saddles[0]
+    elif saddles:
+        filters["saddle"] = {"$in": saddles}
+    return to_where(filters)
+
+
+__all__ = [
+    "METADATA_VERSION", "FACET_FIELDS", "detect_language", "extract_metadata", "facet_values",
+    "load_facets", "to_where", "infer_where",
+]
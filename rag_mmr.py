@@ -0,0 +1,188 @@
+# rag_mmr.py
+# ---------------------------------------------------------
+# MMR vectorisé sur des embeddings de chunks gardés en mémoire
+# ---------------------------------------------------------
+# Chemin LangChain/Chroma d'origine (db.max_marginal_relevance_search) :
+# chaque question relit les fetch_k vecteurs candidats depuis Chroma
+# (include=["embeddings"], conversion en listes Python), puis
+# maximal_marginal_relevance recalcule les similarités candidat par candidat.
+# Ici :
+# - HotEmbeddings : vecteurs normalisés de la collection dans une matrice
+#   float32 en mémoire (préchargée au démarrage, RAG_MMR_PRELOAD ; sinon remplie
+#   au fil des requêtes) ; Chroma ne renvoie plus que ids/documents/métadonnées
+# - mmr_select : similarités question/candidats en un produit matrice-vecteur,
+#   puis une ligne de la matrice candidats x candidats par chunk retenu
+#   (k lignes au lieu de fetch_k x fetch_k) et redondance maximale mise à
+#   jour en place -> reste rapide avec fetch_k = 100-200
+# - VectorMMR : recherche MMR d'un VectorStore (Chroma + HotEmbeddings, ou
+#   NumpyVectorStore dont la matrice mmap sert déjà de cache)
+# - MMRRetriever : retriever LangChain (remplace db.as_retriever(search_type="mmr"))
+# Les documents sont renvoyés dans l'ordre de sélection MMR.
+# Mesures face au chemin d'origine : bench_mmr.py
+# ---------------------------------------------------------
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from rag_config import MMR_PRELOAD
+
+PRELOAD_PAGE = 5000   # vecteurs lus par appel collection.get au préchargement
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+# =========================================================
+# SÉLECTION
+# ---------------------------------------------------------
+# mmr_select(question, candidats, k, lambda_mult) -> indices retenus
+# score(i) = lambda * sim(q, i) - (1 - lambda) * max_{j retenu} sim(i, j)
+# Mêmes choix que langchain maximal_marginal_relevance (premier = plus proche).
+# =========================================================
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int = 4, lambda_mult: float = 0.5,
+               normalized: bool = False) -> List[int]:
+    n = len(candidates)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if not normalized:
+        candidates = _normalize(candidates)
+    relevance = candidates @ _normalize(query)
+    selected = [int(relevance.argmax())]
+    redundancy = candidates @ candidates[selected[0]]
+    relevance = lambda_mult * relevance
+    for _ in range(1, k):
+        scores = relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        j = int(scores.argmax())
+        selected.append(j)
+        np.maximum(redundancy, candidates @ candidates[j], out=redundancy)
+    return selected
+
+
+# =========================================================
+# CACHE CHAUD DES EMBEDDINGS (collection Chroma)
+# ---------------------------------------------------------
+# vectors(ids) -> matrice (len(ids), dim) normalisée ; ids absents lus une
+# fois dans la collection puis gardés. Propre à un LocalIndex (donc à une
+# version d'index : la bascule de snapshot repart d'un cache neuf).
+# =========================================================
+class HotEmbeddings:
+    def __init__(self, collection, preload: bool = MMR_PRELOAD):
+        self.collection = collection
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0}
+        if preload:
+            self.preload()
+
+    def _add(self, ids: Sequence[str], embeddings) -> None:
+        vectors = _normalize(embeddings)
+        if self._matrix is None:
+            self._matrix = np.empty((max(len(ids), 1024), vectors.shape[1]), dtype=np.float32)
+        needed = len(self._rows) + len(ids)
+        if needed > len(self._matrix):
+            grown = np.empty((max(needed, 2 * len(self._matrix)), self._matrix.shape[1]), dtype=np.float32)
+            grown[:len(self._rows)] = self._matrix[:len(self._rows)]
+            self._matrix = grown
+        for i, v in zip(ids, vectors):
+            if i not in self._rows:
+                row = len(self._rows)
+                self._matrix[row] = v
+                self._rows[i] = row
+
+    def preload(self) -> None:
+        total = self.collection.count()
+        for offset in range(0, total, PRELOAD_PAGE):
+            data = self.collection.get(include=["embeddings"], limit=PRELOAD_PAGE, offset=offset)
+            if len(data["ids"]):
+                with self._lock:
+                    self._add(data["ids"], data["embeddings"])
+
+    def vectors(self, ids: Sequence[str]) -> np.ndarray:
+        with self._lock:
+            missing = [i for i in ids if i not in self._rows]
+            self.counters["hits"] += len(ids) - len(missing)
+            self.counters["misses"] += len(missing)
+        if missing:
+            data = self.collection.get(ids=missing, include=["embeddings"])
+            with self._lock:
+                self._add(data["ids"], data["embeddings"])
+        with self._lock:
+            return self._matrix[[self._rows[i] for i in ids]]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._matrix.nbytes if self._matrix is not None else 0
+            return {**self.counters, "vectors": len(self._rows), "mb": round(size / 1e6, 1)}
+
+
+# =========================================================
+# RECHERCHE MMR D'UN VECTORSTORE
+# ---------------------------------------------------------
+# search(question, k, fetch_k, lambda_mult, filter, embedding) -> documents
+# (embedding : vecteur de la question déjà calculé, ex. routage des shards)
+# =========================================================
+class VectorMMR:
+    def __init__(self, db, preload: bool = MMR_PRELOAD):
+        self.db = db
+        # NumpyVectorStore : matrice mmap déjà en mémoire, mmr_select appliqué par le store
+        self.hot = None if hasattr(db._collection, "row_vectors") else HotEmbeddings(db._collection, preload)
+
+    def search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5,
+                         filter: Optional[Dict] = None) -> List[Document]:
+        if self.hot is None:
+            return self.db.max_marginal_relevance_search_by_vector(
+                embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter
+            )
+        res = self.db._collection.query(query_embeddings=[embedding], n_results=fetch_k, where=filter,
+                                        include=["documents", "metadatas"])
+        ids = res["ids"][0]
+        if not ids:
+            return []
+        picked = mmr_select(np.asarray(embedding, dtype=np.float32), self.hot.vectors(ids), k, lambda_mult,
+                            normalized=True)
+        documents, metadatas = res["documents"][0], res["metadatas"][0]
+        return [Document(page_content=documents[i], metadata=metadatas[i] or {}, id=ids[i]) for i in picked]
+
+    def search(self, question: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5,
+               filter: Optional[Dict] = None, embedding: Optional[List[float]] = None) -> List[Document]:
+        if embedding is None:
+            embedding = self.db.embeddings.embed_query(question)
+        return self.search_by_vector(embedding, k, fetch_k, lambda_mult, filter)
+
+    def stats(self) -> Dict:
+        return self.hot.stats() if self.hot is not None else {"backend": "numpy"}
+
+
+# =========================================================
+# RETRIEVER LANGCHAIN
+# ---------------------------------------------------------
+# MMRRetriever(mmr=VectorMMR(db), search_kwargs={"k", "fetch_k", "lambda_mult", "filter"})
+# Même usage que db.as_retriever(search_type="mmr", search_kwargs=...) dans les chaînes LCEL.
+# =========================================================
+class MMRRetriever(BaseRetriever):
+    mmr: Any
+    search_kwargs: Dict = {}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.mmr.search(query, **self.search_kwargs)
+
+
+def mmr_retriever(db, k: int = 5, fetch_k: int = 20, lambda_mult: float = 0.5,
+                  filter: Optional[Dict] = None) -> MMRRetriever:
+    search_kwargs = {"k": k, "fetch_k": fetch_k, "lambda_mult": lambda_mult}
+    if filter:
+        search_kwargs["filter"] = filter
+    return MMRRetriever(mmr=VectorMMR(db), search_kwargs=search_kwargs)
+
+
+__all__ = ["mmr_select", "HotEmbeddings", "VectorMMR", "MMRRetriever", "mmr_retriever"]
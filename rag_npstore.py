@@ -0,0 +1,552 @@
+# rag_npstore.py
+# ---------------------------------------------------------
+# Backend vectoriel NumPy en mémoire mappée (alternative à Chroma)
+# ---------------------------------------------------------
+# Pour notre volume (dizaines de milliers de chunks de 500 caractères),
+# une recherche exacte par produit matriciel suffit :
+# - vecteurs normalisés dans une matrice float32/float16 mappée (np.memmap)
+#   -> démarrage quasi instantané, cache de pages partagé entre processus
+# - table SQLite annexe : id, texte, métadonnées JSON, drapeau "vivant"
+# - top-k cosinus exact : un seul produit matriciel par lot de questions
+#
+# Interfaces :
+# - NumpyClient / NumpyCollection : sous-ensemble de l'API chromadb utilisé
+#   par rag_index (get/upsert/update/delete/count/query), l'indexation
+#   incrémentale fonctionne donc sans modification
+# - NumpyVectorStore : VectorStore LangChain
+# - llama_index_vector_store : vector store LlamaIndex (import paresseux)
+#
+# Activation : RAG_VECTOR_BACKEND=numpy
+# ---------------------------------------------------------
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from rag_config import NPSTORE_DTYPE
+from rag_mmr import mmr_select
+
+# Lignes converties en float32 par bloc lors d'une recherche sur matrice float16
+_BLOCK_ROWS = 16384
+
+
+# =========================================================
+# FILTRES DE MÉTADONNÉES (syntaxe "where" de Chroma)
+# ---------------------------------------------------------
+# {"champ": valeur}, {"champ": {"$eq"|"$ne"|"$in"|"$nin"|"$gt"|"$gte"|"$lt"|"$lte": v}},
+# {"$and": [...]}, {"$or": [...]}
+# =========================================================
+def match_where(meta: Dict, where: Optional[Dict]) -> bool:
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(match_where(meta, w) for w in cond):
+                return False
+        elif key == "$or":
+            if not any(match_where(meta, w) for w in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = meta.get(key)
+            for op, ref in cond.items():
+                ok = {
+                    "$eq": lambda: value == ref,
+                    "$ne": lambda: value != ref,
+                    "$in": lambda: value in ref,
+                    "$nin": lambda: value not in ref,
+                    "$gt": lambda: value is not None and value > ref,
+                    "$gte": lambda: value is not None and value >= ref,
+                    "$lt": lambda: value is not None and value < ref,
+                    "$lte": lambda: value is not None and value <= ref,
+                }.get(op)
+                if ok is None:
+                    raise ValueError(f"Opérateur de filtre non supporté : {op}")
+                if not ok():
+                    return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+def _normalize(vectors) -> np.ndarray:
+    mat = np.asarray(vectors, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat[None, :]
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+# =========================================================
+# COLLECTION
+# ---------------------------------------------------------
+# Fichiers dans <root>/<nom>.npstore/ :
+# - vectors.<dtype>[.<gen>].bin : matrice (lignes x dim), ajout en fin de fichier
+# - meta.sqlite : rows(row, id, document, metadata, alive) + state(dim, rows, version, gen)
+# Les suppressions marquent la ligne morte ; compaction quand > 30 % de lignes mortes :
+# nouvelle génération de matrice écrite (fsync) sous le verrou d'écriture SQLite,
+# puis validée avec les nouveaux numéros de ligne ; l'ancienne n'est jamais
+# modifiée (les lecteurs qui l'ont mappée la gardent), seulement supprimée.
+# Les lecteurs d'autres processus rechargent dès que state.version change.
+# =========================================================
+class NumpyCollection:
+    def __init__(self, path: str, name: str, dtype: str = NPSTORE_DTYPE):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.metadata = {"hnsw:space": "cosine"}
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(path, "meta.sqlite"), timeout=60,
+                                   isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS rows (row INTEGER PRIMARY KEY, id TEXT UNIQUE, "
+                         "document TEXT, metadata TEXT, alive INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (k TEXT PRIMARY KEY, v INTEGER)")
+        self._version = None
+        self._reload()
+
+    def _vec_path(self, gen: int) -> str:
+        suffix = f".{gen}" if gen else ""
+        return os.path.join(self.path, f"vectors.{self.dtype.name}{suffix}.bin")
+
+    def _state(self, key: str, default: int = 0) -> int:
+        row = self._db.execute("SELECT v FROM state WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, key: str, value: int) -> None:
+        self._db.execute("INSERT OR REPLACE INTO state (k, v) VALUES (?, ?)", (key, value))
+
+    # -----------------------------------------------------
+    # Chargement (métadonnées en mémoire, vecteurs en mmap)
+    # -----------------------------------------------------
+    def _reload(self) -> None:
+        # état et lignes lus dans une même transaction : une seule version
+        self._db.execute("BEGIN")
+        try:
+            self._version = self._state("version")
+            self.dim = self._state("dim")
+            n_rows = self._state("rows")
+            gen = self._state("gen")
+            self._ids: List[Optional[str]] = [None] * n_rows
+            self._docs: List[Optional[str]] = [None] * n_rows
+            self._metas: List[Optional[Dict]] = [None] * n_rows
+            self._alive = np.zeros(n_rows, dtype=bool)
+            for row, cid, doc, meta, alive in self._db.execute("SELECT row, id, document, metadata, alive FROM rows"):
+                if row < n_rows:
+                    self._ids[row], self._docs[row] = cid, doc
+                    self._metas[row] = json.loads(meta) if meta else {}
+                    self._alive[row] = bool(alive)
+        finally:
+            self._db.execute("COMMIT")
+        self._row_of = {cid: i for i, cid in enumerate(self._ids) if cid is not None and self._alive[i]}
+        if n_rows and self.dim:
+            try:
+                self._matrix = np.memmap(self._vec_path(gen), dtype=self.dtype, mode="r", shape=(n_rows, self.dim))
+            except FileNotFoundError:
+                # génération supprimée par une compaction validée entre-temps : relecture
+                self._reload()
+        else:
+            self._matrix = np.zeros((0, self.dim or 0), dtype=self.dtype)
+
+    def close(self) -> None:
+        """Ferme la base SQLite et libère la matrice mmap."""
+        with self._lock:
+            self._matrix = np.zeros((0, self.dim or 0), dtype=self.dtype)
+            self._db.close()
+
+    def _refresh(self) -> None:
+        if self._state("version") != self._version:
+            self._reload()
+
+    def _bump(self) -> None:
+        self._set_state("version", self._state("version") + 1)
+
+    # =====================================================
+    # API type chromadb
+    # =====================================================
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict] = None,
+            include: Iterable[str] = ("documents", "metadatas"), limit: Optional[int] = None) -> Dict:
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+            else:
+                rows = [r for r in self._row_of.values()]
+            if where:
+                rows = [r for r in rows if match_where(self._metas[r], where)]
+            if limit is not None:
+                rows = rows[:limit]
+            out = {"ids": [self._ids[r] for r in rows]}
+            include = set(include or ())
+            out["documents"] = [self._docs[r] for r in rows] if "documents" in include else None
+            out["metadatas"] = [self._metas[r] for r in rows] if "metadatas" in include else None
+            out["embeddings"] = (np.asarray(self._matrix[rows], dtype=np.float32)
+                                 if "embeddings" in include else None)
+            return out
+
+    def upsert(self, ids: Sequence[str], embeddings, documents: Optional[Sequence[str]] = None,
+               metadatas: Optional[Sequence[Dict]] = None) -> None:
+        if not ids:
+            return
+        vectors = _normalize(embeddings).astype(self.dtype)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                dim = self._state("dim") or vectors.shape[1]
+                if vectors.shape[1] != dim:
+                    raise ValueError(f"Dimension {vectors.shape[1]} ≠ {dim} pour la collection {self.name}")
+                rows = self._state("rows")
+                # un upsert remplace : l'ancienne ligne est marquée morte
+                for part in range(0, len(ids), 500):
+                    chunk = list(ids[part:part + 500])
+                    self._db.execute(f"UPDATE rows SET alive = 0, id = NULL WHERE id IN ({','.join('?' * len(chunk))})",
+                                     chunk)
+                with open(self._vec_path(self._state("gen")), "ab+") as f:
+                    f.truncate(rows * dim * self.dtype.itemsize)
+                    f.seek(0, os.SEEK_END)
+                    f.write(vectors.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._db.executemany(
+                    "INSERT INTO rows (row, id, document, metadata, alive) VALUES (?, ?, ?, ?, 1)",
+                    [(rows + i, cid, doc, json.dumps(meta or {}, ensure_ascii=False))
+                     for i, (cid, doc, meta) in enumerate(zip(ids, documents, metadatas))],
+                )
+                self._set_state("dim", dim)
+                self._set_state("rows", rows + len(ids))
+                self._bump()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._reload()
+
+    add = upsert
+
+    def update(self, ids: Sequence[str], metadatas: Optional[Sequence[Dict]] = None,
+               documents: Optional[Sequence[str]] = None, embeddings=None) -> None:
+        if embeddings is not None:
+            with self._lock:
+                self._refresh()
+                current = self.get(ids=ids, include=["documents", "metadatas"])
+            docs = documents or current["documents"]
+            metas = metadatas or current["metadatas"]
+            return self.upsert(ids, embeddings, docs, metas)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            for i, cid in enumerate(ids):
+                if metadatas is not None:
+                    self._db.execute("UPDATE rows SET metadata = ? WHERE id = ?",
+                                     (json.dumps(metadatas[i] or {}, ensure_ascii=False), cid))
+                if documents is not None:
+                    self._db.execute("UPDATE rows SET document = ? WHERE id = ?", (documents[i], cid))
+            self._bump()
+            self._db.execute("COMMIT")
+            self._reload()
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict] = None) -> None:
+        if ids is None and not where:
+            return
+        with self._lock:
+            if ids is None:
+                ids = self.get(where=where, include=[])["ids"]
+            if not ids:
+                return
+            self._db.execute("BEGIN IMMEDIATE")
+            for part in range(0, len(ids), 500):
+                chunk = list(ids[part:part + 500])
+                self._db.execute(f"UPDATE rows SET alive = 0, id = NULL WHERE id IN ({','.join('?' * len(chunk))})",
+                                 chunk)
+            self._bump()
+            self._db.execute("COMMIT")
+            self._reload()
+            if len(self._alive) and (~self._alive).mean() > 0.3:
+                self.compact()
+
+    # -----------------------------------------------------
+    # Compaction : réécrit la matrice sans les lignes mortes
+    # -----------------------------------------------------
+    def compact(self) -> None:
+        with self._lock:
+            self._refresh()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self._state("version") != self._version:
+                    # écriture d'un autre processus entre-temps : compaction à la prochaine suppression
+                    self._db.execute("ROLLBACK")
+                    return
+                gen = self._state("gen") + 1
+                keep = np.flatnonzero(self._alive)
+                with open(self._vec_path(gen), "wb") as f:
+                    f.write(np.asarray(self._matrix[keep], dtype=self.dtype).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._db.execute("DELETE FROM rows WHERE alive = 0")
+                self._db.executemany("UPDATE rows SET row = ? WHERE id = ?",
+                                     [(-(new + 1), self._ids[old]) for new, old in enumerate(keep)])
+                self._db.execute("UPDATE rows SET row = -row - 1")
+                self._set_state("rows", len(keep))
+                self._set_state("gen", gen)
+                self._bump()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._reload()
+            # générations précédentes : les lecteurs qui les ont mappées les
+            # conservent jusqu'à leur rechargement
+            for old in range(gen):
+                if os.path.exists(self._vec_path(old)):
+                    os.remove(self._vec_path(old))
+
+    # =====================================================
+    # RECHERCHE EXACTE
+    # -----------------------------------------------------
+    # search_vectors(Q, k, where) : Q (n x dim) -> n listes [(ligne, similarité)]
+    # Un seul produit matriciel (par bloc si float16) pour toutes les questions.
+    # =====================================================
+    def search_vectors(self, queries, k: int = 5, where: Optional[Dict] = None) -> List[List[Tuple[int, float]]]:
+        with self._lock:
+            self._refresh()
+            q = _normalize(queries)
+            mask = self._alive.copy()
+            if where:
+                mask &= np.array([m is not None and match_where(m, where) for m in self._metas], dtype=bool)
+            if not mask.any():
+                return [[] for _ in range(len(q))]
+            if self.dtype == np.float32:
+                sims = np.asarray(self._matrix) @ q.T
+            else:
+                sims = np.empty((len(self._matrix), len(q)), dtype=np.float32)
+                for start in range(0, len(self._matrix), _BLOCK_ROWS):
+                    block = np.asarray(self._matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+                    sims[start:start + len(block)] = block @ q.T
+            sims[~mask] = -np.inf
+            k = min(k, int(mask.sum()))
+            top = np.argpartition(-sims, k - 1, axis=0)[:k]
+            results = []
+            for j in range(len(q)):
+                rows = top[:, j][np.argsort(-sims[top[:, j], j])]
+                results.append([(int(r), float(sims[r, j])) for r in rows])
+            return results
+
+    def row_vectors(self, rows: Sequence[int]) -> np.ndarray:
+        return np.asarray(self._matrix[list(rows)], dtype=np.float32)
+
+    def row_document(self, row: int) -> Document:
+        return Document(page_content=self._docs[row] or "", metadata=dict(self._metas[row] or {}), id=self._ids[row])
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None,
+              include: Iterable[str] = ("documents", "metadatas", "distances")) -> Dict:
+        # même verrou que la recherche : lignes lues sur la version qui les a produites
+        with self._lock:
+            hits = self.search_vectors(query_embeddings, n_results, where)
+            include = set(include)
+            return {
+                "ids": [[self._ids[r] for r, _ in h] for h in hits],
+                "distances": [[1.0 - s for _, s in h] for h in hits] if "distances" in include else None,
+                "documents": [[self._docs[r] for r, _ in h] for h in hits] if "documents" in include else None,
+                "metadatas": [[self._metas[r] for r, _ in h] for h in hits] if "metadatas" in include else None,
+                "embeddings": [self.row_vectors([r for r, _ in h]) for h in hits] if "embeddings" in include else None,
+            }
+
+
+# =========================================================
+# CLIENT (équivalent chromadb.PersistentClient)
+# =========================================================
+class NumpyClient:
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._collections: Dict[str, NumpyCollection] = {}
+
+    def _dir(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.npstore")
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> NumpyCollection:
+        if name not in self._collections:
+            self._collections[name] = NumpyCollection(self._dir(name), name)
+        return self._collections[name]
+
+    get_collection = get_or_create_collection
+
+    def delete_collection(self, name: str) -> None:
+        collection = self._collections.pop(name, None)
+        if collection is not None:
+            collection.close()
+        shutil.rmtree(self._dir(name), ignore_errors=True)
+
+    def close(self) -> None:
+        for collection in self._collections.values():
+            collection.close()
+        self._collections.clear()
+
+
+# =========================================================
+# VECTORSTORE LANGCHAIN
+# ---------------------------------------------------------
+# Même usage que langchain_community Chroma (as_retriever, MMR, filtres)
+# =========================================================
+class NumpyVectorStore(VectorStore):
+    def __init__(self, collection: NumpyCollection, embedding_function: Embeddings):
+        self._collection = collection
+        self._embedding = embedding_function
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        from rag_index import chunk_id
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [chunk_id(m.get("source", ""), t) for t, m in zip(texts, metadatas)]
+        self._collection.upsert(ids, self._embedding.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        self._collection.delete(ids=ids, where=kwargs.get("filter"))
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[Dict]] = None,
+                   persist_directory: str = ".", collection_name: str = "langchain", **kwargs: Any):
+        store = cls(NumpyClient(persist_directory).get_or_create_collection(collection_name), embedding)
+        store.add_texts(texts, metadatas, ids=kwargs.get("ids"))
+        return store
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        with self._collection._lock:
+            hits = self._collection.search_vectors([embedding], k, filter)[0]
+            return [(self._collection.row_document(r), s) for r, s in hits]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None, **kwargs: Any) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [d for d, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda similarity: similarity
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, filter: Optional[Dict] = None,
+                                                **kwargs: Any) -> List[Document]:
+        with self._collection._lock:
+            hits = self._collection.search_vectors([embedding], fetch_k, filter)[0]
+            if not hits:
+                return []
+            rows = [r for r, _ in hits]
+            picked = mmr_select(np.asarray(embedding, dtype=np.float32), self._collection.row_vectors(rows),
+                                k=k, lambda_mult=lambda_mult)
+            return [self._collection.row_document(rows[i]) for i in picked]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5,
+                                      filter: Optional[Dict] = None, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
+
+    def batch_similarity_search(self, queries: List[str], k: int = 4,
+                                filter: Optional[Dict] = None) -> List[List[Document]]:
+        """Plusieurs questions, un seul appel d'embedding et un seul produit matriciel."""
+        vectors = self._embedding.embed_documents(queries)
+        with self._collection._lock:
+            hits = self._collection.search_vectors(vectors, k, filter)
+            return [[self._collection.row_document(r) for r, _ in h] for h in hits]
+
+
+# =========================================================
+# VECTOR STORE LLAMAINDEX (import paresseux)
+# ---------------------------------------------------------
+# stores_text=True : les nœuds sont reconstruits depuis la table annexe
+# Filtres MetadataFilters traduits en "where" (opérateurs de match_where,
+# conditions and/or, filtres imbriqués) ; le reste est refusé (ValueError).
+# =========================================================
+LLAMA_OPERATORS = {"==": "$eq", "!=": "$ne", ">": "$gt", ">=": "$gte", "<": "$lt", "<=": "$lte",
+                   "in": "$in", "nin": "$nin"}
+
+
+def _llama_where(filters) -> Dict:
+    clauses = []
+    for f in filters.filters:
+        if hasattr(f, "filters"):   # MetadataFilters imbriqué
+            clauses.append(_llama_where(f))
+            continue
+        op = LLAMA_OPERATORS.get(getattr(f.operator, "value", f.operator))
+        if op is None:
+            raise ValueError(f"Opérateur de filtre LlamaIndex non supporté : {f.operator}")
+        clauses.append({f.key: {op: f.value}})
+    condition = getattr(filters.condition, "value", filters.condition) or "and"
+    if condition not in ("and", "or"):
+        raise ValueError(f"Condition de filtre LlamaIndex non supportée : {filters.condition}")
+    return {f"${condition}": clauses}
+
+
+def llama_index_vector_store(collection: NumpyCollection):
+    from llama_index.core.schema import TextNode
+    from llama_index.core.vector_stores.types import (
+        BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult,
+    )
+    from pydantic import PrivateAttr
+
+    class NumpyLlamaVectorStore(BasePydanticVectorStore):
+        stores_text: bool = True
+        _collection: Any = PrivateAttr()
+
+        def __init__(self, collection: NumpyCollection):
+            super().__init__()
+            self._collection = collection
+
+        @property
+        def client(self):
+            return self._collection
+
+        def add(self, nodes, **kwargs) -> List[str]:
+            # ref_doc_id stocké dans les métadonnées : delete(ref_doc_id) filtre dessus
+            self._collection.upsert(
+                [n.node_id for n in nodes],
+                [n.get_embedding() for n in nodes],
+                [n.get_content() for n in nodes],
+                [{**n.metadata, "ref_doc_id": n.ref_doc_id} if n.ref_doc_id else dict(n.metadata) for n in nodes],
+            )
+            return [n.node_id for n in nodes]
+
+        def delete(self, ref_doc_id: str, **kwargs) -> None:
+            self._collection.delete(where={"ref_doc_id": ref_doc_id})
+
+        def query(self, query: VectorStoreQuery, **kwargs) -> VectorStoreQueryResult:
+            where = _llama_where(query.filters) if query.filters is not None else None
+            res = self._collection.query([query.query_embedding], query.similarity_top_k, where)
+            nodes = [TextNode(id_=cid, text=doc or "", metadata=dict(meta or {}))
+                     for cid, doc, meta in zip(res["ids"][0], res["documents"][0], res["metadatas"][0])]
+            return VectorStoreQueryResult(nodes=nodes, similarities=[1.0 - d for d in res["distances"][0]],
+                                          ids=[n.node_id for n in nodes])
+
+    return NumpyLlamaVectorStore(collection)
+
+
+__all__ = [
+    "match_where", "NumpyCollection", "NumpyClient", "NumpyVectorStore", "llama_index_vector_store",
+]
@@ -0,0 +1,108 @@
+# rag_prompts.py
+# ---------------------------------------------------------
+# Assemblage des prompts RAG + maintien en mémoire des modèles Ollama
+# ---------------------------------------------------------
+# Cache de prompt d'Ollama : les tokens déjà évalués sont réutilisés pour le
+# plus long préfixe commun avec la requête précédente. rag_prompt() fixe donc
+# la disposition :
+#   [consignes statiques][en-tête du contexte]  <- préfixe identique octet par octet
+#   {context} / question / en-tête de réponse    <- partie variable, toujours en fin
+# - consignes sans espaces de tête/fin variables, aucun contenu dynamique
+#   (date, nom d'utilisateur...) dans le préfixe
+# - PromptTemplate texte (pas de rendu "Human: ..." de ChatPromptTemplate)
+# keep_alive : LLM_KEEP_ALIVE (ex. "30m", -1 = toujours chargé) évite le
+# déchargement du modèle entre deux questions espacées.
+# warm_up(llm, prompt) : charge le modèle et évalue le préfixe statique au
+# démarrage (num_predict=1), avec les mêmes options que les requêtes
+# (un num_ctx différent forcerait Ollama à recharger le modèle).
+# Mesures à froid / à chaud : bench_llm_warm.py
+# ---------------------------------------------------------
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from langchain_core.prompts import PromptTemplate
+
+from rag_config import OLLAMA_BASE
+
+CONTEXT_SLOT = "{context}"
+
+
+# =========================================================
+# DISPOSITION
+# ---------------------------------------------------------
+# rag_prompt(consignes, en-têtes) -> PromptTemplate (variables context, question)
+# static_prefix(prompt) -> partie fixe (réutilisable par le cache d'Ollama)
+# =========================================================
+def rag_prompt(instructions: str, context_header: str = "=== CONTEXTE ===",
+               question_header: str = "=== QUESTION ===", answer_header: str = "=== RÉPONSE ===") -> PromptTemplate:
+    template = (
+        f"{instructions.strip()}\n\n{context_header}\n{CONTEXT_SLOT}\n\n"
+        f"{question_header}\n{{question}}\n\n{answer_header}\n"
+    )
+    return PromptTemplate.from_template(template)
+
+
+def static_prefix(prompt: PromptTemplate) -> str:
+    return prompt.template.split(CONTEXT_SLOT, 1)[0]
+
+
+# =========================================================
+# OLLAMA : CHARGEMENT / PRÉCHAUFFAGE
+# ---------------------------------------------------------
+# generate(llm, prompt, ...) -> statistiques Ollama en ms
+#   (load_ms, prompt_tokens, prompt_eval_ms, eval_ms, total_ms)
+# warm_up(llm, prompt, background) : préfixe statique évalué au démarrage
+# unload(llm) : décharge le modèle (mesures à froid)
+# =========================================================
+def _url(llm) -> str:
+    return f"{(llm.base_url or OLLAMA_BASE).rstrip('/')}/api/generate"
+
+
+def _options(llm) -> Dict:
+    options = {"num_ctx": llm.num_ctx, "temperature": llm.temperature}
+    return {k: v for k, v in options.items() if v is not None}
+
+
+def generate(llm, text: str, num_predict: Optional[int] = None, keep_alive=None) -> Dict:
+    options = _options(llm)
+    if num_predict is not None:
+        options["num_predict"] = num_predict
+    body = {"model": llm.model, "prompt": text, "stream": False, "options": options,
+            "keep_alive": llm.keep_alive if keep_alive is None else keep_alive}
+    t0 = time.time()
+    r = requests.post(_url(llm), json=body, timeout=600)
+    r.raise_for_status()
+    data = r.json()
+    ns = 1e6
+    return {
+        "load_ms": round(data.get("load_duration", 0) / ns, 1),
+        "prompt_tokens": data.get("prompt_eval_count", 0),
+        "prompt_eval_ms": round(data.get("prompt_eval_duration", 0) / ns, 1),
+        "eval_ms": round(data.get("eval_duration", 0) / ns, 1),
+        "total_ms": round(data.get("total_duration", (time.time() - t0) * 1e9) / ns, 1),
+    }
+
+
+def warm_up(llm, prompt: Optional[PromptTemplate] = None, background: bool = False) -> None:
+    def run():
+        try:
+            stats = generate(llm, static_prefix(prompt) if prompt is not None else "", num_predict=1)
+            print(f"🔥 Modèle {llm.model} préchauffé (chargement {stats['load_ms']:.0f} ms, "
+                  f"préfixe {stats['prompt_tokens']} tokens, keep_alive={llm.keep_alive})")
+        except Exception as e:
+            print(f"⚠️ Préchauffage de {llm.model} impossible : {e}")
+
+    if background:
+        threading.Thread(target=run, daemon=True).start()
+    else:
+        run()
+
+
+def unload(llm) -> None:
+    r = requests.post(_url(llm), json={"model": llm.model, "keep_alive": 0}, timeout=60)
+    r.raise_for_status()
+
+
+__all__ = ["rag_prompt", "static_prefix", "generate", "warm_up", "unload"]
@@ -0,0 +1,205 @@
+# rag_rerank.py
+# ---------------------------------------------------------
+# Reranking CPU entre retrieval et prompt
+# ---------------------------------------------------------
+# Le retriever renvoie un lot élargi de candidats (RAG_RERANK_CANDIDATES,
+# MMR) ; le reranker les rescore par lots et ne garde que les RAG_RERANK_TOP_N
+# meilleurs au-dessus du seuil RAG_RERANK_THRESHOLD (au moins RAG_RERANK_MIN_KEEP).
+# Moins de chunks, plus pertinents -> prompt plus court, génération plus rapide.
+# Deux rerankers (RAG_RERANK) :
+# - embedding     : cosinus question / chunk avec RAG_RERANK_MODEL (Ollama,
+#                   EMBED_MODEL par défaut) ; les chunks indexés sont déjà dans
+#                   le cache disque d'embeddings -> seule la question est calculée
+# - cross-encoder : petit cross-encoder sentence-transformers sur CPU
+#                   (RAG_RERANK_MODEL, import paresseux), scores sigmoïde 0..1
+# - none          : désactivé (les candidats sont passés tels quels)
+# Latence : rerank() renvoie ses statistiques (rerank_ms, candidats, retenus),
+# stats() les cumule (appels, moyenne, dernier appel).
+# Branchements : RerankRetriever (LangChain) et llama_index_postprocessor (LlamaIndex).
+# ---------------------------------------------------------
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from rag_config import (
+    EMBED_MODEL, OLLAMA_BASE, RERANK, RERANK_BATCH_SIZE, RERANK_CANDIDATES, RERANK_MIN_KEEP, RERANK_MODEL,
+    RERANK_THRESHOLD, RERANK_TOP_N,
+)
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"   # multilingue, ~120 Mo
+
+
+# =========================================================
+# RERANKERS
+# ---------------------------------------------------------
+# score(question, textes, embedding) -> un score par texte (plus grand = plus pertinent)
+# rerank(question, docs, embedding) -> (docs retenus, stats) ; docs copiés avec
+#   metadata["rerank_score"] (les documents du cache de résultats ne sont pas modifiés)
+# embedding : vecteur EMBED_MODEL de la question déjà calculé (cache de réponses),
+#   repris par EmbeddingReranker quand il utilise le même modèle
+# =========================================================
+class Reranker(ABC):
+    name = "reranker"
+    default_threshold = 0.0
+
+    def __init__(self, top_n: int = RERANK_TOP_N, threshold: Optional[float] = RERANK_THRESHOLD,
+                 min_keep: int = RERANK_MIN_KEEP):
+        self.top_n = top_n
+        self.threshold = self.default_threshold if threshold is None else threshold
+        self.min_keep = min_keep
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "candidates": 0, "kept": 0, "total_ms": 0.0, "last_ms": 0.0}
+
+    @abstractmethod
+    def score(self, question: str, texts: List[str], embedding: Optional[List[float]] = None) -> List[float]:
+        ...
+
+    def rerank(self, question: str, docs: Sequence[Document],
+               embedding: Optional[List[float]] = None) -> Tuple[List[Document], Dict]:
+        t0 = time.perf_counter()
+        scores = self.score(question, [d.page_content for d in docs], embedding) if docs else []
+        order = sorted(range(len(docs)), key=lambda i: -scores[i])
+        keep = [i for i in order[:self.top_n] if scores[i] >= self.threshold]
+        if len(keep) < self.min_keep:
+            keep = order[:min(self.min_keep, self.top_n)]
+        kept = [Document(page_content=docs[i].page_content,
+                         metadata={**(docs[i].metadata or {}), "rerank_score": round(float(scores[i]), 4)},
+                         id=docs[i].id)
+                for i in keep]
+        ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["candidates"] += len(docs)
+            self.counters["kept"] += len(kept)
+            self.counters["total_ms"] += ms
+            self.counters["last_ms"] = ms
+        stats = {"rerank_ms": round(ms, 1), "candidates": len(docs), "kept": len(kept),
+                 "scores": [round(float(scores[i]), 4) for i in keep]}
+        return kept, stats
+
+    def stats(self) -> Dict:
+        with self._lock:
+            calls = self.counters["calls"]
+            return {"reranker": self.name, "calls": calls, "candidates": self.counters["candidates"],
+                    "kept": self.counters["kept"], "last_ms": round(self.counters["last_ms"], 1),
+                    "mean_ms": round(self.counters["total_ms"] / calls, 1) if calls else 0.0}
+
+
+class EmbeddingReranker(Reranker):
+    name = "embedding"
+    default_threshold = 0.5
+
+    def __init__(self, model: str = "", base_url: str = OLLAMA_BASE, **kwargs):
+        from rag_embeddings import OllamaBatchEmbedder
+        super().__init__(**kwargs)
+        self.model = model or EMBED_MODEL
+        self.embedder = OllamaBatchEmbedder(self.model, base_url, verbose=False)
+
+    def score(self, question: str, texts: List[str], embedding: Optional[List[float]] = None) -> List[float]:
+        if embedding is None or self.model != EMBED_MODEL:
+            embedding = self.embedder.embed([question], use_cache=False)[0]
+        q = np.asarray(embedding, dtype=np.float32)
+        m = np.asarray(self.embedder.embed(texts), dtype=np.float32)
+        sims = m @ q / (np.linalg.norm(m, axis=1) * np.linalg.norm(q) + 1e-12)
+        return sims.tolist()
+
+
+class CrossEncoderReranker(Reranker):
+    name = "cross-encoder"
+    default_threshold = 0.1
+
+    def __init__(self, model: str = "", batch_size: int = RERANK_BATCH_SIZE, **kwargs):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError("RAG_RERANK=cross-encoder nécessite sentence-transformers "
+                              "(pip install sentence-transformers)") from e
+        super().__init__(**kwargs)
+        self.model = model or DEFAULT_CROSS_ENCODER
+        self.batch_size = batch_size
+        self.encoder = CrossEncoder(self.model, device="cpu", max_length=512)
+
+    def score(self, question: str, texts: List[str], embedding: Optional[List[float]] = None) -> List[float]:
+        logits = np.asarray(self.encoder.predict([(question, t) for t in texts], batch_size=self.batch_size,
+                                                 show_progress_bar=False), dtype=np.float32)
+        return (1 / (1 + np.exp(-logits))).tolist()
+
+
+def get_reranker(kind: str = RERANK, model: str = RERANK_MODEL, **kwargs) -> Optional[Reranker]:
+    """Reranker configuré (RAG_RERANK), ou None si désactivé."""
+    if kind in ("", "0", "none"):
+        return None
+    if kind == "embedding":
+        return EmbeddingReranker(model, **kwargs)
+    if kind == "cross-encoder":
+        return CrossEncoderReranker(model, **kwargs)
+    raise ValueError(f"RAG_RERANK inconnu : {kind} (embedding | cross-encoder | none)")
+
+
+def candidate_pool(k: int, fetch_k: int, reranker: Optional[Reranker]) -> Tuple[int, int]:
+    """(k, fetch_k) du retriever : lot élargi à RAG_RERANK_CANDIDATES si un reranker est actif."""
+    if reranker is None:
+        return k, fetch_k
+    pool = max(k, RERANK_CANDIDATES)
+    return pool, max(fetch_k, 2 * pool)
+
+
+# =========================================================
+# LANGCHAIN
+# ---------------------------------------------------------
+# RerankRetriever(base, reranker) : retriever -> candidats -> rerank
+# Même usage que le retriever de base dans les chaînes LCEL.
+# =========================================================
+class RerankRetriever(BaseRetriever):
+    base: Any
+    reranker: Any
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self.base.invoke(query)
+        return self.reranker.rerank(query, docs)[0]
+
+
+# =========================================================
+# LLAMAINDEX (import paresseux)
+# ---------------------------------------------------------
+# llama_index_postprocessor(reranker) : node postprocessor pour
+# index.as_query_engine(similarity_top_k=RERANK_CANDIDATES, node_postprocessors=[...])
+# =========================================================
+def llama_index_postprocessor(reranker: Optional[Reranker] = None):
+    from llama_index.core.postprocessor.types import BaseNodePostprocessor
+    from llama_index.core.schema import NodeWithScore
+    from pydantic import PrivateAttr
+
+    class RerankPostprocessor(BaseNodePostprocessor):
+        _reranker: Any = PrivateAttr()
+
+        def __init__(self, reranker: Reranker):
+            super().__init__()
+            self._reranker = reranker
+
+        @classmethod
+        def class_name(cls) -> str:
+            return "RerankPostprocessor"
+
+        def _postprocess_nodes(self, nodes, query_bundle=None):
+            if query_bundle is None or not nodes:
+                return nodes
+            docs = [Document(page_content=n.node.get_content(), metadata={"_i": i}) for i, n in enumerate(nodes)]
+            kept, stats = self._reranker.rerank(query_bundle.query_str, docs)
+            print(f"🎯 Rerank {self._reranker.name} : {stats['kept']}/{stats['candidates']} nœuds "
+                  f"en {stats['rerank_ms']:.0f} ms")
+            return [NodeWithScore(node=nodes[d.metadata["_i"]].node, score=d.metadata["rerank_score"]) for d in kept]
+
+    return RerankPostprocessor(reranker or get_reranker() or EmbeddingReranker())
+
+
+__all__ = [
+    "Reranker", "EmbeddingReranker", "CrossEncoderReranker", "get_reranker", "candidate_pool",
+    "RerankRetriever", "llama_index_postprocessor",
+]
@@ -0,0 +1,215 @@
+# rag_router.py
+# ---------------------------------------------------------
+# Routage du modèle de génération selon la question et la latence
+# ---------------------------------------------------------
+# Roster RAG_ROUTER_MODELS, du plus rapide au plus lourd
+# (ex. llama3:latest, gpt-oss:latest, gpt-oss:120b).
+# 1) complexité de la question (0..1), moyenne pondérée de :
+#    - longueur      : nombre de termes (rag_lexical.tokenize)
+#    - entités       : références de selle, codes matière, nombres, noms propres
+#    - raisonnement  : marqueurs de comparaison / explication / procédure
+#    - dispersion    : scores de rerank proches (information répartie sur
+#                      plusieurs chunks) ou sources nombreuses -> synthèse
+# 2) palier visé : seuils RAG_ROUTER_THRESHOLDS (un par palier au-dessus du premier)
+# 3) contrainte de latence : tant que le modèle visé est saturé
+#    (>= RAG_ROUTER_MAX_INFLIGHT générations en cours ou en file : l'appelant
+#    route avant d'attendre sa place de génération) ou que sa latence
+#    prévue (moyenne mobile x (1 + générations en cours)) dépasse
+#    RAG_ROUTER_SLO_MS, repli sur le palier inférieur ; une latence vieille de
+#    plus de STALE_AFTER_S est ignorée (modèle lent de nouveau essayé)
+# 4) fallback(décision) : palier inférieur après une erreur de génération
+# Journal : une ligne JSON par requête dans RAG_ROUTER_LOG (traits, score,
+# modèle visé / choisi, raison, latences observées, erreur) pour régler
+# seuils et poids ; print résumé à chaque requête.
+# ---------------------------------------------------------
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+from rag_config import (
+    ROUTER_LOG, ROUTER_MAX_INFLIGHT, ROUTER_MODELS, ROUTER_SLO_MS, ROUTER_THRESHOLDS,
+)
+from rag_lexical import NOT_CODES, SADDLE_RE, UPPER_CODE_RE, tokenize
+
+WEIGHTS = {"length": 0.3, "entities": 0.2, "reasoning": 0.25, "spread": 0.25}
+LENGTH_REF = 20        # termes pour une question "longue"
+ENTITIES_REF = 3       # entités distinctes pour une question "chargée"
+SPREAD_REF = 0.15      # écart de score de rerank en dessous duquel l'information est répartie
+EWMA_ALPHA = 0.3       # poids de la dernière mesure dans la latence moyenne
+STALE_AFTER_S = 300    # latence non remesurée depuis : ignorée (le modèle est de nouveau essayé)
+
+REASONING_RE = re.compile(
+    r"\b(pourquoi|comment|compar\w*|différence\w*|expliqu\w*|avantages?|inconvénients?|choisir|"
+    r"recommand\w*|étapes?|procédure|quand|why|how|compare\w*|difference\w*|explain\w*)\b",
+    re.IGNORECASE,
+)
+NUMBER_RE = re.compile(r"\b\d+(?:[.,]\d+)?\b")
+PROPER_RE = re.compile(r"(?<=\w )([A-ZÀ-Ý][a-zà-ÿ]{2,})")
+
+
+# =========================================================
+# COMPLEXITÉ
+# ---------------------------------------------------------
+# features(question, docs) -> traits normalisés 0..1
+# complexity(traits) -> score 0..1 (WEIGHTS)
+# =========================================================
+def features(question: str, docs: Sequence = ()) -> Dict[str, float]:
+    entities = {f"SE{m.group(1)}" for m in SADDLE_RE.finditer(question)}
+    entities |= {c for c in UPPER_CODE_RE.findall(question) if c not in NOT_CODES}
+    entities |= set(NUMBER_RE.findall(question)) | set(PROPER_RE.findall(question))
+    scores = [d.metadata["rerank_score"] for d in docs if "rerank_score" in (d.metadata or {})]
+    if len(scores) >= 2:
+        gap = scores[0] - sum(scores[1:]) / (len(scores) - 1)
+        spread = 1 - min(1.0, max(0.0, gap) / SPREAD_REF)
+    elif docs:
+        sources = {(d.metadata or {}).get("source") for d in docs}
+        spread = (len(sources) - 1) / max(1, len(docs) - 1)
+    else:
+        spread = 0.0
+    return {
+        "length": min(1.0, len(tokenize(question)) / LENGTH_REF),
+        "entities": min(1.0, len(entities) / ENTITIES_REF),
+        "reasoning": min(1.0, len(REASONING_RE.findall(question)) / 2),
+        "spread": round(spread, 3),
+    }
+
+
+def complexity(traits: Dict[str, float]) -> float:
+    return round(sum(WEIGHTS[k] * traits[k] for k in WEIGHTS), 3)
+
+
+# =========================================================
+# ROUTEUR
+# ---------------------------------------------------------
+# route(question, docs) -> décision {"model", "wanted", "score", "reason", ...}
+#   (la génération est comptée en cours jusqu'à record)
+# record(décision, total_ms, ttft_ms, error) : latence observée + journal
+# cancel(décision) : génération abandonnée avant de commencer (file pleine, client parti)
+# fallback(décision) -> décision sur le palier inférieur, ou None
+# =========================================================
+class ModelRouter:
+    def __init__(self, models: Sequence[str], slo_ms: float = ROUTER_SLO_MS,
+                 thresholds: Optional[Sequence[float]] = None, max_inflight: int = ROUTER_MAX_INFLIGHT,
+                 log_path: str = ROUTER_LOG):
+        if not models:
+            raise ValueError("RAG_ROUTER_MODELS vide")
+        self.models = list(models)
+        self.slo_ms = slo_ms
+        n = len(self.models)
+        thresholds = list(ROUTER_THRESHOLDS if thresholds is None else thresholds)
+        if len(thresholds) != n - 1:
+            thresholds = [round(i / n, 3) for i in range(1, n)]   # paliers répartis régulièrement
+        self.thresholds = thresholds
+        self.max_inflight = max_inflight
+        self.log_path = log_path
+        self.latency: Dict[str, Optional[float]] = {m: None for m in self.models}
+        self.inflight: Dict[str, int] = {m: 0 for m in self.models}
+        self.measured: Dict[str, float] = {m: 0.0 for m in self.models}
+        self._lock = threading.Lock()
+        self.counters = {m: {"routed": 0, "errors": 0, "slo_missed": 0} for m in self.models}
+
+    @property
+    def name(self) -> str:
+        """Identifiant du roster (espaces de noms des caches de réponses)."""
+        return "router:" + ",".join(self.models)
+
+    @property
+    def largest(self) -> str:
+        return self.models[-1]
+
+    def _tier(self, score: float) -> int:
+        return sum(score >= t for t in self.thresholds)
+
+    def _predicted_ms(self, model: str) -> Optional[float]:
+        ewma = self.latency[model]
+        if ewma is None or time.time() - self.measured[model] > STALE_AFTER_S:
+            return None
+        return ewma * (1 + self.inflight[model])
+
+    def route(self, question: str, docs: Sequence = ()) -> Dict:
+        traits = features(question, docs)
+        score = complexity(traits)
+        wanted = self._tier(score)
+        with self._lock:
+            tier, reason = wanted, "complexité"
+            while tier > 0:
+                model = self.models[tier]
+                predicted = self._predicted_ms(model)
+                if self.inflight[model] >= self.max_inflight:
+                    reason = f"{model} saturé ({self.inflight[model]} en cours)"
+                elif predicted is not None and predicted > self.slo_ms:
+                    reason = f"{model} trop lent (prévu {predicted:.0f} ms > SLO {self.slo_ms:.0f} ms)"
+                else:
+                    break
+                tier -= 1
+            model = self.models[tier]
+            self.inflight[model] += 1
+            self.counters[model]["routed"] += 1
+            predicted = self._predicted_ms(model)
+        return {"question": question, "features": traits, "score": score, "wanted": self.models[wanted],
+                "model": model, "reason": reason, "predicted_ms": None if predicted is None else round(predicted),
+                "started": time.time(), "fallback_from": None}
+
+    def fallback(self, decision: Dict) -> Optional[Dict]:
+        tier = self.models.index(decision["model"])
+        if tier == 0:
+            return None
+        model = self.models[tier - 1]
+        with self._lock:
+            self.inflight[model] += 1
+            self.counters[model]["routed"] += 1
+        return {**decision, "model": model, "reason": f"repli après erreur de {decision['model']}",
+                "started": time.time(), "fallback_from": decision["model"]}
+
+    def cancel(self, decision: Dict) -> None:
+        with self._lock:
+            self.inflight[decision["model"]] = max(0, self.inflight[decision["model"]] - 1)
+
+    def record(self, decision: Dict, total_ms: Optional[float] = None, ttft_ms: Optional[float] = None,
+               error: Optional[str] = None) -> None:
+        model = decision["model"]
+        if total_ms is None:
+            total_ms = (time.time() - decision["started"]) * 1000
+        with self._lock:
+            self.inflight[model] = max(0, self.inflight[model] - 1)
+            if error:
+                self.counters[model]["errors"] += 1
+            else:
+                ewma = self.latency[model]
+                self.latency[model] = total_ms if ewma is None else (1 - EWMA_ALPHA) * ewma + EWMA_ALPHA * total_ms
+                self.measured[model] = time.time()
+                if total_ms > self.slo_ms:
+                    self.counters[model]["slo_missed"] += 1
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "question": decision["question"],
+            "features": decision["features"], "score": decision["score"], "wanted": decision["wanted"],
+            "model": model, "reason": decision["reason"], "fallback_from": decision["fallback_from"],
+            "predicted_ms": decision["predicted_ms"], "total_ms": round(total_ms),
+            "ttft_ms": None if ttft_ms is None else round(ttft_ms), "slo_ms": self.slo_ms, "error": error,
+        }
+        print(f"🧭 Routeur : {model} (score {decision['score']}, visé {decision['wanted']}, {decision['reason']}) "
+              f"-> {total_ms:.0f} ms" + (f" ❌ {error}" if error else ""))
+        if self.log_path:
+            try:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"⚠️ Journal du routeur non écrit ({self.log_path}) : {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {m: {**self.counters[m], "inflight": self.inflight[m],
+                        "ewma_ms": None if self.latency[m] is None else round(self.latency[m])}
+                    for m in self.models}
+
+
+def build_llms(make_llm: Callable[[str], object], models: Sequence[str] = ROUTER_MODELS) -> Dict[str, object]:
+    """{nom du modèle: LLM} pour le roster, créés par make_llm(nom) (mêmes options pour tous)."""
+    return {name: make_llm(name) for name in models}
+
+
+__all__ = ["features", "complexity", "ModelRouter", "build_llms"]
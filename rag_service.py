@@ -0,0 +1,495 @@
+# rag_service.py
+# ---------------------------------------------------------
+# Service local de retrieval partagé par toutes les interfaces
+# (app_RAG.py, rag_terminal.py, multi_model_rag.py, rag_bot.py)
+# ---------------------------------------------------------
+# - Un seul processus garde la collection Chroma et son index HNSW en mémoire
+# - API HTTP JSON locale :
+#     GET  /health   -> état du service (collection, version de l'index, nb de chunks par shard)
+#     POST /retrieve -> {"question", "k", "fetch_k", "lambda_mult", "filters", "infer_filters", "search_type",
+#                        "embedding" (optionnel : vecteur de la question déjà calculé par le client)}
+# - Clients légers : ServiceRetriever (LangChain) et llama_index_retriever (LlamaIndex)
+# - connect_retriever : service si joignable, sinon index local (même config)
+# - Recherche hybride : code produit connu -> index lexical seul (sans embedding),
+#   sinon fusion RRF des résultats BM25 et vectoriels
+# - Filtres de métadonnées (brand, language, doc_type, saddle, material) :
+#   passés explicitement ou déduits de la question (rag_metadata.infer_where)
+# - Snapshots (rag_snapshots) : l'index courant est rechargé en arrière-plan
+#   quand le lien `current` change, sans redémarrage ni requête en échec
+# - Caches LRU mémoire : vecteurs des questions (OllamaBatchEmbeddings) et
+#   résultats de recherche (par version d'index, vidés à chaque bascule)
+# - MMR vectorisé (rag_mmr) : vecteurs des chunks gardés en mémoire par
+#   l'index courant, candidats MMR sans relecture des embeddings dans Chroma
+# - Shards (RAG_SHARDS, rag_shards) : une collection par racine de corpus ;
+#   chaque question n'interroge que le(s) shard(s) choisi(s) par ShardRouter
+#
+# Lancement : python rag_service.py
+# ---------------------------------------------------------
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+
+from rag_config import (
+    DATA_DIR, CHROMA_DIR, COLLECTION, OLLAMA_BASE, EMBED_MODEL, VECTOR_BACKEND, SNAPSHOTS, SNAPSHOT_POLL,
+    SERVICE_HOST, SERVICE_PORT, SERVICE_URL, SERVICE_MODE, SERVICE_TIMEOUT, SERVICE_VERSION_TTL, HYBRID_SEARCH,
+    INFER_FILTERS,
+    RETRIEVAL_CACHE_SIZE, MMR_HOT_CACHE,
+)
+from rag_embed_cache import LRUCache
+from rag_lexical import fuse, load_lexical_index
+from rag_metadata import infer_where, load_facets, to_where
+from rag_mmr import VectorMMR
+from rag_shards import ShardRouter, shard_specs
+
+
+# =========================================================
+# INDEX LOCAL
+# ---------------------------------------------------------
+# open_local_stores : index validé par manifeste (rag_snapshots.open_collections) +
+# un VectorStore LangChain par collection (Chroma, ou NumpyVectorStore si
+# RAG_VECTOR_BACKEND=numpy). Retourne ({collection: VectorStore}, dossier, embeddings).
+# open_local_store : idem pour la collection unique (index non partitionné).
+# LocalIndex  : VectorStores + index lexicaux + facettes d'un même dossier ;
+#               avec RAG_SHARDS, ShardRouter choisit le(s) shard(s) interrogé(s) ;
+#               VectorMMR par collection (RAG_MMR_HOT_CACHE, vecteurs préchargés)
+# IndexHolder : index courant, remplacé en arrière-plan quand `current` change ;
+#               use() compte les requêtes en cours par index ; l'ancien est fermé
+#               (close : client Chroma / npstore) quand sa dernière requête se termine
+# Utilisé par le service, et par les interfaces quand le service n'est pas joignable.
+# =========================================================
+def _open_stores(index_dir: Optional[str] = None):
+    from rag_embeddings import OllamaBatchEmbeddings
+    from rag_index import open_client, open_collection
+    from rag_snapshots import open_collections
+
+    embed_model = OllamaBatchEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_BASE)
+    if index_dir:
+        client = open_client(index_dir)
+        collections = {name: open_collection(client, name) for _, name, _ in shard_specs()}
+    else:
+        client, collections, index_dir = open_collections(embed_model.embed_documents, EMBED_MODEL, DATA_DIR,
+                                                          CHROMA_DIR, COLLECTION, build=False)
+    if VECTOR_BACKEND == "numpy":
+        from rag_npstore import NumpyVectorStore
+        stores = {name: NumpyVectorStore(c, embed_model) for name, c in collections.items()}
+    else:
+        from langchain_community.vectorstores import Chroma
+        stores = {name: Chroma(client=client, collection_name=name, embedding_function=embed_model)
+                  for name in collections}
+    return client, stores, index_dir, embed_model
+
+
+def open_local_stores(index_dir: Optional[str] = None):
+    _, stores, index_dir, embed_model = _open_stores(index_dir)
+    return stores, index_dir, embed_model
+
+
+def open_local_store(index_dir: Optional[str] = None):
+    stores, index_dir, _ = open_local_stores(index_dir)
+    if len(stores) != 1:
+        raise RuntimeError("Index partitionné (RAG_SHARDS) : utilisez open_local_stores")
+    return next(iter(stores.values())), index_dir
+
+
+class LocalIndex:
+    def __init__(self, index_dir: Optional[str] = None):
+        from rag_index import read_manifest
+
+        self.client, self.stores, self.path, self.embed_model = _open_stores(index_dir)
+        manifests = {n: read_manifest(self.path, n) or {} for n in self.stores}
+        # version : change à chaque snapshot publié ou resynchronisation (clé des caches)
+        self.version = f"{os.path.basename(self.path)}:" + ",".join(
+            str(m.get("built_at", "")) for m in manifests.values())
+        self.lexicals = {n: load_lexical_index(self.path, n) if HYBRID_SEARCH else None for n in self.stores}
+        self.facets = {n: load_facets(self.path, n) for n in self.stores}
+        self.mmr = {n: VectorMMR(db) for n, db in self.stores.items()} if MMR_HOT_CACHE else {}
+        # résultats par (question, paramètres) : propre à cette version de l'index
+        self.results = LRUCache(RETRIEVAL_CACHE_SIZE)
+        self.router = None
+        if len(self.stores) > 1:
+            shards = {}
+            for shard, name, root in shard_specs():
+                shards[name] = {"shard": shard, "root": root, "lexical": self.lexicals[name],
+                                "centroid": manifests[name].get("centroid")}
+            self.router = ShardRouter(shards)
+
+    def close(self) -> None:
+        from rag_index import close_client
+        close_client(self.client)
+
+    @property
+    def db(self):
+        """VectorStore unique (index non partitionné)."""
+        return next(iter(self.stores.values()))
+
+    def route(self, question: str, vector: Optional[List[float]] = None):
+        """-> (collections à interroger, vecteur de la question ou None)."""
+        if self.router is None:
+            return list(self.stores), vector
+        names = self.router.route_keywords(question)
+        if names:
+            return names, vector
+        if vector is None:
+            vector = self.embed_model.embed_query(question)
+        return self.router.route_vector(vector), vector
+
+    def search(self, question: str, hybrid: bool = True, embedding: Optional[List[float]] = None,
+               **search_kwargs) -> List[Document]:
+        # embedding : vecteur déjà calculé (ex. lookup du cache de réponses), hors clé de cache
+        key = json.dumps([question, hybrid, search_kwargs], sort_keys=True, ensure_ascii=False)
+        docs = self.results.get(key)
+        if docs is not None:
+            return list(docs)
+        names, vector = self.route(question, embedding)
+        results = [search(self.stores[n], question, lexical=self.lexicals[n] if hybrid else None,
+                          facets=self.facets[n], embedding=vector, mmr=self.mmr.get(n), **search_kwargs)
+                   for n in names]
+        docs = results[0] if len(results) == 1 else fuse(results, k=int(search_kwargs.get("k", 5)))
+        self.results.put(key, docs)
+        return list(docs)
+
+    def cache_stats(self) -> Dict:
+        return {"query_vectors": self.embed_model.query_cache.stats(), "results": self.results.stats(),
+                "mmr_vectors": {n: m.stats() for n, m in self.mmr.items()}}
+
+    def count(self) -> int:
+        return sum(db._collection.count() for db in self.stores.values())
+
+
+class IndexHolder:
+    def __init__(self):
+        self.index = LocalIndex()
+        self._watcher = None
+        self._lock = threading.Lock()
+        self._users: Dict[LocalIndex, int] = {}   # index -> requêtes en cours
+
+    @contextmanager
+    def use(self):
+        """Index courant, gardé ouvert jusqu'à la fin du bloc même en cas de bascule."""
+        with self._lock:
+            index = self.index
+            self._users[index] = self._users.get(index, 0) + 1
+        try:
+            yield index
+        finally:
+            with self._lock:
+                self._users[index] -= 1
+                last = self._users[index] == 0
+                if last:
+                    del self._users[index]
+                retired = last and index is not self.index
+            if retired:
+                self._close(index)
+
+    @staticmethod
+    def _close(index: LocalIndex) -> None:
+        try:
+            index.close()
+            print(f"🧹 Ancien index {index.path} libéré")
+        except Exception as e:
+            print(f"⚠️ Ancien index {index.path} non libéré : {e}")
+
+    def watch(self, interval: float = SNAPSHOT_POLL) -> "IndexHolder":
+        if SNAPSHOTS and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), daemon=True)
+            self._watcher.start()
+        return self
+
+    def _watch(self, interval: float) -> None:
+        from rag_snapshots import current_index_dir
+        while True:
+            time.sleep(interval)
+            path = current_index_dir()
+            if path == self.index.path:
+                continue
+            try:
+                fresh = LocalIndex(path)
+                fresh.search("selle", k=1, fetch_k=1)   # chauffe avant bascule
+            except Exception as e:
+                print(f"⚠️ Nouvel index {path} non chargé : {e}")
+                continue
+            # les requêtes en cours terminent sur l'ancien index : fermé par la dernière (use)
+            with self._lock:
+                retired, self.index = self.index, fresh
+                idle = retired not in self._users
+            print(f"🔁 Bascule à chaud sur l'index {path} ({fresh.count()} chunks)")
+            if idle:
+                self._close(retired)
+
+
+# =========================================================
+# RECHERCHE
+# ---------------------------------------------------------
+# search(db, question, ..., filters, lexical, facets, embedding, mmr):
+# 0) filtre "where" : explicite, sinon déduit de la question (facettes connues)
+# 1) question avec un code produit connu -> index lexical seul
+# 2) sinon recherche vectorielle (MMR ou similarité) restreinte au filtre
+#    (embedding : vecteur de la question déjà calculé, ex. par le routage des shards ;
+#    mmr : VectorMMR de la collection, MMR sur les vecteurs gardés en mémoire)
+# 3) + fusion RRF avec les fetch_k meilleurs résultats BM25 (même filtre)
+# Un filtre déduit qui ne renvoie rien est abandonné (recherche sans filtre).
+# =========================================================
+def search(db, question: str, search_type: str = "mmr", k: int = 5, fetch_k: int = 20,
+           lambda_mult: float = 0.5, filters: Optional[Dict] = None, lexical=None,
+           facets: Optional[Dict] = None, infer_filters: bool = INFER_FILTERS,
+           embedding: Optional[List[float]] = None, mmr: Optional[VectorMMR] = None) -> List[Document]:
+    where = to_where(filters)
+    inferred = False
+    if where is None and infer_filters and facets:
+        where = infer_where(question, facets)
+        inferred = where is not None
+
+    docs = lexical.code_lookup(question, k, where) if lexical is not None else []
+    if not docs:
+        if search_type == "mmr" and mmr is not None:
+            docs = mmr.search(question, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=where,
+                              embedding=embedding)
+        elif embedding is None and search_type == "mmr":
+            docs = db.max_marginal_relevance_search(
+                question, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=where
+            )
+        elif embedding is None:
+            docs = db.similarity_search(question, k=k, filter=where)
+        elif search_type == "mmr":
+            docs = db.max_marginal_relevance_search_by_vector(
+                embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=where
+            )
+        else:
+            docs = db.similarity_search_by_vector(embedding, k=k, filter=where)
+        if lexical is not None:
+            docs = fuse([docs, lexical.search(question, fetch_k, where)], k=k)
+
+    if inferred and not docs:
+        return search(db, question, search_type, k, fetch_k, lambda_mult, lexical=lexical, infer_filters=False,
+                      embedding=embedding, mmr=mmr)
+    return docs
+
+
+# =========================================================
+# SERVEUR HTTP
+# ---------------------------------------------------------
+# RetrievalHandler : un thread par requête, db partagée (lecture seule)
+# =========================================================
+class RetrievalHandler(BaseHTTPRequestHandler):
+    holder: Optional[IndexHolder] = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status: int, payload: Dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": "not found"})
+        with self.holder.use() as index:
+            self._reply(200, {"status": "ok", "collection": COLLECTION, "index": index.path,
+                              "version": index.version, "chunks": index.count(), "caches": index.cache_stats(),
+                              "shards": {n: db._collection.count() for n, db in index.stores.items()}})
+
+    def do_POST(self):
+        if self.path != "/retrieve":
+            return self._reply(404, {"error": "not found"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            t0 = time.time()
+            with self.holder.use() as index:
+                docs = index.search(
+                    body["question"],
+                    search_type=body.get("search_type", "mmr"),
+                    k=int(body.get("k", 5)),
+                    fetch_k=int(body.get("fetch_k", 20)),
+                    lambda_mult=float(body.get("lambda_mult", 0.5)),
+                    filters=body.get("filters"),
+                    hybrid=bool(body.get("hybrid", True)),
+                    infer_filters=bool(body.get("infer_filters", INFER_FILTERS)),
+                    embedding=body.get("embedding"),
+                )
+            self._reply(200, {
+                "documents": [{"page_content": d.page_content, "metadata": d.metadata, "id": d.id}
+                              for d in docs],
+                "retrieve_ms": round((time.time() - t0) * 1000, 1),
+            })
+        except (KeyError, ValueError) as e:
+            self._reply(400, {"error": f"requête invalide : {e}"})
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+
+
+def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT) -> None:
+    RetrievalHandler.holder = IndexHolder()
+    # Requête de chauffe : charge l'index HNSW en mémoire avant le premier utilisateur
+    RetrievalHandler.holder.index.search("selle", k=1, fetch_k=1)
+    RetrievalHandler.holder.watch()
+    server = ThreadingHTTPServer((host, port), RetrievalHandler)
+    print(f"🔌 Service de retrieval prêt sur http://{host}:{port} (collection {COLLECTION})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Service arrêté.")
+    finally:
+        server.server_close()
+
+
+# =========================================================
+# CLIENT
+# ---------------------------------------------------------
+# RetrievalClient.retrieve(question, k, filters, ...) -> List[Document]
+# RetrievalClient.index_version() -> version servie (/health, gardée SERVICE_VERSION_TTL s)
+# =========================================================
+class RetrievalClient:
+    def __init__(self, base_url: str = SERVICE_URL, timeout: float = SERVICE_TIMEOUT,
+                 version_ttl: float = SERVICE_VERSION_TTL):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.version_ttl = version_ttl
+        self.session = requests.Session()
+        self._version: Optional[Tuple[str, float]] = None   # (version, lue à)
+
+    def available(self) -> bool:
+        try:
+            r = self.session.get(f"{self.base_url}/health", timeout=2)
+            return r.ok
+        except requests.RequestException:
+            return False
+
+    def health(self) -> Dict:
+        r = self.session.get(f"{self.base_url}/health", timeout=2)
+        r.raise_for_status()
+        return r.json()
+
+    def index_version(self) -> str:
+        now = time.time()
+        if self._version is None or now - self._version[1] > self.version_ttl:
+            self._version = (str(self.health().get("version", "")), now)
+        return self._version[0]
+
+    def retrieve(self, question: str, k: int = 5, filters: Optional[Dict] = None, **search_kwargs) -> List[Document]:
+        body = {"question": question, "k": k, "filters": filters, **search_kwargs}
+        r = self.session.post(f"{self.base_url}/retrieve", json=body, timeout=self.timeout)
+        if not r.ok:
+            raise RuntimeError(f"Service de retrieval : {r.status_code} {r.text[:200]}")
+        return [Document(page_content=d["page_content"], metadata=d["metadata"], id=d.get("id"))
+                for d in r.json()["documents"]]
+
+
+# =========================================================
+# RETRIEVER LANGCHAIN
+# ---------------------------------------------------------
+# Même usage que db.as_retriever(...) dans les chaînes LCEL
+# retriever.invoke(question, embedding=vecteur) : vecteur de la question déjà
+# calculé (ex. lookup du cache de réponses), la recherche ne le recalcule pas
+# =========================================================
+class _VectorRetriever(BaseRetriever):
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+                                       embedding: Optional[List[float]] = None) -> List[Document]:
+        return await run_in_executor(None, self._get_relevant_documents, query,
+                                     run_manager=run_manager.get_sync(), embedding=embedding)
+
+
+class ServiceRetriever(_VectorRetriever):
+    client: Any
+    search_kwargs: Dict = {}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                embedding: Optional[List[float]] = None) -> List[Document]:
+        return self.client.retrieve(query, embedding=embedding, **self.search_kwargs)
+
+
+# =========================================================
+# RETRIEVER LOCAL (repli sans service)
+# ---------------------------------------------------------
+# Même logique de recherche que le service (hybride, bascule de snapshot comprises)
+# =========================================================
+class LocalRetriever(_VectorRetriever):
+    holder: Any
+    search_kwargs: Dict = {}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                embedding: Optional[List[float]] = None) -> List[Document]:
+        with self.holder.use() as index:
+            return index.search(query, embedding=embedding, **self.search_kwargs)
+
+
+def index_version(retriever: BaseRetriever) -> str:
+    """Version de l'index servi par un retriever de connect_retriever (clé d'invalidation des caches)."""
+    if isinstance(retriever, ServiceRetriever):
+        return retriever.client.index_version()
+    if isinstance(retriever, LocalRetriever):
+        return retriever.holder.index.version
+    return ""
+
+
+# =========================================================
+# RETRIEVER LLAMAINDEX (import paresseux)
+# =========================================================
+def llama_index_retriever(client: Optional[RetrievalClient] = None, **search_kwargs):
+    from llama_index.core.retrievers import BaseRetriever as LlamaBaseRetriever
+    from llama_index.core.schema import NodeWithScore, TextNode
+
+    class ServiceLlamaRetriever(LlamaBaseRetriever):
+        def __init__(self, client: RetrievalClient, search_kwargs: Dict):
+            super().__init__()
+            self._client = client
+            self._search_kwargs = search_kwargs
+
+        def _retrieve(self, query_bundle):
+            docs = self._client.retrieve(query_bundle.query_str, **self._search_kwargs)
+            return [NodeWithScore(node=TextNode(text=d.page_content, metadata=d.metadata)) for d in docs]
+
+    return ServiceLlamaRetriever(client or RetrievalClient(), search_kwargs)
+
+
+# =========================================================
+# POINT D'ENTRÉE DES INTERFACES
+# ---------------------------------------------------------
+# connect_retriever(search_type, k, fetch_k, lambda_mult, filters, infer_filters):
+# - filters       : filtre "where" fixe, ex. {"brand": "CWD", "language": "fr"}
+# - infer_filters : sinon, filtre déduit de chaque question (marque, selle)
+# - mode "auto"   : service si /health répond, sinon index local
+# - mode "remote" : service obligatoire (erreur sinon)
+# - mode "local"  : index local uniquement
+# =========================================================
+def connect_retriever(search_type: str = "mmr", k: int = 5, fetch_k: int = 20,
+                      lambda_mult: float = 0.5, filters: Optional[Dict] = None,
+                      infer_filters: bool = INFER_FILTERS, mode: str = SERVICE_MODE) -> BaseRetriever:
+    search_kwargs = {"search_type": search_type, "k": k, "fetch_k": fetch_k, "lambda_mult": lambda_mult,
+                     "infer_filters": infer_filters}
+    if filters:
+        search_kwargs["filters"] = filters
+
+    if mode != "local":
+        client = RetrievalClient()
+        if client.available():
+            print(f"🔌 Retrieval via le service partagé ({client.base_url})")
+            return ServiceRetriever(client=client, search_kwargs=search_kwargs)
+        if mode == "remote":
+            raise RuntimeError(f"Service de retrieval injoignable : {client.base_url}")
+        print("⚠️ Service de retrieval injoignable : chargement de l'index local")
+
+    return LocalRetriever(holder=IndexHolder().watch(), search_kwargs=search_kwargs)
+
+
+__all__ = [
+    "open_local_stores", "open_local_store", "LocalIndex", "IndexHolder", "search", "serve", "RetrievalClient", "ServiceRetriever", "LocalRetriever",
+    "index_version", "llama_index_retriever", "connect_retriever",
+]
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,87 @@
+# rag_shards.py
+# ---------------------------------------------------------
+# Shards de collection par racine de corpus + routage des questions
+# ---------------------------------------------------------
+# RAG_SHARDS="cwd=CWD FR;lim=LIM FR" :
+# - une collection par racine (COLLECTION_cwd, COLLECTION_lim), chacune avec
+#   son manifeste, son index BM25 et son dédoublonnage -> réindexation et
+#   chargement indépendants, recherches plus petites
+# - centroïde des vecteurs de chaque shard enregistré dans son manifeste
+# ShardRouter choisit le(s) shard(s) d'une question :
+# 1) codes produit connus de l'index lexical d'un shard
+# 2) mots-clés (nom du shard, dossier racine, RAG_SHARD_KEYWORDS)
+# 3) sinon similarité cosinus question / centroïdes (+ shards à moins de SHARD_MARGIN)
+# Les résultats de plusieurs shards sont fusionnés par RRF (rag_lexical.fuse).
+# ---------------------------------------------------------
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_config import COLLECTION, DATA_DIR, SHARDS, SHARD_KEYWORDS, SHARD_MARGIN
+from rag_lexical import question_codes, tokenize
+
+
+# =========================================================
+# SPÉCIFICATION DES SHARDS
+# ---------------------------------------------------------
+# shard_specs -> [(shard, nom de collection, dossier racine)]
+# Sans RAG_SHARDS : [("", COLLECTION, DATA_DIR)] (collection unique historique)
+# =========================================================
+def shard_specs(data_dir: str = DATA_DIR, collection: str = COLLECTION) -> List[Tuple[str, str, str]]:
+    if not SHARDS:
+        return [("", collection, data_dir)]
+    return [(shard, f"{collection}_{shard}", os.path.join(data_dir, root)) for shard, root in SHARDS]
+
+
+# =========================================================
+# CENTROÏDES
+# =========================================================
+def compute_centroid(collection) -> Optional[List[float]]:
+    vectors = np.asarray(collection.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+    if not len(vectors):
+        return None
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    centroid = vectors.mean(axis=0)
+    return (centroid / (np.linalg.norm(centroid) + 1e-12)).round(6).tolist()
+
+
+# =========================================================
+# ROUTEUR
+# ---------------------------------------------------------
+# ShardRouter(shards) : shards = {collection: {"shard", "root", "centroid", "lexical"}}
+# - route_keywords(question)        -> collections choisies sans embedding (ou [])
+# - route_vector(question_vector)   -> collections par similarité aux centroïdes
+# =========================================================
+class ShardRouter:
+    def __init__(self, shards: Dict[str, Dict], margin: float = SHARD_MARGIN):
+        self.shards = shards
+        self.margin = margin
+        self.keywords = {}
+        for name, info in shards.items():
+            words = {info["shard"], os.path.basename(info.get("root", "")), *SHARD_KEYWORDS.get(info["shard"], ())}
+            self.keywords[name] = {" ".join(tokenize(w)) for w in words if w and tokenize(w)}
+        names = [n for n, info in shards.items() if info.get("centroid")]
+        self.names = names
+        self.centroids = np.asarray([shards[n]["centroid"] for n in names], dtype=np.float32) if names else None
+
+    def route_keywords(self, question: str) -> List[str]:
+        by_code = [n for n, info in self.shards.items()
+                   if info.get("lexical") is not None and question_codes(question, info["lexical"].known_codes)]
+        if by_code:
+            return by_code
+        tokens = tokenize(question)
+        text = f" {' '.join(tokens)} "
+        # mot-clé = suite de tokens : recherche dans la question tokenisée
+        return [n for n, words in self.keywords.items() if any(f" {w} " in text for w in words)]
+
+    def route_vector(self, vector: Sequence[float]) -> List[str]:
+        if self.centroids is None:
+            return list(self.shards)
+        q = np.asarray(vector, dtype=np.float32)
+        sims = self.centroids @ (q / (np.linalg.norm(q) + 1e-12))
+        best = float(sims.max())
+        return [n for n, s in sorted(zip(self.names, sims), key=lambda x: -x[1]) if s >= best - self.margin]
+
+
+__all__ = ["shard_specs", "compute_centroid", "ShardRouter"]
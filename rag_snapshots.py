@@ -0,0 +1,284 @@
+# rag_snapshots.py
+# ---------------------------------------------------------
+# Snapshots versionnés de l'index + bascule atomique (sans interruption)
+# ---------------------------------------------------------
+# Disposition :
+#   CHROMA_DIR/snapshots/<AAAAMMJJ-HHMMSS>/   index complet (Chroma ou npstore,
+#                                             manifeste, BM25, dédoublonnage)
+#   CHROMA_DIR/current -> snapshots/<...>     lien symbolique remplacé atomiquement
+# Reconstruction (build_snapshot) :
+# 1) copie du snapshot courant (ou de l'ancien index à la racine de CHROMA_DIR)
+#    -> la synchronisation reste incrémentale, l'index servi n'est jamais modifié
+# 2) load_or_build dans la copie
+# 3) validation : nombre de vecteurs = manifeste (> 0), requêtes de fumée non vides
+# 4) bascule de `current`, puis suppression des snapshots au-delà de SNAPSHOT_KEEP
+# Les serveurs (rag_service) surveillent `current` et rechargent en arrière-plan.
+# Avec RAG_SHARDS, un snapshot contient toutes les collections-shards ;
+# `build --shard lim` ne resynchronise que ce shard.
+#
+# Ligne de commande :
+#   python rag_snapshots.py build [--shard nom ...] | list | rollback [n]
+# ---------------------------------------------------------
+import argparse
+import fcntl
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from rag_config import (
+    CHROMA_DIR, COLLECTION, DATA_DIR, EMBED_MODEL, OLLAMA_BASE, SHARDS, SNAPSHOTS, SNAPSHOT_KEEP, SMOKE_QUERIES,
+)
+from rag_index import (
+    corpus_fingerprint, index_settings, load_or_build, open_client, open_collection, read_manifest, write_manifest,
+)
+from rag_shards import compute_centroid, shard_specs
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+CURRENT = "current"
+SNAPSHOT_DIR = "snapshots"
+
+
+# =========================================================
+# EMPLACEMENTS
+# ---------------------------------------------------------
+# current_index_dir : dossier de l'index servi (cible de `current`, sinon
+# CHROMA_DIR lui-même pour un index antérieur aux snapshots)
+# =========================================================
+def snapshots_root(chroma_dir: str = CHROMA_DIR) -> str:
+    return os.path.join(chroma_dir, SNAPSHOT_DIR)
+
+
+def current_index_dir(chroma_dir: str = CHROMA_DIR) -> str:
+    link = os.path.join(chroma_dir, CURRENT)
+    return os.path.realpath(link) if os.path.islink(link) else chroma_dir
+
+
+def list_snapshots(chroma_dir: str = CHROMA_DIR) -> List[str]:
+    root = snapshots_root(chroma_dir)
+    if not os.path.isdir(root):
+        return []
+    return sorted(os.path.join(root, d) for d in os.listdir(root)
+                  if not d.startswith(".") and os.path.isdir(os.path.join(root, d)))
+
+
+@contextmanager
+def _build_lock(chroma_dir: str):
+    os.makedirs(snapshots_root(chroma_dir), exist_ok=True)
+    with open(os.path.join(snapshots_root(chroma_dir), ".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# =========================================================
+# PUBLICATION / ROLLBACK / NETTOYAGE
+# =========================================================
+def switch_current(path: str, chroma_dir: str = CHROMA_DIR) -> None:
+    link = os.path.join(chroma_dir, CURRENT)
+    tmp = f"{link}.tmp-{os.getpid()}"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.symlink(os.path.relpath(path, chroma_dir), tmp)
+    os.replace(tmp, link)
+    print(f"🔀 Index courant : {os.path.basename(path)}")
+
+
+def prune_snapshots(keep: int = SNAPSHOT_KEEP, chroma_dir: str = CHROMA_DIR) -> None:
+    current = current_index_dir(chroma_dir)
+    snapshots = list_snapshots(chroma_dir)
+    for path in snapshots[:max(0, len(snapshots) - keep)]:
+        if os.path.realpath(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
+            print(f"🧹 Snapshot supprimé : {os.path.basename(path)}")
+
+
+def rollback(steps: int = 1, chroma_dir: str = CHROMA_DIR) -> str:
+    snapshots = [os.path.realpath(p) for p in list_snapshots(chroma_dir)]
+    current = current_index_dir(chroma_dir)
+    if current not in snapshots or snapshots.index(current) - steps < 0:
+        raise RuntimeError("Aucun snapshot antérieur disponible pour le rollback")
+    target = snapshots[snapshots.index(current) - steps]
+    switch_current(target, chroma_dir)
+    return target
+
+
+# =========================================================
+# VALIDATION
+# ---------------------------------------------------------
+# - manifeste présent, nombre de chunks > 0 et identique à la collection
+# - chaque requête de fumée renvoie au moins un résultat
+# =========================================================
+def validate_snapshot(collection, path: str, embed_documents: EmbedFn, name: str = COLLECTION,
+                      queries=SMOKE_QUERIES) -> None:
+    manifest = read_manifest(path, name)
+    count = collection.count()
+    if not manifest:
+        raise RuntimeError(f"Snapshot {path} : manifeste absent")
+    if count == 0 or manifest.get("chunks") != count:
+        raise RuntimeError(f"Snapshot {path} : {count} vecteurs (manifeste : {manifest.get('chunks')})")
+    if queries:
+        result = collection.query(query_embeddings=embed_documents(list(queries)),
+                                  n_results=min(3, count), include=[])
+        empty = [q for q, ids in zip(queries, result["ids"]) if not ids]
+        if empty:
+            raise RuntimeError(f"Snapshot {path} : aucune réponse pour {empty}")
+
+
+# =========================================================
+# CONSTRUCTION
+# ---------------------------------------------------------
+# sync_collections(path, ...) : load_or_build de chaque shard (rag_shards) dans
+#   path, centroïde enregistré dans le manifeste des shards resynchronisés
+# build_snapshot(..., shards) -> dossier de l'index courant (nouveau ou inchangé)
+#   shards : noms des shards à resynchroniser (défaut : tous) ; les autres sont
+#   repris tels quels du snapshot courant
+# Rien n'est copié si l'index courant est déjà à jour (manifestes identiques).
+# =========================================================
+def _is_up_to_date(path: str, embed_model_name: str, data_dir: str, name: str) -> bool:
+    manifest = read_manifest(path, name)
+    return bool(manifest) and manifest.get("settings") == index_settings(embed_model_name) \
+        and manifest.get("corpus_fingerprint") == corpus_fingerprint(data_dir) \
+        and (not SHARDS or bool(manifest.get("centroid")))
+
+
+def sync_collections(path: str, embed_documents: EmbedFn, embed_model_name: str = EMBED_MODEL,
+                     data_dir: str = DATA_DIR, name: str = COLLECTION,
+                     shards: Optional[Sequence[str]] = None) -> Dict[str, object]:
+    client = open_client(path)
+    collections = {}
+    for shard, collection_name, root in shard_specs(data_dir, name):
+        if shards and shard not in shards:
+            continue
+        collection = load_or_build(client, embed_documents, embed_model_name, root, path, collection_name)
+        manifest = read_manifest(path, collection_name)
+        if SHARDS and (not manifest.get("centroid") or manifest.get("centroid_built_at") != manifest.get("built_at")):
+            manifest["centroid"] = compute_centroid(collection)
+            manifest["centroid_built_at"] = manifest.get("built_at")
+            write_manifest(manifest, path, collection_name)
+        collections[collection_name] = collection
+    return collections
+
+
+def build_snapshot(
+    embed_documents: EmbedFn,
+    embed_model_name: str = EMBED_MODEL,
+    data_dir: str = DATA_DIR,
+    chroma_dir: str = CHROMA_DIR,
+    name: str = COLLECTION,
+    keep: int = SNAPSHOT_KEEP,
+    shards: Optional[Sequence[str]] = None,
+) -> str:
+    with _build_lock(chroma_dir):
+        base = current_index_dir(chroma_dir)
+        specs = [s for s in shard_specs(data_dir, name) if not shards or s[0] in shards]
+        if all(_is_up_to_date(base, embed_model_name, root, cname) for _, cname, root in specs):
+            print(f"♻️ Snapshot courant à jour : {os.path.basename(base)}")
+            return base
+
+        path = os.path.join(snapshots_root(chroma_dir), time.strftime("%Y%m%d-%H%M%S"))
+        while os.path.exists(path):
+            path += "_"
+        t0 = time.time()
+        if os.path.isdir(base) and os.listdir(base):
+            ignore = shutil.ignore_patterns(SNAPSHOT_DIR, CURRENT, f"{CURRENT}.tmp-*") if base == chroma_dir else None
+            shutil.copytree(base, path, ignore=ignore, symlinks=True)
+        else:
+            os.makedirs(path)
+        print(f"📸 Nouveau snapshot {os.path.basename(path)} (copie {time.time() - t0:.1f}s)")
+
+        try:
+            collections = sync_collections(path, embed_documents, embed_model_name, data_dir, name, shards)
+            for collection_name, collection in collections.items():
+                validate_snapshot(collection, path, embed_documents, collection_name)
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        switch_current(path, chroma_dir)
+        prune_snapshots(keep, chroma_dir)
+        return path
+
+
+# =========================================================
+# OUVERTURE PAR LES SCRIPTS ET SERVEURS
+# ---------------------------------------------------------
+# open_collections(embed_documents, ..., build) -> (client, {collection: objet}, dossier)
+# - SNAPSHOTS désactivé : load_or_build directement dans CHROMA_DIR (historique)
+# - build=True  : construit/valide/publie un snapshot si nécessaire (indexeurs)
+# - build=False : ouvre l'index courant tel quel (serveurs) ; un premier
+#                 snapshot n'est construit que s'il n'en existe aucun
+# open_index : même chose pour la collection unique (scripts LlamaIndex)
+# =========================================================
+def open_collections(
+    embed_documents: EmbedFn,
+    embed_model_name: str = EMBED_MODEL,
+    data_dir: str = DATA_DIR,
+    chroma_dir: str = CHROMA_DIR,
+    name: str = COLLECTION,
+    build: bool = True,
+) -> Tuple[object, Dict[str, object], str]:
+    if not SNAPSHOTS:
+        collections = sync_collections(chroma_dir, embed_documents, embed_model_name, data_dir, name)
+        return open_client(chroma_dir), collections, chroma_dir
+
+    path = current_index_dir(chroma_dir)
+    specs = shard_specs(data_dir, name)
+    if build or not all(read_manifest(path, cname) for _, cname, _ in specs):
+        path = build_snapshot(embed_documents, embed_model_name, data_dir, chroma_dir, name)
+    client = open_client(path)
+    collections = {cname: open_collection(client, cname) for _, cname, _ in specs}
+    print(f"♻️ Index {os.path.basename(path)} chargé ("
+          + ", ".join(f"{c}: {col.count()} chunks" for c, col in collections.items()) + ")")
+    return client, collections, path
+
+
+def open_index(
+    embed_documents: EmbedFn,
+    embed_model_name: str = EMBED_MODEL,
+    data_dir: str = DATA_DIR,
+    chroma_dir: str = CHROMA_DIR,
+    name: str = COLLECTION,
+    build: bool = True,
+) -> Tuple[object, object, str]:
+    if SHARDS:
+        raise RuntimeError("Index partitionné (RAG_SHARDS) : utilisez open_collections ou le service de retrieval")
+    client, collections, path = open_collections(embed_documents, embed_model_name, data_dir, chroma_dir, name, build)
+    return client, collections[name], path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshots versionnés de l'index RAG")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    bp = sub.add_parser("build", help="synchronise le corpus dans un nouveau snapshot puis le publie")
+    bp.add_argument("--shard", nargs="*", help="shards à resynchroniser (défaut : tous)")
+    sub.add_parser("list", help="liste les snapshots")
+    rb = sub.add_parser("rollback", help="republie un snapshot précédent")
+    rb.add_argument("steps", type=int, nargs="?", default=1)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        from rag_embeddings import OllamaBatchEmbedder
+        build_snapshot(OllamaBatchEmbedder(EMBED_MODEL, OLLAMA_BASE).embed, shards=args.shard)
+    elif args.cmd == "list":
+        current = current_index_dir()
+        for path in list_snapshots():
+            mark = "*" if os.path.realpath(path) == current else " "
+            for _, cname, _ in shard_specs():
+                manifest = read_manifest(path, cname) or {}
+                print(f"{mark} {os.path.basename(path)}  {cname}  {manifest.get('chunks', '?')} chunks  "
+                      f"{manifest.get('built_at', '')}")
+    else:
+        rollback(args.steps)
+
+
+__all__ = [
+    "snapshots_root", "current_index_dir", "list_snapshots", "switch_current", "prune_snapshots",
+    "rollback", "validate_snapshot", "sync_collections", "build_snapshot", "open_collections", "open_index",
+]
+
+
+if __name__ == "__main__":
+    main()
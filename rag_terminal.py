@@ -1,32 +1,13 @@
 import os
-import re
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain.prompts import ChatPromptTemplate
+import time
 
-# =========================================================
-# CONFIGURATION GLOBALE
-# ---------------------------------------------------------
-# DATA_DIR   : répertoire contenant les documents prétraités
-# CHROMA_DIR : répertoire où sera stocké l’index Chroma persistant
-# =========================================================
-DATA_DIR = "/var/www/RAG/Data_parse"
-CHROMA_DIR = "/var/www/RAG/chroma_index"
+from langchain_ollama import OllamaLLM
+from langchain_core.output_parsers import StrOutputParser
 
-# =========================================================
-# EMBEDDING MODEL (Ollama)
-# ---------------------------------------------------------
-# - Utilise "nomic-embed-text" pour transformer les documents en vecteurs
-# - base_url = Ollama local
-# =========================================================
-embed_model = OllamaEmbeddings(
-    model="nomic-embed-text", 
-    base_url="http://localhost:11434"
-)
+from rag_config import LLM_KEEP_ALIVE, LLM_WARMUP
+from rag_context import format_context
+from rag_prompts import rag_prompt, warm_up
+from rag_service import connect_retriever
 
 # =========================================================
 # LLM (Ollama - Llama3)
@@ -34,79 +15,28 @@ embed_model = OllamaEmbeddings(
 # - Modèle utilisé : "llama3:latest"
 # - Contexte max = 8192 tokens
 # - Température basse (0.1) pour réponses précises et déterministes
+# - keep_alive : modèle maintenu chargé entre deux questions (RAG_LLM_KEEP_ALIVE)
 # =========================================================
 llm = OllamaLLM(
     model="llama3:latest",
     base_url="http://localhost:11434",
     temperature=0.1,
     num_ctx=8192,
+    keep_alive=LLM_KEEP_ALIVE,
     request_timeout=3000
 )
 
-# =========================================================
-# FONCTION DE NETTOYAGE TEXTE
-# ---------------------------------------------------------
-# - Supprime espaces multiples
-# - Remplace espaces insécables par des espaces normaux
-# - Retourne texte nettoyé
-# =========================================================
-def clean_text(text: str) -> str:
-    text = re.sub(r'\s+', ' ', text)
-    text = text.replace('\u00A0', ' ')
-    return text
-
-# =========================================================
-# CHARGEMENT + NETTOYAGE DES DOCUMENTS
-# ---------------------------------------------------------
-# - DirectoryLoader : charge tous les fichiers texte sous DATA_DIR
-# - TextLoader      : détecte automatiquement l'encodage
-# - Nettoyage du contenu avant indexation
-# =========================================================
-def load_and_clean_docs():
-    loader = DirectoryLoader(
-        DATA_DIR,
-        glob="**/*",
-        loader_cls=TextLoader,
-        show_progress=True,
-        use_multithreading=True,
-        loader_kwargs={"autodetect_encoding": True}
-    )
-    docs = loader.load()
-    for doc in docs:
-        doc.page_content = clean_text(doc.page_content)
-    return docs
-
-# =========================================================
-# CONSTRUCTION OU RECHARGEMENT DE L'INDEX CHROMA
-# ---------------------------------------------------------
-# - Si index existe déjà : on le recharge
-# - Sinon :
-#   * On charge/nettoie les docs
-#   * On les découpe en chunks (500 tokens, overlap 50)
-#   * On construit un nouvel index Chroma et on le persiste
-# =========================================================
-if os.path.exists(CHROMA_DIR):
-    db = Chroma(persist_directory=CHROMA_DIR, embedding_function=embed_model)
-else:
-    print("📚 Création de l’index vectoriel...")
-    docs = load_and_clean_docs()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_documents(docs)
-    db = Chroma.from_documents(chunks, embed_model, persist_directory=CHROMA_DIR)
-    db.persist()
-
 # =========================================================
 # RETRIEVER
 # ---------------------------------------------------------
+# - Service de retrieval partagé (rag_service.py) s'il tourne,
+#   sinon index Chroma local (même configuration : rag_config)
 # - Méthode : MMR (Maximal Marginal Relevance)
 #   * k=5     : nombre final de passages retournés
 #   * fetch_k : 20 candidats initiaux
-#   * lambda=0.5 : équilibre entre pertinence & diversité
+#   * lambda_mult=0.5 : équilibre entre pertinence & diversité
 # =========================================================
-retriever = db.as_retriever(
-    search_type="mmr",
-    search_kwargs={"k": 5 , "fetch_k": 20 , "lambda": 0.5}
-)
+retriever = connect_retriever(search_type="mmr", k=5, fetch_k=20, lambda_mult=0.5)
 
 # =========================================================
 # PROMPT RAG
@@ -117,8 +47,10 @@ retriever = db.as_retriever(
 #   * Pas de reformulation de la question
 #   * Pas de conseils hors sujet
 #   * Obligation de citer la source (nom du document)
+# - rag_prompt : consignes en préfixe fixe (cache de prompt d'Ollama),
+#   contexte et question en fin de prompt
 # =========================================================
-question_prompt = ChatPromptTemplate.from_template("""
+question_prompt = rag_prompt("""
 Vous êtes un assistant expert de la marque CWD. Répondez  en vous basant sur les documents fournis.
 
 Contraintes :
@@ -127,53 +59,38 @@ Contraintes :
 - **Ne reformulez pas la question**
 - **N’ajoutez pas de conseils, génériques ou hors sujet**
 - Si une information est utilisée, citez sa **source (nom du document)**
-
-
-=== CONTEXTE ===
-{context}
-
-=== QUESTION ===
-{question}
-
-=== RÉPONSE COURTE ===
-""")
+""", answer_header="=== RÉPONSE COURTE ===")
 
 # =========================================================
 # FORMATAGE DU CONTEXTE
 # ---------------------------------------------------------
-# - Concatène le contenu des documents récupérés
-# - Séparés par deux sauts de ligne pour lisibilité
+# - format_context (rag_context) : chunks étiquetés "[n] fichier",
+#   sans phrases redondantes, tenant dans RAG_CONTEXT_TOKENS
 # =========================================================
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
 
 # =========================================================
 # CHAÎNE QA (RAG)
 # ---------------------------------------------------------
 # - Étapes :
-#   1) "context" : retriever + format_docs
-#   2) "question" : passe telle quelle (RunnablePassthrough)
+#   1) retriever appelé une fois par la boucle (sources affichées aussitôt)
+#   2) "context" : format_context des documents récupérés
 #   3) Injection dans le prompt
-#   4) LLM génère réponse
+#   4) LLM génère réponse (en streaming)
 #   5) StrOutputParser : formate la sortie texte
 # =========================================================
-qa_chain = (
-    {
-        "context": retriever | format_docs,
-        "question": RunnablePassthrough(),
-    }
-    | question_prompt
-    | llm
-    | StrOutputParser()
-)
+answer_chain = question_prompt | llm | StrOutputParser()
 
 # =========================================================
 # BOUCLE TERMINAL (Interface CLI)
 # ---------------------------------------------------------
 # - L'utilisateur saisit une question
-# - Réponse générée via qa_chain
+# - Sources affichées dès la fin du retrieval
+# - Réponse affichée token par token (answer_chain.stream), puis
+#   temps jusqu'au premier token (TTFT) et temps total
 # - Quitter avec "exit" / "quit" / "q"
 # =========================================================
+if LLM_WARMUP:
+    warm_up(llm, question_prompt)
 print("\n✅ Système prêt. Posez vos questions (ou tapez 'exit' pour quitter).\n")
 while True:
     try:
@@ -181,8 +98,18 @@ while True:
         if query.strip().lower() in ["exit", "quit", "q"]:
             print("👋 Fin du programme.")
             break
-        response = qa_chain.invoke(query)
-        print("\n🧠 Réponse :\n", response)
+        t0 = time.time()
+        docs = retriever.invoke(query)
+        sources = dict.fromkeys(os.path.basename(d.metadata["source"]) for d in docs if d.metadata.get("source"))
+        print(f"\n📂 Sources ({(time.time() - t0) * 1000:.0f} ms) : {', '.join(sources) or '(aucune)'}")
+        print("\n🧠 Réponse :\n", end=" ", flush=True)
+        ttft = None
+        for token in answer_chain.stream({"context": format_context(query, docs), "question": query}):
+            if ttft is None:
+                ttft = time.time() - t0
+            print(token, end="", flush=True)
+        total = time.time() - t0
+        print(f"\n\n⏱ Premier token : {(ttft or total) * 1000:.0f} ms | total : {total * 1000:.0f} ms")
         print("-" * 60)
     except KeyboardInterrupt:
         print("\n👋 Interrompu.")
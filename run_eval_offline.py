@@ -26,7 +26,7 @@ def main():
     for ex in DATASET:
         q = ex["inputs"]["question"]
         ref = ex["outputs"]
-        out = rag_bot(q)   # {"answer":..., "documents":[...]}
+        out = rag_bot(q)   # {"answer":..., "documents":[...], "timings":{...}} (une seule passe de retrieval)
 
         row = {
             "question": q,
@@ -35,6 +35,7 @@ def main():
             "relevance": relevance(ex["inputs"], out),
             "groundedness": groundedness(ex["inputs"], out),
             "retrieval_relevance": retrieval_relevance(ex["inputs"], out),
+            "timings": out["timings"],
         }
         rows.append(row)
 
@@ -58,6 +59,10 @@ def main():
     print(f"Relevance:            {rel:.0%}")
     print(f"Groundedness:         {grd:.0%}")
     print(f"Retrieval relevance:  {ret:.0%}")
+    if rows:
+        for key, label in (("retrieve_ms", "Retrieval moyen"), ("rerank_ms", "Rerank moyen"),
+                           ("generate_ms", "Génération moyenne")):
+            print(f"{label + ':':<22}{sum(r['timings'][key] for r in rows) / len(rows):.0f} ms")
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,6 @@
 # builder.py (LlamaIndex -> Chroma, partagé avec LangChain)
 """
-Ingestion des documents puis construction d'un index VectorStoreIndex
+Ingestion incrémentale des documents puis construction d'un index VectorStoreIndex
 persisté dans Chroma, afin d'être réutilisé par LlamaIndex ET LangChain.
 """
 
@@ -8,43 +8,40 @@ persisté dans Chroma, afin d'être réutilisé par LlamaIndex ET LangChain.
 # Imports
 # ---------------------------------------------------------
 # os        : vérification d'existence de répertoires
-# chromadb  : client Chroma (vecteur store persistant)
 # llama_index.core : objets de base (Index, Reader, Settings, Storage)
 # Ollama    : LLM & Embeddings via Ollama (serveur local)
-# SentenceSplitter : découpage en chunks
 # ChromaVectorStore: adaptation LlamaIndex <-> Chroma
+# rag_index : découpage partagé + synchronisation incrémentale
 # =========================================================
 import os
-import chromadb
-from llama_index.core import (
-    VectorStoreIndex, SimpleDirectoryReader, Settings, StorageContext
-)
+from llama_index.core import VectorStoreIndex, Settings
 from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.ollama import OllamaEmbedding
-from llama_index.core.node_parser import SentenceSplitter
 from llama_index.vector_stores.chroma import ChromaVectorStore
 
+from rag_embeddings import llama_index_embedding
+from rag_config import VECTOR_BACKEND
+from rag_snapshots import open_index
+
 # =========================================================
 # Configuration chemins & collection
 # ---------------------------------------------------------
 # DATA_DIR   : répertoire source des documents à indexer
 # CHROMA_DIR : répertoire du stockage persistant Chroma (HNSW)
 # COLLECTION : nom logique de la collection Chroma
+# (valeurs partagées, surchargées par RAG_DATA_DIR / RAG_CHROMA_DIR / RAG_COLLECTION)
 # =========================================================
-DATA_DIR = "/var/www/RAG/Data_parse/"
-CHROMA_DIR = "/var/www/RAG/chroma_index"
-COLLECTION = "cwd_knowledge"
+from rag_config import DATA_DIR, CHROMA_DIR, COLLECTION
 
 # =========================================================
 # 1) Modèles (paramétrage global via Settings)
 # ---------------------------------------------------------
-# - Embeddings : "nomic-embed-text" (Ollama)
+# - Embeddings : "nomic-embed-text" (Ollama, client batch /api/embed concurrent)
 # - LLM        : "llama3:latest" (Ollama)
-# - Node parser: SentenceSplitter (chunk 500, overlap 50)
-# NOTE: ces Settings seront utilisés lors de la construction de l'index.
+# NOTE: le découpage n'est plus fait par un node_parser LlamaIndex mais par
+# le découpeur partagé de rag_index (même collection que les scripts LangChain).
 # =========================================================
-Settings.embed_model = OllamaEmbedding(
-    model_name="nomic-embed-text",
+Settings.embed_model = llama_index_embedding(
+    model="nomic-embed-text",
     base_url="http://localhost:11434",
 )
 Settings.llm = Ollama(
@@ -53,51 +50,43 @@ Settings.llm = Ollama(
     temperature=0.1,
     request_timeout=60,
 )
-Settings.node_parser = SentenceSplitter(chunk_size=500, chunk_overlap=50)
 
 # =========================================================
-# 2) Ingestion des documents
+# 2) Synchronisation incrémentale dans Chroma
 # ---------------------------------------------------------
-# - Vérifie l'existence du répertoire d'entrée
-# - Charge récursivement tous les fichiers supportés
-# - Transforme les documents en "nodes" (chunks) via le node_parser
+# - open_index       : snapshot versionné sous CHROMA_DIR (rag_snapshots), construit
+#   dans une copie, validé puis publié via CHROMA_DIR/current
+# - load_or_build    : compare le manifeste (modèle, découpage, nettoyage, corpus)
+#   * rien n'a changé      -> aucun embedding
+#   * corpus modifié       -> seuls les chunks nouveaux sont embeddés,
+#                             les orphelins sont supprimés
+#   * paramètres modifiés  -> reconstruction complète de la collection
 # =========================================================
 if not os.path.isdir(DATA_DIR):
     raise FileNotFoundError(f"Répertoire introuvable: {DATA_DIR}")
 
-print("📥 Chargement des documents…")
-documents = SimpleDirectoryReader(DATA_DIR, recursive=True).load_data()
-print(f"📄 Fichiers détectés : {len(documents)}")
-
-nodes = Settings.node_parser.get_nodes_from_documents(documents)
-print(f"🧩 Chunks générés : {len(nodes)}")
-
-# =========================================================
-# 3) Initialisation Chroma
-# ---------------------------------------------------------
-# - PersistentClient : charge/crée le store sur disque (CHROMA_DIR)
-# - get_or_create_collection : récupère ou crée la collection cible
-# - hnsw:space=cosine : métrique de similarité (cosine) pour HNSW
-# - ChromaVectorStore : adapter côté LlamaIndex
-# - StorageContext    : contexte de stockage pour l'Index
-# =========================================================
-client = chromadb.PersistentClient(path=CHROMA_DIR)
-collection = client.get_or_create_collection(
-    name=COLLECTION,
-    metadata={"hnsw:space": "cosine"}
+print("📥 Synchronisation des documents…")
+client, collection, index_dir = open_index(
+    Settings.embed_model.get_text_embedding_batch,
+    "nomic-embed-text",
+    DATA_DIR,
+    CHROMA_DIR,
+    COLLECTION,
 )
-vector_store = ChromaVectorStore(chroma_collection=collection)
-storage_ctx = StorageContext.from_defaults(vector_store=vector_store)
 
 # =========================================================
-# 4) Construction de l'index (persistance côté Chroma)
+# 3) Index LlamaIndex au-dessus de la collection existante
 # ---------------------------------------------------------
-# - VectorStoreIndex construit à partir des nodes et du storage_ctx
-# - show_progress=True : affichage des barres de progression
-# - La persistance est gérée par Chroma (collection + path)
+# - ChromaVectorStore : adapter côté LlamaIndex
+#   (RAG_VECTOR_BACKEND=numpy -> vector store mmap de rag_npstore)
+# - from_vector_store : aucun réembedding, on réutilise les vecteurs persistés
 # =========================================================
-print("🧠 Construction de l'index vectoriel dans Chroma…")
-index = VectorStoreIndex(nodes, storage_context=storage_ctx, show_progress=True)
+if VECTOR_BACKEND == "numpy":
+    from rag_npstore import llama_index_vector_store
+    vector_store = llama_index_vector_store(collection)
+else:
+    vector_store = ChromaVectorStore(chroma_collection=collection)
+index = VectorStoreIndex.from_vector_store(vector_store)
 
-print(f"✅ Index persistant prêt dans: {CHROMA_DIR}  (collection: {COLLECTION})")
-print(f"🧠 Total chunks indexés : {len(nodes)}")
+print(f"✅ Index persistant prêt dans: {index_dir}  (collection: {COLLECTION})")
+print(f"🧠 Total chunks indexés : {collection.count()}")